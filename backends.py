@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+处理引擎注册表
+每种文档格式按优先顺序声明可用的处理引擎：.docx/.xlsx 先用原生 OOXML 引擎，失败时再用 Word/Excel；
+旧版 .doc/.xls 只能通过 Word/Excel 处理。文件格式根据文件内容（zip 包或 OLE 复合文档）判断，
+与扩展名无关，扩展名与内容不符的文件也会交给正确的引擎。
+
+Office 实例只在某个文件实际用到 Word/Excel 引擎时才启动。
+"""
+
+import os
+import time
+import struct
+import logging
+import zipfile
+
+import metrics
+
+FORMAT_DOCX = 'docx'
+FORMAT_XLSX = 'xlsx'
+FORMAT_DOC = 'doc'
+FORMAT_XLS = 'xls'
+
+ZIP_MAGIC = b'PK\x03\x04'
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+_OLE_END_OF_CHAIN = -2
+_OLE_MAX_DIRECTORY_SECTORS = 256  # 读取目录时最多跟随的扇区数，防止损坏文件导致死循环
+
+
+class Backend(object):
+    """
+    处理引擎
+
+    Args:
+        name: 引擎名称（用于日志和指标）
+        handler: 替换函数 (输入路径, 输出路径) -> 替换次数，失败时抛出异常
+        counter: 只读统计函数 输入路径 -> {规则: 命中次数}（试运行使用），可为空
+        needs_office: 是否需要启动 Office
+        available: 返回引擎当前是否可用的函数，为空时始终可用
+    """
+
+    def __init__(self, name, handler, counter=None, needs_office=False, available=None):
+        self.name = name
+        self.handler = handler
+        self.counter = counter
+        self.needs_office = needs_office
+        self._available = available
+
+    def is_available(self):
+        return self._available is None or bool(self._available())
+
+    def __repr__(self):
+        return f"Backend({self.name!r})"
+
+
+_registry = {}  # 格式 -> [Backend]，按优先顺序排列
+
+
+def register(fmt, backend):
+    """为格式注册一个处理引擎，先注册的优先使用"""
+    _registry.setdefault(fmt, []).append(backend)
+
+
+def engines_for(fmt):
+    """格式当前可用的处理引擎列表（按优先顺序），格式未知时返回空列表"""
+    return [backend for backend in _registry.get(fmt, []) if backend.is_available()]
+
+
+def detect_format(path):
+    """
+    根据文件内容判断文档格式
+
+    Returns:
+        str: FORMAT_DOCX、FORMAT_XLSX、FORMAT_DOC 或 FORMAT_XLS；无法识别时返回 None
+    """
+    with open(path, 'rb') as f:
+        head = f.read(len(OLE_MAGIC))
+        if head.startswith(ZIP_MAGIC):
+            return _zip_format(path)
+        if head != OLE_MAGIC:
+            return None
+        try:
+            names = _ole_entry_names(f)
+        except (OSError, struct.error) as e:
+            logging.warning(f"无法读取复合文档目录: {path}, {str(e)}")
+            return None
+    if 'WordDocument' in names:
+        return FORMAT_DOC
+    if 'Workbook' in names or 'Book' in names:
+        return FORMAT_XLS
+    if 'EncryptedPackage' in names:
+        logging.warning(f"文档已加密，无法处理: {path}")
+    return None
+
+
+def _zip_format(path):
+    """根据 zip 包中的主部件判断 OOXML 文档类型"""
+    try:
+        with zipfile.ZipFile(path) as package:
+            names = set(package.namelist())
+    except (OSError, zipfile.BadZipFile):
+        return None
+    if 'word/document.xml' in names:
+        return FORMAT_DOCX
+    if 'xl/workbook.xml' in names:
+        return FORMAT_XLSX
+    # 主部件名称不标准时按部件所在的文件夹判断
+    if any(name.startswith('word/') for name in names):
+        return FORMAT_DOCX
+    if any(name.startswith('xl/') for name in names):
+        return FORMAT_XLSX
+    return None
+
+
+def _ole_entry_names(f):
+    """读取 OLE 复合文档目录中所有条目的名称（只读取文件头、目录扇区及所需的分配表扇区）"""
+    f.seek(0)
+    header = f.read(512)
+    sector_size = 1 << struct.unpack_from('<H', header, 0x1E)[0]
+    directory_sector = struct.unpack_from('<i', header, 0x30)[0]
+    fat_sectors = struct.unpack_from('<109i', header, 0x4C)
+    entries_per_fat_sector = sector_size // 4
+    fat_cache = {}
+
+    def read_sector(sector):
+        f.seek((sector + 1) * sector_size)
+        return f.read(sector_size)
+
+    def next_sector(sector):
+        index = sector // entries_per_fat_sector
+        if index >= len(fat_sectors) or fat_sectors[index] < 0:
+            return _OLE_END_OF_CHAIN
+        fat_sector = fat_sectors[index]
+        if fat_sector not in fat_cache:
+            fat_cache[fat_sector] = read_sector(fat_sector)
+        return struct.unpack_from('<i', fat_cache[fat_sector], (sector % entries_per_fat_sector) * 4)[0]
+
+    names = []
+    sector = directory_sector
+    for _ in range(_OLE_MAX_DIRECTORY_SECTORS):
+        if sector < 0:
+            break
+        data = read_sector(sector)
+        for offset in range(0, len(data) - 127, 128):
+            name_length = struct.unpack_from('<H', data, offset + 64)[0]
+            if 2 <= name_length <= 64:
+                names.append(data[offset:offset + name_length - 2].decode('utf-16-le', 'ignore'))
+        sector = next_sector(sector)
+    return names
+
+
+def run_backends(engines, input_path, output_path):
+    """
+    按优先顺序尝试各处理引擎，前一个失败时使用下一个
+
+    引擎名称、耗时和失败记录写入当前文档的指标。
+
+    Args:
+        engines: 处理引擎列表（engines_for 的返回值）
+        input_path: 输入文件路径
+        output_path: 输出文件路径
+
+    Returns:
+        tuple: (引擎名称, 替换次数)
+
+    Raises:
+        所有引擎都失败时抛出最后一个引擎的异常
+    """
+    document_metrics = metrics.current()
+    last_error = None
+    for backend in engines:
+        start = time.perf_counter()
+        try:
+            replace_count = backend.handler(input_path, output_path)
+            if not (os.path.exists(output_path) and os.path.getsize(output_path) > 0):
+                raise RuntimeError(f"输出文件不存在或为空: {output_path}")
+        except Exception as e:
+            last_error = e
+            document_metrics.backend_failures.append(backend.name)
+            logging.warning(f"引擎 {backend.name} 处理失败: {input_path}, {str(e)}")
+            if os.path.exists(output_path):
+                try:
+                    os.remove(output_path)
+                except OSError:
+                    pass
+            continue
+        document_metrics.backend = backend.name
+        document_metrics.backend_seconds = time.perf_counter() - start
+        return backend.name, replace_count
+    raise last_error if last_error is not None else RuntimeError("没有可用的处理引擎")
@@ -0,0 +1,555 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准测试
+在本地生成合成的 .docx/.xlsx 文档集，分别用不同的处理后端运行，统计吞吐量（文件/秒、MB/秒）、
+单个文档耗时的 p50/p99 以及峰值内存，结果保存为 JSON，可与历史基线比较以发现性能退化。
+
+后端：
+    batch     通过批处理流程（与 batch_process 相同的 iter_results）处理，支持 --workers
+    pipeline  通过异步流水线（iter_pipeline_results）处理，预读、处理、写出重叠进行，支持 --workers
+    native    直接调用原生 OOXML 引擎
+    fake-com  通过 COM 处理路径（Word/Excel 替换逻辑）处理，使用 fake_com 替身对象，可在 Linux 上运行
+
+用法示例：
+    python benchmark.py --docx 200 --xlsx 50 --rules 100 --output bench.json
+    python benchmark.py --backends batch --workers 4 --baseline bench.json
+"""
+
+import os
+import re
+import sys
+import json
+import html
+import math
+import time
+import random
+import shutil
+import logging
+import zipfile
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from fake_com import FakeDispatch, FakeComObject
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows 上没有 resource 模块
+
+BENCHMARK_VERSION = 1
+BACKENDS = ('batch', 'pipeline', 'native', 'fake-com')
+RULES_FILE = 'rules.json'
+
+_FILLER_WORDS = ['合同', '项目', '报告', '说明', '附件', '条款', 'data', 'report', 'value', '数量', '金额', '日期']
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '{overrides}</Types>'
+)
+_OVERRIDE = '<Override PartName="/{part}" ContentType="{content_type}"/>'
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{rels}</Relationships>'
+)
+_REL = '<Relationship Id="rId{index}" Type="{type}" Target="{target}"/>'
+_OFFICE_DOCUMENT_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+_WORKSHEET_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet'
+_SHARED_STRINGS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings'
+_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_S_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+
+def make_rules(count):
+    """生成替换规则表，旧文本等长且互不为前缀，避免规则之间相互影响"""
+    return dict((f"旧词{i:05d}", f"新词{i:05d}") for i in range(count))
+
+
+def make_text(rng, words, rules, density):
+    """
+    生成一段文本
+
+    Args:
+        rng: random.Random 实例
+        words: 词数
+        rules: 替换规则
+        density: 每个词是规则旧文本的概率
+    """
+    keys = list(rules)
+    return ''.join(
+        rng.choice(keys) if keys and rng.random() < density else rng.choice(_FILLER_WORDS)
+        for _ in range(words)
+    )
+
+
+def _split_runs(rng, text, runs):
+    """把文本随机切分为若干段，模拟 Word 中格式不同的多个文本块"""
+    if runs <= 1 or len(text) <= 1:
+        return [text]
+    cuts = sorted(rng.sample(range(1, len(text)), min(runs - 1, len(text) - 1)))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+def generate_docx(path, rng, rules, paragraphs=50, runs=4, words=20, density=0.05):
+    """生成一个 .docx 文档"""
+    body = []
+    for p in range(paragraphs):
+        text = make_text(rng, words, rules, density)
+        runs_xml = ''.join(
+            f'<w:r><w:rPr>{"<w:b/>" if i % 2 else ""}</w:rPr>'
+            f'<w:t xml:space="preserve">{html.escape(part, quote=False)}</w:t></w:r>'
+            for i, part in enumerate(_split_runs(rng, text, runs))
+        )
+        body.append(f'<w:p>{runs_xml}</w:p>')
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<w:document xmlns:w="{_W_NS}"><w:body>{"".join(body)}</w:body></w:document>'
+    )
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', _CONTENT_TYPES.format(overrides=_OVERRIDE.format(
+            part='word/document.xml',
+            content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml'
+        )))
+        package.writestr('_rels/.rels', _RELS.format(rels=_REL.format(
+            index=1, type=_OFFICE_DOCUMENT_REL, target='word/document.xml'
+        )))
+        package.writestr('word/document.xml', document)
+
+
+def _column_name(index):
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(ord('A') + remainder) + name
+    return name
+
+
+def generate_xlsx(path, rng, rules, sheets=2, rows=200, cols=10, words=4, density=0.05, numeric=0.3):
+    """生成一个 .xlsx 工作簿，文本单元格使用共享字符串，numeric 为数字单元格的比例"""
+    shared = []
+    shared_index = {}
+    sheet_parts = []
+    for s in range(sheets):
+        rows_xml = []
+        for r in range(rows):
+            cells = []
+            for c in range(cols):
+                ref = f'{_column_name(c)}{r + 1}'
+                if rng.random() < numeric:
+                    cells.append(f'<c r="{ref}"><v>{rng.randint(0, 100000)}</v></c>')
+                    continue
+                text = make_text(rng, words, rules, density)
+                if text not in shared_index:
+                    shared_index[text] = len(shared)
+                    shared.append(text)
+                cells.append(f'<c r="{ref}" t="s"><v>{shared_index[text]}</v></c>')
+            rows_xml.append(f'<row r="{r + 1}">{"".join(cells)}</row>')
+        sheet_parts.append(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<worksheet xmlns="{_S_NS}"><sheetData>{"".join(rows_xml)}</sheetData></worksheet>'
+        )
+
+    sst = ''.join(f'<si><t>{html.escape(text, quote=False)}</t></si>' for text in shared)
+    overrides = [_OVERRIDE.format(
+        part='xl/workbook.xml',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml'
+    ), _OVERRIDE.format(
+        part='xl/sharedStrings.xml',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml'
+    )]
+    workbook_sheets = []
+    workbook_rels = [_REL.format(index=1, type=_SHARED_STRINGS_REL, target='sharedStrings.xml')]
+    for s in range(sheets):
+        overrides.append(_OVERRIDE.format(
+            part=f'xl/worksheets/sheet{s + 1}.xml',
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+        ))
+        workbook_sheets.append(f'<sheet name="Sheet{s + 1}" sheetId="{s + 1}" r:id="rId{s + 2}"/>')
+        workbook_rels.append(_REL.format(index=s + 2, type=_WORKSHEET_REL, target=f'worksheets/sheet{s + 1}.xml'))
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', _CONTENT_TYPES.format(overrides=''.join(overrides)))
+        package.writestr('_rels/.rels', _RELS.format(rels=_REL.format(
+            index=1, type=_OFFICE_DOCUMENT_REL, target='xl/workbook.xml'
+        )))
+        package.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<workbook xmlns="{_S_NS}" xmlns:r="{_R_NS}"><sheets>{"".join(workbook_sheets)}</sheets></workbook>'
+        ))
+        package.writestr('xl/_rels/workbook.xml.rels', _RELS.format(rels=''.join(workbook_rels)))
+        package.writestr('xl/sharedStrings.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<sst xmlns="{_S_NS}" count="{len(shared)}" uniqueCount="{len(shared)}">{sst}</sst>'
+        ))
+        for s, part in enumerate(sheet_parts):
+            package.writestr(f'xl/worksheets/sheet{s + 1}.xml', part)
+
+
+def generate_corpus(folder, args):
+    """
+    生成文档集及其替换规则（保存为 rules.json）
+
+    Returns:
+        dict: 替换规则
+    """
+    rng = random.Random(args.seed)
+    rules = make_rules(args.rules)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, RULES_FILE), 'w', encoding='utf-8') as f:
+        json.dump(rules, f, ensure_ascii=False)
+    for i in range(args.docx):
+        generate_docx(os.path.join(folder, f'doc{i:05d}.docx'), rng, rules,
+                      args.paragraphs, args.runs, args.words, args.density)
+    for i in range(args.xlsx):
+        generate_xlsx(os.path.join(folder, f'book{i:05d}.xlsx'), rng, rules,
+                      args.sheets, args.rows, args.cols, max(1, args.words // 5), args.density)
+    return rules
+
+
+def corpus_files(folder):
+    """文档集中的文档（相对路径），按名称排序"""
+    return sorted(name for name in os.listdir(folder) if name.endswith(('.docx', '.xlsx')))
+
+
+def percentile(values, fraction):
+    """最近秩法百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def peak_rss_mb():
+    """本进程及已结束子进程的峰值常驻内存（MB），无法获取时返回 None"""
+    if resource is not None:
+        peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        unit = 1 if sys.platform == 'darwin' else 1024  # macOS 单位为字节，Linux 为 KB
+        return round(peak * unit / (1024 * 1024), 1)
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+
+def _load_app(rules, source, output):
+    """导入主程序并改用基准测试的规则和文件夹"""
+    import docx_formatted_replace as app
+    import rule_matcher
+    app.REPLACE_RULES = rules
+    app.RULE_MATCHER = rule_matcher.compile_rules(rules)
+    app.SOURCE_FOLDER = source
+    app.OUTPUT_FOLDER = output
+    return app
+
+
+def _docx_story_text(path):
+    """读取 .docx 正文文本（段落以 \\r 分隔，与 Word 的 Range.Text 一致）"""
+    with zipfile.ZipFile(path) as package:
+        xml = package.read('word/document.xml').decode('utf-8')
+    paragraphs = [
+        html.unescape(''.join(re.findall(r'<w:t(?:\s[^>]*)?>([^<]*)</w:t>', p)))
+        for p in re.findall(r'<w:p>(.*?)</w:p>', xml)
+    ]
+    return '\r'.join(paragraphs) + '\r'
+
+
+def _xlsx_sheet_values(path):
+    """读取 .xlsx 各工作表的单元格值，返回与 Range.Value 相同形式的二维元组列表"""
+    with zipfile.ZipFile(path) as package:
+        shared = [
+            html.unescape(''.join(re.findall(r'<t(?:\s[^>]*)?>([^<]*)</t>', si)))
+            for si in re.findall(r'<si>(.*?)</si>', package.read('xl/sharedStrings.xml').decode('utf-8'))
+        ]
+        sheets = []
+        names = sorted(n for n in package.namelist() if n.startswith('xl/worksheets/sheet'))
+        for name in names:
+            xml = package.read(name).decode('utf-8')
+            rows = []
+            for row in re.findall(r'<row[^>]*>(.*?)</row>', xml):
+                values = []
+                for attrs, value in re.findall(r'<c([^>]*)><v>([^<]*)</v></c>', row):
+                    values.append(shared[int(value)] if 't="s"' in attrs else float(value))
+                rows.append(tuple(values))
+            sheets.append(tuple(rows))
+    return sheets
+
+
+class _ReplacingDispatch(FakeDispatch):
+    """执行 Find.Execute 全部替换时同步修改替身文档的文本，使替换后的校验与真实 Word 一致"""
+
+    def _record(self, instance_id, kind, path, args=(), kwargs=None):
+        FakeDispatch._record(self, instance_id, kind, path, args, kwargs)
+        if kind == 'call' and path.endswith('.Duplicate.Find.Execute()') and kwargs:
+            text_path = path[:-len('.Duplicate.Find.Execute()')] + '.Text'
+            text = self.values.get(text_path)
+            if isinstance(text, str):
+                find = kwargs['FindText'].replace('^^', '^')
+                self.values[text_path] = text.replace(find, kwargs['ReplaceWith'].replace('^^', '^'))
+
+
+def _fake_values(path, dispatch):
+    """为单个文档构造 COM 替身的返回值"""
+    values = {}
+    if path.endswith('.docx'):
+        doc = 'Word.Application.Documents.Open()'
+        story = FakeComObject(f'{doc}.StoryRanges[0]', dispatch, 0)
+        values[f'{doc}.StoryRanges[]'] = [story]
+        values[f'{doc}.StoryRanges[0].Text'] = _docx_story_text(path)
+        values[f'{doc}.StoryRanges[0].NextStoryRange'] = None
+    else:
+        book = 'Excel.Application.Workbooks.Open()'
+        sheets = []
+        for index, sheet_values in enumerate(_xlsx_sheet_values(path)):
+            sheet = f'{book}.Sheets[{index}]'
+            sheets.append(FakeComObject(sheet, dispatch, 0))
+            values[f'{sheet}.UsedRange.Value'] = sheet_values
+            values[f'{sheet}.UsedRange.Formula'] = sheet_values
+            values[f'{sheet}.UsedRange.Row'] = 1
+            values[f'{sheet}.UsedRange.Column'] = 1
+        values[f'{book}.Sheets[]'] = sheets
+        for prop in ('Title', 'Subject', 'Keywords', 'Comments'):
+            values[f'{book}.BuiltInDocumentProperties.{prop}.Value'] = None
+    return values
+
+
+def run_backend(backend, corpus, workers=1, com_delay=0.0, compression_level=None, compression_threads=None):
+    """
+    用指定后端处理文档集
+
+    Args:
+        compression_level: 原生引擎的压缩级别，None 表示使用配置
+        compression_threads: 原生引擎的压缩线程数，None 表示使用配置
+
+    Returns:
+        dict: 统计结果
+    """
+    with open(os.path.join(corpus, RULES_FILE), 'r', encoding='utf-8') as f:
+        rules = json.load(f)
+    files = corpus_files(corpus)
+    output = tempfile.mkdtemp(prefix='bench_out_')
+    app = _load_app(rules, corpus, output)
+    app.ooxml_engine.set_compression(compression_level, compression_threads)
+    if compression_threads is not None:
+        app.COMPRESSION_THREADS = compression_threads  # 工作进程按此设置压缩线程数
+    temp_dir = os.path.join(output, app.STAGING_DIR_NAME)
+    os.makedirs(temp_dir)
+    # 基准测试不写日志文件，避免日志 I/O 干扰计时
+    logging.disable(logging.CRITICAL)
+
+    latencies = []
+    replacements = 0
+    failed = 0
+    com_calls = None
+    start = time.perf_counter()
+    try:
+        if backend in ('batch', 'pipeline'):
+            if (workers > 1 or backend == 'pipeline') and sys.platform == 'win32':
+                raise RuntimeError("Windows 上的多进程基准测试无法改用基准测试的规则和文件夹，请使用 batch 后端和 --workers 1")
+            iter_results = app.iter_results if backend == 'batch' else app.iter_pipeline_results
+            for result in iter_results(iter(files), temp_dir, workers):
+                latencies.append(result['process_time'])
+                if result['outcome'] in ('success', 'passthrough'):
+                    replacements += result['replace_count']
+                else:
+                    failed += 1
+        elif backend == 'native':
+            import ooxml_engine
+            for name in files:
+                doc_start = time.perf_counter()
+                engine = ooxml_engine.replace_in_docx if name.endswith('.docx') else ooxml_engine.replace_in_xlsx
+                counts = engine(os.path.join(corpus, name), os.path.join(output, name), app.RULE_MATCHER)
+                replacements += sum(counts.values())
+                latencies.append(time.perf_counter() - doc_start)
+        elif backend == 'fake-com':
+            dispatch = _ReplacingDispatch(delay=com_delay, save_copies=True)
+            app.get_office_pool(dispatch)
+            for name in files:
+                source = os.path.join(corpus, name)
+                dispatch.values.update(_fake_values(source, dispatch))
+                doc_start = time.perf_counter()
+                if name.endswith('.docx'):
+                    success, _, count = app.replace_in_word(source, os.path.join(output, name))
+                    if not success:
+                        failed += 1
+                    replacements += count
+                else:
+                    replacements += app.replace_in_excel(source, os.path.join(output, name))
+                latencies.append(time.perf_counter() - doc_start)
+            com_calls = len(dispatch.calls)
+            app.get_office_pool().close_all()
+        else:
+            raise ValueError(f"未知的后端: {backend}")
+    finally:
+        elapsed = time.perf_counter() - start
+        shutil.rmtree(output, ignore_errors=True)
+
+    total_bytes = sum(os.path.getsize(os.path.join(corpus, name)) for name in files)
+    result = {
+        'files': len(files),
+        'failed': failed,
+        'replacements': replacements,
+        'seconds': round(elapsed, 4),
+        'files_per_s': round(len(files) / elapsed, 2) if elapsed else None,
+        'mb_per_s': round(total_bytes / (1024 * 1024) / elapsed, 3) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if com_calls is not None:
+        result['com_calls'] = com_calls
+    return result
+
+
+def run_isolated(backend, corpus, args):
+    """在独立的子进程中运行一个后端，使峰值内存只反映该后端"""
+    command = [
+        sys.executable, os.path.abspath(__file__), '--run-backend', backend, '--corpus', corpus,
+        '--workers', str(args.workers), '--com-delay', str(args.com_delay),
+    ]
+    if args.compression_level is not None:
+        command += ['--compression-level', str(args.compression_level)]
+    if args.compression_threads is not None:
+        command += ['--compression-threads', str(args.compression_threads)]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               cwd=corpus)  # 日志文件写在文档集文件夹中
+    if completed.returncode != 0:
+        raise RuntimeError(f"后端 {backend} 运行失败: {completed.stderr.decode('utf-8', 'replace').strip()}")
+    return json.loads(completed.stdout.decode('utf-8').strip().splitlines()[-1])
+
+
+def compare_with_baseline(report, baseline, threshold):
+    """
+    与基线比较吞吐量和延迟
+
+    Returns:
+        list: 性能退化的说明，没有退化时为空
+    """
+    regressions = []
+    for backend, current in report['results'].items():
+        previous = baseline.get('results', {}).get(backend)
+        if not previous:
+            continue
+        for key, higher_is_better in (('files_per_s', True), ('mb_per_s', True), ('p99_ms', False)):
+            old, new = previous.get(key), current.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append(f"{backend} {key}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def parse_args(argv=None):
+    """ 解析命令行参数 """
+    parser = argparse.ArgumentParser(description="文档批量替换工具性能基准测试")
+    corpus_group = parser.add_argument_group("文档集")
+    corpus_group.add_argument('--corpus', help="文档集文件夹，不存在时生成；默认生成到临时文件夹并在结束后删除")
+    corpus_group.add_argument('--docx', type=int, default=50, help="Word 文档数量（默认: 50）")
+    corpus_group.add_argument('--xlsx', type=int, default=20, help="Excel 工作簿数量（默认: 20）")
+    corpus_group.add_argument('--paragraphs', type=int, default=100, help="每个 Word 文档的段落数（默认: 100）")
+    corpus_group.add_argument('--runs', type=int, default=4, help="每个段落的文本块数（默认: 4）")
+    corpus_group.add_argument('--words', type=int, default=20, help="每个段落的词数（默认: 20）")
+    corpus_group.add_argument('--sheets', type=int, default=2, help="每个工作簿的工作表数（默认: 2）")
+    corpus_group.add_argument('--rows', type=int, default=200, help="每个工作表的行数（默认: 200）")
+    corpus_group.add_argument('--cols', type=int, default=10, help="每个工作表的列数（默认: 10）")
+    corpus_group.add_argument('--density', type=float, default=0.05, help="每个词是替换目标的概率（默认: 0.05）")
+    corpus_group.add_argument('--rules', type=int, default=50, help="替换规则数量（默认: 50）")
+    corpus_group.add_argument('--seed', type=int, default=1, help="随机种子（默认: 1）")
+
+    run_group = parser.add_argument_group("运行")
+    run_group.add_argument('--backends', default=','.join(BACKENDS), help=f"逗号分隔的后端列表（默认: {','.join(BACKENDS)}）")
+    run_group.add_argument('--workers', type=int, default=1, help="batch 后端的工作进程数（默认: 1）")
+    run_group.add_argument('--com-delay', type=float, default=0.0, help="fake-com 后端每次 COM 调用的模拟耗时，秒（默认: 0）")
+    run_group.add_argument('--compression-level', type=int, choices=range(10), metavar='0-9',
+                           help="原生引擎改写后部件的压缩级别（默认: 使用配置）")
+    run_group.add_argument('--compression-threads', type=int, help="原生引擎并行压缩的线程数（默认: 使用配置）")
+    run_group.add_argument('--output', help="结果 JSON 文件路径")
+    run_group.add_argument('--baseline', help="基线结果 JSON 文件，出现性能退化时以退出码 1 结束")
+    run_group.add_argument('--threshold', type=float, default=0.10, help="判定退化的相对变化幅度（默认: 0.10）")
+    run_group.add_argument('--run-backend', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # 子进程模式：只运行一个后端，结果以 JSON 输出到标准输出
+    if args.run_backend:
+        print(json.dumps(run_backend(args.run_backend, args.corpus, args.workers, args.com_delay,
+                                     args.compression_level, args.compression_threads)))
+        return 0
+
+    backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+    for backend in backends:
+        if backend not in BACKENDS:
+            print(f"未知的后端: {backend}（可选: {', '.join(BACKENDS)}）")
+            return 2
+
+    corpus = args.corpus or tempfile.mkdtemp(prefix='bench_corpus_')
+    try:
+        if not os.path.exists(os.path.join(corpus, RULES_FILE)):
+            print(f"生成文档集: {corpus}")
+            generate_start = time.perf_counter()
+            generate_corpus(corpus, args)
+            print(f"已生成 {len(corpus_files(corpus))} 个文档，耗时 {time.perf_counter() - generate_start:.2f}s")
+
+        files = corpus_files(corpus)
+        report = {
+            'version': BENCHMARK_VERSION,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'corpus': {
+                'files': len(files),
+                'bytes': sum(os.path.getsize(os.path.join(corpus, name)) for name in files),
+                'docx': args.docx, 'xlsx': args.xlsx, 'paragraphs': args.paragraphs, 'runs': args.runs,
+                'words': args.words, 'sheets': args.sheets, 'rows': args.rows, 'cols': args.cols,
+                'density': args.density, 'rules': args.rules, 'seed': args.seed,
+            },
+            'workers': args.workers,
+            'com_delay': args.com_delay,
+            'compression_level': args.compression_level,
+            'compression_threads': args.compression_threads,
+            'results': {},
+        }
+
+        print(f"\n{'后端':<10} {'文件/秒':>10} {'MB/秒':>10} {'p50(ms)':>10} {'p99(ms)':>10} {'峰值内存(MB)':>14}")
+        print("-" * 70)
+        for backend in backends:
+            result = run_isolated(backend, corpus, args)
+            report['results'][backend] = result
+            print(f"{backend:<10} {result['files_per_s']:>10} {result['mb_per_s']:>10} "
+                  f"{result['p50_ms']:>10} {result['p99_ms']:>10} {str(result['peak_rss_mb']):>14}")
+    finally:
+        if not args.corpus:
+            shutil.rmtree(corpus, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.threshold)
+        if regressions:
+            print("\n发现性能退化：")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\n与基线相比没有发现性能退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+COM 调用计数
+通过代理对象包装 COM 对象，统计每个文档的属性读取、赋值和方法调用次数（即跨进程往返次数），
+并可设置单个文档的调用预算，超出预算时中止处理。
+"""
+
+# 这些类型的返回值不是 COM 对象，直接返回不再包装
+_PLAIN_TYPES = (str, bytes, int, float, bool, tuple, list, type(None))
+
+
+class ComBudgetExceeded(Exception):
+    """单个文档的 COM 调用次数超出预算"""
+
+
+class ComCallCounter(object):
+    """
+    COM 调用计数器
+
+    Args:
+        budget: 调用次数上限，0 表示不限制
+    """
+
+    def __init__(self, budget=0):
+        self.budget = budget
+        self.calls = 0
+        self.exceeded = False
+
+    def tick(self):
+        """记录一次 COM 调用，首次超出预算时抛出 ComBudgetExceeded"""
+        self.calls += 1
+        if self.budget and self.calls > self.budget and not self.exceeded:
+            # 只抛出一次，之后关闭文档等清理调用仍可正常执行
+            self.exceeded = True
+            raise ComBudgetExceeded(f"COM调用次数超出预算 ({self.budget})")
+
+    def wrap(self, obj):
+        """用计数代理包装 COM 对象"""
+        if isinstance(obj, _PLAIN_TYPES) or isinstance(obj, _CountingProxy):
+            return obj
+        return _CountingProxy(obj, self)
+
+
+def unwrap(obj):
+    """取出代理对象包装的原始 COM 对象"""
+    if isinstance(obj, _CountingProxy):
+        return object.__getattribute__(obj, '_obj')
+    return obj
+
+
+class _CountingProxy(object):
+    """转发所有访问并计数的代理对象"""
+
+    def __init__(self, obj, counter):
+        object.__setattr__(self, '_obj', obj)
+        object.__setattr__(self, '_counter', counter)
+
+    def __getattr__(self, name):
+        counter = object.__getattribute__(self, '_counter')
+        counter.tick()
+        return counter.wrap(getattr(object.__getattribute__(self, '_obj'), name))
+
+    def __setattr__(self, name, value):
+        object.__getattribute__(self, '_counter').tick()
+        setattr(object.__getattribute__(self, '_obj'), name, unwrap(value))
+
+    def __call__(self, *args, **kwargs):
+        counter = object.__getattribute__(self, '_counter')
+        counter.tick()
+        args = [unwrap(arg) for arg in args]
+        kwargs = dict((key, unwrap(value)) for key, value in kwargs.items())
+        return counter.wrap(object.__getattribute__(self, '_obj')(*args, **kwargs))
+
+    def __iter__(self):
+        counter = object.__getattribute__(self, '_counter')
+        for item in object.__getattribute__(self, '_obj'):
+            counter.tick()
+            yield counter.wrap(item)
+
+    def __bool__(self):
+        return bool(object.__getattribute__(self, '_obj'))
+
+    def __repr__(self):
+        return f"<计数代理 {object.__getattribute__(self, '_obj')!r}>"
@@ -2,14 +2,21 @@
 # 使用方法：复制此文件并重命名为 config.py，然后根据需要修改
 
 # 替换规则 - 字典格式，键为要查找的文本，值为替换后的文本
+# 只有以 "re:" 开头的键按正则表达式处理（其他键即使含反斜杠、括号也按普通文本匹配），替换文本中可用 \1、\g<name> 引用分组
 REPLACE_RULES = {
     "原始文本1": "替换后文本1",
     "原始文本2": "替换后文本2",
     # 可以根据需要添加更多规则
     # "公司旧名称": "公司新名称",
     # "旧产品编号": "新产品编号",
+    # r"re:(\d{4})年度": r"\1年",
 }
 
+# 规则文件：大量规则可放在 CSV/TSV（每行 旧文本,新文本）或 JSON（{"旧文本": "新文本"}）文件中，与上面的规则合并
+# 相对路径相对于本文件所在文件夹；同一旧文本对应不同新文本时拒绝运行并列出冲突位置
+RULE_FILES = []  # 如 ["rules/更名对照表.csv"]
+RULE_CACHE_FILE = ""  # 编译后的规则缓存文件，规则未变化时直接加载；为空时保存在第一个规则文件旁（<规则文件>.cache）
+
 # 文件夹路径设置
 SOURCE_FOLDER = r"E:\源文件夹"  # 请修改为您的源文件夹路径
 OUTPUT_FOLDER = r"E:\输出文件夹"  # 请修改为您的输出文件夹路径
@@ -21,8 +28,32 @@ LOG_LEVEL = "INFO"  # 日志级别: DEBUG, INFO, WARNING, ERROR, CRITICAL
 # 界面与操作控制
 SHOW_PROGRESS = True  # 是否显示进度信息
 BACKUP_ORIGINAL = False  # 是否在处理前备份原始文档
-MAX_RETRIES = 3  # 处理文件失败时的最大重试次数
+MAX_RETRIES = 3  # Word/Excel 出现暂时性错误（文件被占用、Office忙等）时的最大重试次数，文件损坏等永久性错误不重试
+RETRY_BASE_DELAY = 1.0  # 重试前等待的基础时长（秒），每次重试加倍并加入随机抖动
+RETRY_MAX_DELAY = 30.0  # 单次重试前等待的最长时间（秒）
+CIRCUIT_BREAKER_THRESHOLD = 5  # Word/Excel 连续多少次出错后暂停重试（每个文件只尝试一次），直到再次成功；0 表示不限制
+DOCUMENT_TIMEOUTS = {"docx": 120, "xlsx": 120, "doc": 300, "xls": 300, "*": 300}  # 单个文档的处理时限（秒，按扩展名，"*" 为其他格式）：超时后终止处理该文档的工作进程（及其启动的Word/Excel）并启动新进程，文档标记为超时，批处理继续；为空 {} 时不限制
+DOCUMENT_TIMEOUT_PER_MB = 5  # 文件每增加 1 MB 增加的处理时限（秒）
+COMPRESSION_LEVEL = 6  # 原生引擎改写后部件的压缩级别：0 不压缩，1 最快（适合还要再处理的中间结果），9 最小
+COMPRESSION_THREADS = 0  # 每个工作进程并行压缩改写后部件的线程数，0 表示 CPU 核数除以工作进程数（至少 1）
+WORKERS = 1  # 并行处理的工作进程数，1 表示逐个处理（可用命令行参数 --workers 覆盖）
+INCREMENTAL = True  # 增量处理：源文件和替换规则都未变化且输出文件存在时直接跳过（命令行参数 --full 强制全部处理）
+PREFILTER = True  # 预筛选：.docx/.xlsx 中没有任何匹配时不打开处理，直接复制到输出文件夹
+ALLOW_HARDLINK = False  # 未修改的文件是否改用硬链接发布（同一磁盘上不复制数据，但输出文件与源文件共享数据）；不允许时优先使用写时复制克隆，不支持时再复制
+RECURSIVE = True  # 是否处理子文件夹中的文件，输出文件夹中保持相同的目录结构
+INCLUDE_PATTERNS = []  # 只处理匹配的文件（通配符，匹配文件名或相对路径），如 ["*.docx", "合同/*"]；为空时处理所有文件
+EXCLUDE_PATTERNS = ["~$*", "备份_*"]  # 排除的文件或子文件夹（默认排除Office临时文件和备份文件夹）
+METRICS_FILE = ""  # 指标文件（JSONL，追加写入），记录每个文档各阶段耗时、读写字节数、COM调用次数和规则命中次数，如 "metrics.jsonl"；为空时不记录
+PROMETHEUS_FILE = ""  # 运行结束时输出 Prometheus 文本格式的指标快照，如 "metrics.prom"；为空时不输出
+PIPELINE = False  # 异步流水线：预读源文件、替换处理、写出结果三个阶段重叠进行，适合源文件夹或输出文件夹位于网络共享（可用命令行参数 --pipeline 启用）
+PIPELINE_IO_THREADS = 4  # 流水线中预读和写出各自同时进行的文件数
+PIPELINE_DEPTH = 8  # 流水线阶段之间的队列容量，队列满时上游阶段等待，限制内存和本地缓冲占用
+SPOOL_FOLDER = ""  # 流水线预读和处理结果使用的本地缓冲文件夹，为空时使用系统临时文件夹
+JOURNAL = True  # 处理日志：每完成一个文件追加记录到输出文件夹旁的 .journal.jsonl，程序中断后可用命令行参数 --resume 从中断处继续
+LEASE_SECONDS = 300  # 多机租约模式（--lease-dir）的租约时长：节点超过该时间没有续约（如崩溃），它认领的文件由其他节点重新处理
 DISABLE_ALERTS = True  # 是否禁用所有Office应用程序弹窗
+OFFICE_RECYCLE_AFTER = 50  # 每个Word/Excel实例处理多少个文档后重启，0 表示不重启
+NATIVE_OOXML = True  # .docx/.xlsx 是否优先使用原生引擎处理（无需Office，速度更快）
 
 # Excel特有设置
 EXCEL_SETTINGS = {
@@ -38,6 +69,11 @@ WORD_SETTINGS = {
     'CONFIRM_CONVERSIONS': False,  # 是否确认格式转换
 }
 
+# Word替换方式（通过Word处理 .doc 文档时使用）
+# "single": 每条命中规则只执行一次全部替换，并通过残留匹配数校验，速度快且保留格式
+# "multi": 旧版多策略替换（逐项查找、全文替换、段落替换依次执行），COM调用次数多
+WORD_REPLACE_MODE = "single"
+COM_CALL_BUDGET = 0  # 单个Word文档允许的最大COM调用次数，超出则中止该文档，0 表示不限制
+
 # 高级设置（一般情况下不需要修改）
-COMPRESSION_LEVEL = 9  # 文档压缩级别 (0-9)，9为最高压缩比
 AUTOFIT_TABLES = True  # 表格替换后是否自动调整列宽 
\ No newline at end of file
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+源文件发现
+基于 os.scandir 递归遍历源文件夹，边扫描边产出相对路径，并通过后台线程和有界队列
+交给处理流程，大目录（如网络共享）无需等待完整列表即可开始处理。
+"""
+
+import os
+import time
+import queue
+import fnmatch
+import logging
+import threading
+
+# 扫描结束标记
+_DONE = object()
+
+
+def _matches(rel_path, name, patterns):
+    """相对路径或文件名匹配任一通配符模式（不区分大小写，路径分隔符统一为 /）"""
+    rel_path = rel_path.replace(os.sep, '/').lower()
+    name = name.lower()
+    for pattern in patterns:
+        pattern = pattern.replace('\\', '/').lower()
+        if fnmatch.fnmatchcase(rel_path, pattern) or fnmatch.fnmatchcase(name, pattern):
+            return True
+    return False
+
+
+def iter_source_files(root, recursive=True, include=None, exclude=None, skip_dirs=None):
+    """
+    逐个产出源文件夹中需要处理的文件
+
+    目录按名称顺序深度优先遍历，结果顺序在多次运行之间保持一致。
+
+    Args:
+        root: 源文件夹
+        recursive: 是否进入子文件夹
+        include: 文件通配符列表（匹配文件名或相对路径），为空时包含所有文件
+        exclude: 排除的通配符列表，同时作用于文件和子文件夹
+        skip_dirs: 不进入的目录绝对路径（如位于源文件夹中的输出文件夹）
+
+    Yields:
+        str: 相对于源文件夹的文件路径
+    """
+    include = list(include or [])
+    exclude = list(exclude or [])
+    skip_dirs = set(os.path.normcase(os.path.abspath(d)) for d in (skip_dirs or []))
+
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            logging.warning(f"无法读取文件夹: {os.path.join(root, rel_dir)}, {str(e)}")
+            continue
+
+        sub_dirs = []
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if not recursive or _matches(rel_path, entry.name, exclude):
+                    continue
+                if os.path.normcase(os.path.abspath(entry.path)) in skip_dirs:
+                    continue
+                sub_dirs.append(rel_path)
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if include and not _matches(rel_path, entry.name, include):
+                continue
+            if _matches(rel_path, entry.name, exclude):
+                continue
+            yield rel_path
+
+        # 倒序压栈，使子文件夹按名称顺序出栈
+        pending.extend(reversed(sub_dirs))
+
+
+class SourceScanner(object):
+    """
+    后台扫描源文件夹，通过有界队列逐个提供文件
+
+    队列满时扫描线程等待，内存占用与源文件数量无关。
+
+    Args:
+        files: 文件迭代器（如 iter_source_files 的返回值）
+        maxsize: 队列容量
+    """
+
+    def __init__(self, files, maxsize=1000):
+        self.found = 0  # 已发现的文件数
+        self.done = False  # 扫描是否已结束
+        self.scan_seconds = 0.0  # 遍历文件夹的耗时（不含等待队列的时间）
+        self._files = files
+        self._queue = queue.Queue(maxsize)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._produce, name="source-scanner", daemon=True)
+        self._thread.start()
+
+    def _produce(self):
+        try:
+            files = iter(self._files)
+            while True:
+                scan_start = time.perf_counter()
+                rel_path = next(files, _DONE)
+                self.scan_seconds += time.perf_counter() - scan_start
+                if rel_path is _DONE:
+                    break
+                while not self._stopped.is_set():
+                    try:
+                        self._queue.put(rel_path, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stopped.is_set():
+                    return
+                self.found += 1
+        except Exception as e:
+            logging.error(f"扫描源文件夹失败: {str(e)}")
+        finally:
+            self.done = True
+            self._queue.put(_DONE)
+
+    def __iter__(self):
+        while True:
+            rel_path = self._queue.get()
+            if rel_path is _DONE:
+                return
+            yield rel_path
+
+    def stop(self):
+        """提前结束扫描（如处理被中断）"""
+        self._stopped.set()
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
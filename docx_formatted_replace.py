@@ -1,11 +1,52 @@
 import os
 import sys
 import time
+import errno
 import logging
-import win32com.client as win32
 import shutil
+import argparse
+import tempfile
+import functools
+import itertools
+import collections
+import concurrent.futures
+import multiprocessing.util
 from datetime import datetime
 
+import ooxml_engine
+import excel_bulk
+import manifest
+import prefilter
+import discovery
+import metrics
+import pipeline
+import hit_report
+import backends
+import journal
+import sharding
+import retry_policy
+import rule_files
+import watchdog_pool
+from office_pool import OfficeAppPool
+from com_counter import ComCallCounter
+
+try:
+    import fcntl  # 仅 Linux/macOS，用于 reflink 克隆
+except ImportError:
+    fcntl = None
+
+try:
+    import win32com.client as win32
+    import pywintypes
+except ImportError:
+    win32 = None  # 未安装 pywin32（如 Linux 环境）时只能使用原生 OOXML 引擎
+
+try:
+    import win32gui
+    import win32process
+except ImportError:
+    win32process = None
+
 # 导入配置文件
 try:
     from config import (
@@ -22,6 +63,44 @@ except Exception as e:
     print(f"错误: 加载配置文件时出错: {str(e)}")
     sys.exit(1)
 
+import config
+
+# 可选配置项（旧版配置文件中可能没有，使用默认值）
+NATIVE_OOXML = getattr(config, 'NATIVE_OOXML', True)
+WORKERS = getattr(config, 'WORKERS', 1)
+OFFICE_RECYCLE_AFTER = getattr(config, 'OFFICE_RECYCLE_AFTER', 50)
+WORD_REPLACE_MODE = getattr(config, 'WORD_REPLACE_MODE', 'single')
+COM_CALL_BUDGET = getattr(config, 'COM_CALL_BUDGET', 0)
+INCREMENTAL = getattr(config, 'INCREMENTAL', True)
+PREFILTER = getattr(config, 'PREFILTER', True)
+ALLOW_HARDLINK = getattr(config, 'ALLOW_HARDLINK', False)
+RECURSIVE = getattr(config, 'RECURSIVE', True)
+METRICS_FILE = getattr(config, 'METRICS_FILE', "")
+PROMETHEUS_FILE = getattr(config, 'PROMETHEUS_FILE', "")
+INCLUDE_PATTERNS = getattr(config, 'INCLUDE_PATTERNS', [])
+EXCLUDE_PATTERNS = getattr(config, 'EXCLUDE_PATTERNS', ["~$*", "备份_*"])
+PIPELINE = getattr(config, 'PIPELINE', False)
+PIPELINE_IO_THREADS = getattr(config, 'PIPELINE_IO_THREADS', 4)
+PIPELINE_DEPTH = getattr(config, 'PIPELINE_DEPTH', 8)
+SPOOL_FOLDER = getattr(config, 'SPOOL_FOLDER', "")
+JOURNAL = getattr(config, 'JOURNAL', True)
+LEASE_SECONDS = getattr(config, 'LEASE_SECONDS', sharding.LEASE_SECONDS)
+RETRY_BASE_DELAY = getattr(config, 'RETRY_BASE_DELAY', 1.0)
+RETRY_MAX_DELAY = getattr(config, 'RETRY_MAX_DELAY', 30.0)
+CIRCUIT_BREAKER_THRESHOLD = getattr(config, 'CIRCUIT_BREAKER_THRESHOLD', 5)
+DOCUMENT_TIMEOUTS = getattr(config, 'DOCUMENT_TIMEOUTS', {'docx': 120, 'xlsx': 120, 'doc': 300, 'xls': 300, '*': 300})
+DOCUMENT_TIMEOUT_PER_MB = getattr(config, 'DOCUMENT_TIMEOUT_PER_MB', 5)
+COMPRESSION_LEVEL = getattr(config, 'COMPRESSION_LEVEL', 6)
+COMPRESSION_THREADS = getattr(config, 'COMPRESSION_THREADS', 0)
+RULE_FILES = getattr(config, 'RULE_FILES', [])
+RULE_CACHE_FILE = getattr(config, 'RULE_CACHE_FILE', "")
+
+# Word/Excel 处理出现暂时性错误时的重试策略
+RETRY_POLICY = retry_policy.RetryPolicy(MAX_RETRIES, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+
+# 改写后的 .docx/.xlsx 部件的压缩级别和并行压缩线程数（0 表示 CPU 核数，多个工作进程时由各进程平分）
+ooxml_engine.set_compression(COMPRESSION_LEVEL, COMPRESSION_THREADS or None)
+
 # 配置日志
 log_level = getattr(logging, LOG_LEVEL, logging.INFO)
 logging.basicConfig(
@@ -31,6 +110,21 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+# 替换规则只编译一次，Word/Excel 各处理路径共用；规则文件和缓存文件的相对路径相对于 config.py 所在文件夹
+if isinstance(RULE_FILES, str):
+    RULE_FILES = [RULE_FILES]
+_config_dir = os.path.dirname(os.path.abspath(config.__file__))
+RULE_FILES = [os.path.join(_config_dir, path) for path in RULE_FILES]
+if RULE_CACHE_FILE:
+    RULE_CACHE_FILE = os.path.join(_config_dir, RULE_CACHE_FILE)
+try:
+    RULE_MATCHER = rule_files.load_matcher(REPLACE_RULES, RULE_FILES, RULE_CACHE_FILE or None)
+except (OSError, ValueError) as e:
+    logging.error(f"加载替换规则时出错: {str(e)}")
+    print(f"错误: 加载替换规则时出错: {str(e)}")
+    sys.exit(1)
+REPLACE_RULES = RULE_MATCHER.rules
+
 def get_word_format_constant(file_ext):
     """
     获取Word文档格式的常数值
@@ -56,96 +150,295 @@ def get_word_format_constant(file_ext):
     }
     return format_map.get(file_ext.lower(), 16)  # 默认返回docx格式
 
-def replace_in_word(doc_path, output_path, retries=0):
-    """在Word文档中替换文本，并保留格式"""
-    if retries > MAX_RETRIES:
-        logging.error(f"处理文件 {doc_path} 失败，超过最大重试次数")
-        return False, "超过最大重试次数", 0
+STAGING_DIR_NAME = ".staging"  # 输出文件夹中的暂存目录名
+
+WORD_PROG_ID = "Word.Application"
+EXCEL_PROG_ID = "Excel.Application"
+
+_office_pool = None
+
+def _office_pid(app, prog_id):
+    """ Office实例的进程号（通过窗口句柄获取），无法获取时返回 None """
+    if win32process is None:
+        return None
+    try:
+        if prog_id == EXCEL_PROG_ID:
+            hwnd = app.Hwnd
+        else:
+            # Word没有应用程序窗口句柄属性，设置唯一的标题后按标题查找窗口
+            caption = f"batch_replace_{os.getpid()}_{os.urandom(4).hex()}"
+            app.Caption = caption
+            hwnd = win32gui.FindWindow("OpusApp", caption)
+        return win32process.GetWindowThreadProcessId(hwnd)[1] if hwnd else None
+    except Exception:
+        return None
+
+def setup_word(word):
+    """ 新建Word实例时应用设置 """
+    # 在看门狗工作进程中运行时报告Word进程号，处理超时时一并结束
+    if watchdog_pool.in_worker():
+        watchdog_pool.report_child_pid(_office_pid(word, WORD_PROG_ID))
+    word.Visible = False  # 设置为不可见
+    word.DisplayAlerts = not DISABLE_ALERTS  # 是否禁用警告
     
-    word = None
-    doc = None
-    temp_output_path = None
-    replacement_counts = {}  # 用于记录每个规则的替换次数
-    total_replacements = 0  # 总替换次数
-    success = False
-    error_msg = ""
+    # 设置Word选项
+    if WORD_SETTINGS['UPDATE_LINKS'] is not None:
+        word.Options.UpdateLinksAtOpen = WORD_SETTINGS['UPDATE_LINKS']
+    if WORD_SETTINGS['CONFIRM_CONVERSIONS'] is not None:
+        word.Options.ConfirmConversions = WORD_SETTINGS['CONFIRM_CONVERSIONS']
+
+def setup_excel(excel):
+    """ 新建Excel实例时应用设置 """
+    if watchdog_pool.in_worker():
+        watchdog_pool.report_child_pid(_office_pid(excel, EXCEL_PROG_ID))
+    excel.Visible = False  # 不显示 Excel 窗口
     
+    # 禁用所有提示和警告
+    if DISABLE_ALERTS:
+        excel.DisplayAlerts = False
+        excel.AskToUpdateLinks = EXCEL_SETTINGS['UPDATE_LINKS']
+        excel.AlertBeforeOverwriting = False
+        excel.FeatureInstall = 0  # msoFeatureInstallNone
+        excel.EnableEvents = False  # 禁用所有自动事件
+        excel.ScreenUpdating = False  # 禁用屏幕更新
+
+def teardown_excel(excel):
+    """ Excel实例退出前恢复设置 """
+    if DISABLE_ALERTS:
+        excel.DisplayAlerts = True
+        excel.EnableEvents = True
+        excel.ScreenUpdating = True
+
+def get_office_pool(dispatch=None):
+    """
+    获取当前进程的Office实例池，首次调用时创建
+    
+    Args:
+        dispatch: 创建COM对象的函数，默认使用 win32com.client.Dispatch，
+                  测试时可传入 fake_com.FakeDispatch
+    """
+    global _office_pool
+    if _office_pool is None or dispatch is not None:
+        if _office_pool is not None:
+            _office_pool.close_all()
+        _office_pool = OfficeAppPool(
+            dispatch or win32.Dispatch,
+            recycle_after=OFFICE_RECYCLE_AFTER,
+            setup={WORD_PROG_ID: setup_word, EXCEL_PROG_ID: setup_excel},
+            teardown={EXCEL_PROG_ID: teardown_excel},
+        )
+        # 进程退出（包括工作进程）时关闭池中的Office实例
+        multiprocessing.util.Finalize(_office_pool, _office_pool.close_all, exitpriority=10)
+    return _office_pool
+
+def replace_in_docx(doc_path, output_path):
+    """使用原生OOXML引擎替换.docx文档中的文本，无需启动Word"""
+    logging.info(f"使用原生引擎处理文件: {doc_path}")
     try:
-        # 生成临时输出文件路径
-        temp_dir = os.path.join(os.path.dirname(output_path), 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # 使用时间戳和随机数创建唯一的临时文件名
-        random_suffix = f"{int(time.time())}-{os.getpid()}-{hash(doc_path) % 10000}"
-        file_name = os.path.basename(doc_path)
-        file_base, file_ext = os.path.splitext(file_name)
-        temp_output_path = os.path.join(temp_dir, f"{file_base}_temp_{random_suffix}{file_ext}")
-        
-        logging.info(f"处理文件: {doc_path}")
-        
-        # 创建Word应用实例
-        word = win32.Dispatch("Word.Application")
-        word.Visible = False  # 设置为不可见
-        word.DisplayAlerts = not DISABLE_ALERTS  # 是否禁用警告
+        replacement_counts = ooxml_engine.replace_in_docx(doc_path, output_path, RULE_MATCHER)
+    except Exception as e:
+        logging.error(f"原生引擎处理Word文档时出错: {str(e)}")
+        if os.path.exists(output_path):
+            try:
+                os.remove(output_path)
+            except:
+                pass
+        return False, f"原生引擎处理失败: {str(e)}", 0
+    
+    metrics.add_rule_hits(replacement_counts)
+    total_replacements = sum(replacement_counts.values())
+    logging.info(f"文档处理完成: {doc_path} -> {output_path}")
+    logging.info(f"总共进行了 {total_replacements} 次替换")
+    for rule, count in replacement_counts.items():
+        logging.debug(f"  - 规则 '{rule}': {count} 次替换")
+    return True, "", total_replacements
+
+def replace_in_xlsx(excel_path, output_path):
+    """使用原生OOXML引擎替换.xlsx工作簿中的文本，无需启动Excel"""
+    logging.info(f"使用原生引擎处理Excel: {excel_path}")
+    replacement_counts = ooxml_engine.replace_in_xlsx(excel_path, output_path, RULE_MATCHER)
+    metrics.add_rule_hits(replacement_counts)
+    total_replace_count = sum(replacement_counts.values())
+    for rule, count in replacement_counts.items():
+        logging.debug(f"  - 规则 '{rule}': {count} 次替换")
+    logging.info(f"共替换了 {total_replace_count} 处内容: {output_path}")
+    return total_replace_count
+
+WORD_FIND_MAX_LENGTH = 255  # Word查找/替换文本的最大长度
+WORD_PARAGRAPH_MARK = '\r'  # Range.Text 中的段落分隔符
+
+def _escape_word_find(text):
+    """ 转义Word查找替换中的特殊字符 ^ """
+    return text.replace('^', '^^')
+
+def iter_word_stories(doc):
+    """ 遍历文档的所有部分：正文、页眉页脚、脚注尾注、文本框等 """
+    for story in doc.StoryRanges:
+        while story is not None:
+            yield story
+            story = story.NextStoryRange
+
+def _simulate_replace_all(text, steps):
+    """在内存中按顺序执行查找替换步骤（wdReplaceAll：从左到右、互不重叠），返回替换后的文本"""
+    for find_text, replace_text, _ in steps:
+        text = text.replace(find_text, replace_text)
+    return text
+
+def _replace_at_positions(story, story_text):
+    """按匹配器算出的位置从后向前逐处替换，已替换的部分不影响前面的位置"""
+    matches, _ = RULE_MATCHER.match_all(story_text, WORD_PARAGRAPH_MARK)
+    base = story.Start
+    for start, end, replacement in reversed(matches):
+        target = story.Duplicate
+        target.SetRange(base + start, base + end)
+        target.Text = replacement
+
+def replace_word_single_pass(doc):
+    """
+    单次替换：每个文档部分只读取一次文本，统计出命中的规则后，
+    对每条命中规则执行一次 wdReplaceAll，最后再读取一次文本，
+    通过残留匹配数校验替换结果并得出精确的替换次数。
+    
+    正则规则按其在文本中的实际匹配转换为普通文本的查找替换；
+    匹配按段落（\r 分隔）进行，与原生引擎逐段落处理的语义一致。
+    
+    按查找文本长度依次全部替换不一定符合"最左最长"语义（如规则 ab、bcd 作用于 "abcd"），
+    因此先在内存中模拟这些步骤，结果与匹配器不一致的部分改为按匹配器算出的位置逐处替换。
+    
+    Returns:
+        dict: 每条规则的替换次数
+    """
+    replacement_counts = {}
+    
+    for story in iter_word_stories(doc):
+        with metrics.phase('match'):
+            story_text = story.Text
+            hits = RULE_MATCHER.count(story_text, WORD_PARAGRAPH_MARK) if story_text else None
+        if not hits:
+            continue
         
-        # 设置Word选项
-        if WORD_SETTINGS['UPDATE_LINKS'] is not None:
-            word.Options.UpdateLinksAtOpen = WORD_SETTINGS['UPDATE_LINKS']
-        if WORD_SETTINGS['CONFIRM_CONVERSIONS'] is not None:
-            word.Options.ConfirmConversions = WORD_SETTINGS['CONFIRM_CONVERSIONS']
+        expected_text, _ = RULE_MATCHER.replace(story_text, WORD_PARAGRAPH_MARK)
+        with metrics.phase('replace'):
+            steps = RULE_MATCHER.replacement_steps(hits, story_text, WORD_PARAGRAPH_MARK)
+            if _simulate_replace_all(story_text, steps) != expected_text:
+                logging.info("规则的匹配相互重叠，按匹配位置逐处替换")
+                _replace_at_positions(story, story_text)
+                steps = []
+            for find_text, replace_text, rule in steps:
+                if len(find_text) > WORD_FIND_MAX_LENGTH or len(replace_text) > WORD_FIND_MAX_LENGTH:
+                    logging.warning(f"规则 '{rule or find_text}' 超过Word查找替换的长度限制，已跳过")
+                    continue
+                # 每条规则使用新的 Range 副本，避免查找结果改变原 Range 的范围
+                story.Duplicate.Find.Execute(
+                    FindText=_escape_word_find(find_text),
+                    ReplaceWith=_escape_word_find(replace_text),
+                    Replace=2,  # wdReplaceAll
+                    Forward=True,
+                    Wrap=0,  # wdFindStop
+                    Format=False,
+                    MatchCase=True,
+                    MatchWholeWord=False,
+                    MatchWildcards=False,
+                    MatchSoundsLike=False,
+                    MatchAllWordForms=False
+                )
         
-        # 打开文档
-        doc = word.Documents.Open(
-            doc_path,
-            ConfirmConversions=False,
-            ReadOnly=False,
-            AddToRecentFiles=False
-        )
+        # 校验：与在内存中一次性替换的预期结果比较，残留的匹配视为未替换
+        with metrics.phase('verify'):
+            updated_text = story.Text
+            if updated_text == expected_text:
+                ooxml_engine.merge_counts(replacement_counts, hits)
+                continue
+            logging.warning("替换后的文本与预期结果不一致，请检查输出文档")
+            residual = RULE_MATCHER.count(updated_text, WORD_PARAGRAPH_MARK)
+            expected_residual = RULE_MATCHER.count(expected_text, WORD_PARAGRAPH_MARK)
+            for rule, count in hits.items():
+                missed = max(0, residual.get(rule, 0) - expected_residual.get(rule, 0))
+                if missed:
+                    logging.warning(f"规则 '{rule}' 有 {missed} 处未能替换")
+                replacement_counts[rule] = replacement_counts.get(rule, 0) + count - missed
+    
+    for rule, count in replacement_counts.items():
+        logging.info(f"替换文本 '{rule}' -> '{REPLACE_RULES[rule]}': {count} 处")
+    return replacement_counts
+
+def replace_word_multi_strategy(word, doc):
+    """
+    旧版多策略替换：对每条规则依次执行Find逐项替换、全文内容替换和段落级替换，
+    然后抽样验证，必要时再执行一次全部替换。COM往返次数多，且全文替换会丢失格式。
+    
+    Returns:
+        dict: 每条规则的替换次数
+    """
+    replacement_counts = {}  # 用于记录每个规则的替换次数
+    
+    # 一次扫描统计所有规则的命中次数，只对有命中的规则执行替换
+    rule_hits = RULE_MATCHER.count(doc.Content.Text)
+    
+    # 添加一个替换确认机制，解决只计数不替换的问题
+    for old_text, new_text in REPLACE_RULES.items():
+        replacement_counts[old_text] = 0
+        if old_text in RULE_MATCHER.regex_rules:
+            logging.warning(f"旧版多策略替换不支持正则规则，已跳过: '{old_text}'（请使用 WORD_REPLACE_MODE = \"single\"）")
+            continue
         
-        # 添加一个替换确认机制，解决只计数不替换的问题
-        for old_text, new_text in REPLACE_RULES.items():
-            replacement_counts[old_text] = 0
-            
-            # 检查文档是否包含需要替换的文本
-            if old_text in doc.Content.Text:
-                # 收集替换前的样本，用于后续验证
-                sample_positions = []
-                try:
-                    doc_text = doc.Content.Text
-                    start_pos = 0
-                    max_samples = 5  # 最多收集5个样本
-                    samples_count = 0
+        # 检查文档是否包含需要替换的文本
+        if rule_hits.get(old_text):
+            # 收集替换前的样本，用于后续验证
+            sample_positions = []
+            try:
+                doc_text = doc.Content.Text
+                start_pos = 0
+                max_samples = 5  # 最多收集5个样本
+                samples_count = 0
+                
+                while samples_count < max_samples:
+                    pos = doc_text.find(old_text, start_pos)
+                    if pos == -1:
+                        break
                     
-                    while samples_count < max_samples:
-                        pos = doc_text.find(old_text, start_pos)
-                        if pos == -1:
-                            break
-                        
-                        sample_positions.append(pos)
-                        start_pos = pos + len(old_text)
-                        samples_count += 1
-                        
-                    logging.debug(f"找到文本 '{old_text}' 的 {len(sample_positions)} 个样本位置")
-                except Exception as e:
-                    logging.debug(f"收集样本位置时出错: {str(e)}")
+                    sample_positions.append(pos)
+                    start_pos = pos + len(old_text)
+                    samples_count += 1
+                    
+                logging.debug(f"找到文本 '{old_text}' 的 {len(sample_positions)} 个样本位置")
+            except Exception as e:
+                logging.debug(f"收集样本位置时出错: {str(e)}")
+            
+            # 执行替换操作 - 使用多种方法确保替换成功
+            logging.info(f"开始替换文本: '{old_text}' -> '{new_text}'")
+            
+            # 方法1: 使用Find替换 - 最可靠的方法
+            try:
+                # 选择整个文档
+                word.Selection.HomeKey(Unit=6)  # 6=wdStory, 移到文档开始
                 
-                # 执行替换操作 - 使用多种方法确保替换成功
-                logging.info(f"开始替换文本: '{old_text}' -> '{new_text}'")
+                # 设置查找和替换
+                find_obj = word.Selection.Find
+                find_obj.ClearFormatting()
+                find_obj.Text = old_text
+                find_obj.Replacement.ClearFormatting()
+                find_obj.Replacement.Text = new_text
                 
-                # 方法1: 使用Find替换 - 最可靠的方法
-                try:
-                    # 选择整个文档
-                    word.Selection.HomeKey(Unit=6)  # 6=wdStory, 移到文档开始
-                    
-                    # 设置查找和替换
-                    find_obj = word.Selection.Find
-                    find_obj.ClearFormatting()
-                    find_obj.Text = old_text
-                    find_obj.Replacement.ClearFormatting()
-                    find_obj.Replacement.Text = new_text
+                # 执行替换
+                replace_count = 0
+                found = find_obj.Execute(
+                    FindText=old_text,
+                    MatchCase=False,
+                    MatchWholeWord=False,
+                    MatchWildcards=False,
+                    MatchSoundsLike=False,
+                    MatchAllWordForms=False,
+                    Forward=True,
+                    Wrap=1  # wdFindContinue
+                )
+                
+                while found:
+                    # 手动执行替换，确保每次替换成功
+                    word.Selection.Text = new_text
+                    replace_count += 1
                     
-                    # 执行替换
-                    replace_count = 0
+                    # 继续查找下一个
                     found = find_obj.Execute(
                         FindText=old_text,
                         MatchCase=False,
@@ -156,176 +449,226 @@ def replace_in_word(doc_path, output_path, retries=0):
                         Forward=True,
                         Wrap=1  # wdFindContinue
                     )
+                
+                logging.info(f"Find方法替换了 {replace_count} 处")
+                replacement_counts[old_text] += replace_count
+            except Exception as find_err:
+                logging.warning(f"使用Find方法替换失败: {str(find_err)}")
+            
+            # 方法2: 直接文本替换 - 有些情况下更有效
+            try:
+                replaced = 0
+                content_text = doc.Content.Text
+                if old_text in content_text:
+                    # 计算原始匹配次数
+                    original_count = content_text.count(old_text)
                     
-                    while found:
-                        # 手动执行替换，确保每次替换成功
-                        word.Selection.Text = new_text
-                        replace_count += 1
-                        
-                        # 继续查找下一个
-                        found = find_obj.Execute(
-                            FindText=old_text,
-                            MatchCase=False,
-                            MatchWholeWord=False,
-                            MatchWildcards=False,
-                            MatchSoundsLike=False,
-                            MatchAllWordForms=False,
-                            Forward=True,
-                            Wrap=1  # wdFindContinue
-                        )
+                    # 执行替换
+                    new_content = content_text.replace(old_text, new_text)
+                    doc.Content.Text = new_content
                     
-                    logging.info(f"Find方法替换了 {replace_count} 处")
-                    replacement_counts[old_text] += replace_count
-                except Exception as find_err:
-                    logging.warning(f"使用Find方法替换失败: {str(find_err)}")
-                
-                # 方法2: 直接文本替换 - 有些情况下更有效
-                try:
-                    replaced = 0
-                    content_text = doc.Content.Text
-                    if old_text in content_text:
-                        # 计算原始匹配次数
-                        original_count = content_text.count(old_text)
-                        
-                        # 执行替换
-                        new_content = content_text.replace(old_text, new_text)
-                        doc.Content.Text = new_content
-                        
-                        # 计算替换数量差值
-                        replaced = original_count
-                        logging.info(f"直接替换文档内容成功，替换了 {replaced} 处")
+                    # 计算替换数量差值
+                    replaced = original_count
+                    logging.info(f"直接替换文档内容成功，替换了 {replaced} 处")
+                    
+                    # 如果直接替换导致替换计数增加，更新计数
+                    if replaced > replacement_counts[old_text]:
+                        replacement_counts[old_text] = replaced
+            except Exception as text_err:
+                logging.warning(f"直接文本替换失败: {str(text_err)}")
+            
+            # 方法3: 段落级别替换 - 更细粒度的控制
+            try:
+                para_replaced = 0
+                for i in range(1, doc.Paragraphs.Count + 1):
+                    try:
+                        para = doc.Paragraphs(i)
+                        para_text = para.Range.Text
                         
-                        # 如果直接替换导致替换计数增加，更新计数
-                        if replaced > replacement_counts[old_text]:
-                            replacement_counts[old_text] = replaced
-                except Exception as text_err:
-                    logging.warning(f"直接文本替换失败: {str(text_err)}")
+                        if old_text in para_text:
+                            # 计数并替换
+                            count_in_para = para_text.count(old_text)
+                            new_para_text = para_text.replace(old_text, new_text)
+                            para.Range.Text = new_para_text
+                            para_replaced += count_in_para
+                            logging.debug(f"在段落 {i} 中替换了 {count_in_para} 处")
+                    except Exception as para_err:
+                        logging.debug(f"处理段落 {i} 时出错: {str(para_err)}")
                 
-                # 方法3: 段落级别替换 - 更细粒度的控制
-                try:
-                    para_replaced = 0
-                    for i in range(1, doc.Paragraphs.Count + 1):
+                logging.info(f"段落级替换完成，共替换了 {para_replaced} 处")
+                
+                # 更新替换计数（取最大值）
+                if para_replaced > replacement_counts[old_text]:
+                    replacement_counts[old_text] = para_replaced
+            except Exception as para_method_err:
+                logging.warning(f"段落级替换失败: {str(para_method_err)}")
+            
+            # 验证替换是否成功
+            verified = False
+            try:
+                # 1. 检查文档中是否还存在原始文本
+                updated_content = doc.Content.Text
+                if old_text not in updated_content:
+                    verified = True
+                    logging.info(f"验证成功：文档中不再包含文本 '{old_text}'")
+                else:
+                    # 2. 验证之前找到的样本位置
+                    matches_replaced = 0
+                    for pos in sample_positions:
                         try:
-                            para = doc.Paragraphs(i)
-                            para_text = para.Range.Text
+                            # 检查样本位置文本是否被替换
+                            check_range = doc.Range(doc.Content.Start + pos, doc.Content.Start + pos + len(new_text))
+                            check_text = check_range.Text
                             
-                            if old_text in para_text:
-                                # 计数并替换
-                                count_in_para = para_text.count(old_text)
-                                new_para_text = para_text.replace(old_text, new_text)
-                                para.Range.Text = new_para_text
-                                para_replaced += count_in_para
-                                logging.debug(f"在段落 {i} 中替换了 {count_in_para} 处")
-                        except Exception as para_err:
-                            logging.debug(f"处理段落 {i} 时出错: {str(para_err)}")
-                    
-                    logging.info(f"段落级替换完成，共替换了 {para_replaced} 处")
+                            if check_text == new_text or old_text not in check_text:
+                                matches_replaced += 1
+                        except:
+                            pass
                     
-                    # 更新替换计数（取最大值）
-                    if para_replaced > replacement_counts[old_text]:
-                        replacement_counts[old_text] = para_replaced
-                except Exception as para_method_err:
-                    logging.warning(f"段落级替换失败: {str(para_method_err)}")
-                
-                # 验证替换是否成功
-                verified = False
-                try:
-                    # 1. 检查文档中是否还存在原始文本
-                    updated_content = doc.Content.Text
-                    if old_text not in updated_content:
+                    # 如果大部分样本位置已被替换，认为验证成功
+                    if matches_replaced > 0 and matches_replaced >= len(sample_positions) / 2:
                         verified = True
-                        logging.info(f"验证成功：文档中不再包含文本 '{old_text}'")
+                        logging.info(f"验证成功：{matches_replaced}/{len(sample_positions)} 个样本位置已被替换")
                     else:
-                        # 2. 验证之前找到的样本位置
-                        matches_replaced = 0
-                        for pos in sample_positions:
-                            try:
-                                # 检查样本位置文本是否被替换
-                                check_range = doc.Range(doc.Content.Start + pos, doc.Content.Start + pos + len(new_text))
-                                check_text = check_range.Text
-                                
-                                if check_text == new_text or old_text not in check_text:
-                                    matches_replaced += 1
-                            except:
-                                pass
-                        
-                        # 如果大部分样本位置已被替换，认为验证成功
-                        if matches_replaced > 0 and matches_replaced >= len(sample_positions) / 2:
-                            verified = True
-                            logging.info(f"验证成功：{matches_replaced}/{len(sample_positions)} 个样本位置已被替换")
-                        else:
-                            logging.warning(f"验证失败：只有 {matches_replaced}/{len(sample_positions)} 个样本位置被替换")
-                except Exception as verify_err:
-                    logging.warning(f"验证替换时出错: {str(verify_err)}")
+                        logging.warning(f"验证失败：只有 {matches_replaced}/{len(sample_positions)} 个样本位置被替换")
+            except Exception as verify_err:
+                logging.warning(f"验证替换时出错: {str(verify_err)}")
+            
+            # 如果验证失败但有替换计数，尝试最后的强制替换
+            if not verified and replacement_counts[old_text] > 0:
+                logging.warning(f"检测到替换可能未成功执行，尝试最终的强制替换方法")
                 
-                # 如果验证失败但有替换计数，尝试最后的强制替换
-                if not verified and replacement_counts[old_text] > 0:
-                    logging.warning(f"检测到替换可能未成功执行，尝试最终的强制替换方法")
+                try:
+                    # 使用替代方法强制替换
+                    replacement_counts[old_text] = 0  # 重置计数
                     
-                    try:
-                        # 使用替代方法强制替换
-                        replacement_counts[old_text] = 0  # 重置计数
-                        
-                        # 方法4: 使用文档对象模型的Replace方法
-                        word.Selection.HomeKey(Unit=6)  # 移到文档开始
-                        word.Selection.Find.ClearFormatting()
-                        word.Selection.Find.Replacement.ClearFormatting()
-                        
-                        # 执行全文档替换
-                        replace_all_count = word.Selection.Find.Execute(
-                            FindText=old_text,
-                            ReplaceWith=new_text,
-                            Replace=2,  # wdReplaceAll
-                            Forward=True,
-                            MatchCase=False,
-                            MatchWholeWord=False,
-                            MatchWildcards=False,
-                            MatchSoundsLike=False,
-                            MatchAllWordForms=False
-                        )
-                        
-                        if replace_all_count:
-                            logging.info(f"强制替换成功，替换次数: {replace_all_count}")
-                            replacement_counts[old_text] = replace_all_count
-                            verified = True
-                    except Exception as force_err:
-                        logging.error(f"强制替换失败: {str(force_err)}")
-                
-                # 如果还是失败，标记为0替换，避免错误计数
-                if not verified and replacement_counts[old_text] > 0:
-                    logging.warning(f"文本 '{old_text}' 替换验证失败，实际可能未替换，重置计数为0")
-                    replacement_counts[old_text] = 0
-            else:
-                logging.debug(f"文档中不包含文本 '{old_text}'")
+                    # 方法4: 使用文档对象模型的Replace方法
+                    word.Selection.HomeKey(Unit=6)  # 移到文档开始
+                    word.Selection.Find.ClearFormatting()
+                    word.Selection.Find.Replacement.ClearFormatting()
+                    
+                    # 执行全文档替换
+                    replace_all_count = word.Selection.Find.Execute(
+                        FindText=old_text,
+                        ReplaceWith=new_text,
+                        Replace=2,  # wdReplaceAll
+                        Forward=True,
+                        MatchCase=False,
+                        MatchWholeWord=False,
+                        MatchWildcards=False,
+                        MatchSoundsLike=False,
+                        MatchAllWordForms=False
+                    )
+                    
+                    if replace_all_count:
+                        logging.info(f"强制替换成功，替换次数: {replace_all_count}")
+                        replacement_counts[old_text] = replace_all_count
+                        verified = True
+                except Exception as force_err:
+                    logging.error(f"强制替换失败: {str(force_err)}")
+            
+            # 如果还是失败，标记为0替换，避免错误计数
+            if not verified and replacement_counts[old_text] > 0:
+                logging.warning(f"文本 '{old_text}' 替换验证失败，实际可能未替换，重置计数为0")
+                replacement_counts[old_text] = 0
+        else:
+            logging.debug(f"文档中不包含文本 '{old_text}'")
+    
+    return replacement_counts
+
+def replace_in_word(doc_path, output_path):
+    """
+    在Word文档中替换文本，并保留格式
+    
+    暂时性错误（文件被占用、Word忙等）按重试策略退避重试，永久性错误（文件损坏等）立即失败。
+    
+    Returns:
+        tuple: (是否成功, 错误信息, 替换次数)
+    """
+    if win32 is None and _office_pool is None:
+        logging.error(f"未安装 pywin32，无法使用Word处理文件: {doc_path}")
+        return False, "未安装 pywin32，无法启动Word", 0
+    
+    try:
+        total_replacements = retry_policy.call_with_retry(
+            lambda: _replace_in_word_once(doc_path, output_path),
+            'word', RETRY_POLICY, CIRCUIT_BREAKER_THRESHOLD
+        )
+    except Exception as e:
+        return False, str(e), 0
+    return True, "", total_replacements
+
+def _replace_in_word_once(doc_path, output_path):
+    """
+    用Word处理一次文档，失败时抛出异常（由 replace_in_word 决定是否重试）
+    
+    Returns:
+        int: 替换次数
+    """
+    word = None
+    doc = None
+    replacement_counts = {}  # 用于记录每个规则的替换次数
+    total_replacements = 0  # 总替换次数
+    success = False
+    error_msg = ""
+    
+    try:
+        logging.info(f"处理文件: {doc_path}")
+        
+        # 从实例池获取Word应用实例，通过计数代理统计（并限制）COM调用次数
+        word = get_office_pool().acquire(WORD_PROG_ID)
+        com_counter = ComCallCounter(COM_CALL_BUDGET)
+        word_app = com_counter.wrap(word)
+        
+        # 打开文档
+        with metrics.phase('open'):
+            doc = word_app.Documents.Open(
+                doc_path,
+                ConfirmConversions=False,
+                ReadOnly=False,
+                AddToRecentFiles=False
+            )
+        
+        # 执行替换
+        if WORD_REPLACE_MODE == "multi":
+            with metrics.phase('replace'):
+                replacement_counts = replace_word_multi_strategy(word_app, doc)
+        else:
+            replacement_counts = replace_word_single_pass(doc)
+        logging.info(f"本文档COM调用次数: {com_counter.calls}")
+        metrics.current().com_calls += com_counter.calls
+        metrics.add_rule_hits(replacement_counts)
         
         # 计算总替换次数
         for count in replacement_counts.values():
             total_replacements += count
         
-        # 保存文档
+        # 保存文档：调用方传入的输出路径位于输出文件夹的暂存目录中，保存后由调用方原子发布
+        save_start = time.perf_counter()
         try:
-            doc.SaveAs2(temp_output_path)
+            doc.SaveAs2(output_path)
             success = True
         except Exception as save_err:
             logging.warning(f"SaveAs2保存失败: {str(save_err)}，尝试其他方法")
             
             try:
-                doc.SaveAs(temp_output_path)
+                doc.SaveAs(output_path)
                 success = True
             except Exception as save_err2:
                 logging.warning(f"SaveAs保存失败: {str(save_err2)}，尝试复制方法")
                 
                 try:
-                    shutil.copy2(doc_path, temp_output_path)
+                    shutil.copy2(doc_path, output_path)
                     doc.Save()
-                    shutil.copy2(doc_path, temp_output_path)
+                    shutil.copy2(doc_path, output_path)
                     success = True
                 except Exception as save_err3:
                     logging.error(f"所有保存方法都失败: {str(save_err3)}")
                     error_msg = f"保存文件失败: {str(save_err3)}"
                     success = False
+        metrics.current().add_phase('save', time.perf_counter() - save_start)
         
-        # 关闭文档和Word应用
+        # 关闭文档，Word实例归还到实例池
         if doc:
             try:
                 doc.Close(0)  # 不保存更改
@@ -333,60 +676,27 @@ def replace_in_word(doc_path, output_path, retries=0):
                 pass
         
         if word:
-            try:
-                word.Quit()
-            except:
-                pass
+            get_office_pool().release(WORD_PROG_ID)
+            word = None
         
-        # 如果处理成功，移动文件到目标位置
-        if success:
-            try:
-                # 确保输出目录存在
-                output_dir = os.path.dirname(output_path)
-                if not os.path.exists(output_dir):
-                    os.makedirs(output_dir, exist_ok=True)
-                
-                # 如果目标文件已存在，先删除
-                if os.path.exists(output_path):
-                    try:
-                        os.remove(output_path)
-                    except Exception as remove_err:
-                        logging.warning(f"删除现有输出文件失败: {str(remove_err)}")
-                
-                # 移动临时文件到最终位置
-                safe_file_operation(temp_output_path, output_path)
-                
-                if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                    logging.info(f"文档处理完成: {doc_path} -> {output_path}")
-                    logging.info(f"总共进行了 {total_replacements} 次替换")
-                    
-                    # 列出每条规则的替换次数
-                    for rule, count in replacement_counts.items():
-                        if count > 0:
-                            logging.debug(f"  - 规则 '{rule}': {count} 次替换")
-                else:
-                    raise Exception("移动临时文件到输出位置失败")
-            except Exception as move_err:
-                logging.error(f"移动处理后的文件失败: {str(move_err)}")
-                error_msg = f"移动文件失败: {str(move_err)}"
-                success = False
-                
-                # 尝试重新处理
-                return replace_in_word(doc_path, output_path, retries + 1)
+        if not success:
+            raise RuntimeError(error_msg)
+        if not (os.path.exists(output_path) and os.path.getsize(output_path) > 0):
+            raise RuntimeError(f"保存后的文件不存在或为空: {output_path}")
+        logging.info(f"文档处理完成: {doc_path} -> {output_path}")
+        logging.info(f"总共进行了 {total_replacements} 次替换")
         
-        # 清理临时文件
-        if temp_output_path and os.path.exists(temp_output_path):
-            try:
-                os.remove(temp_output_path)
-            except:
-                logging.debug(f"无法删除临时文件: {temp_output_path}")
+        # 列出每条规则的替换次数
+        for rule, count in replacement_counts.items():
+            if count > 0:
+                logging.debug(f"  - 规则 '{rule}': {count} 次替换")
         
-        return success, error_msg, total_replacements
+        return total_replacements
     
     except Exception as e:
         logging.error(f"处理Word文档时出错: {str(e)}")
         
-        # 关闭文档和Word应用
+        # 关闭文档，出错的Word实例直接回收
         if doc:
             try:
                 doc.Close(0)  # 不保存更改
@@ -394,97 +704,70 @@ def replace_in_word(doc_path, output_path, retries=0):
                 pass
         
         if word:
-            try:
-                word.Quit()
-            except:
-                pass
+            get_office_pool().release(WORD_PROG_ID, healthy=False)
         
-        # 清理临时文件
-        if temp_output_path and os.path.exists(temp_output_path):
+        # 清理未完成的输出文件
+        if os.path.exists(output_path):
             try:
-                os.remove(temp_output_path)
+                os.remove(output_path)
             except:
-                logging.debug(f"无法删除临时文件: {temp_output_path}")
-        
-        # 尝试重新处理
-        return replace_in_word(doc_path, output_path, retries + 1)
+                logging.debug(f"无法删除未完成的输出文件: {output_path}")
+        raise
+
+def replace_in_excel(excel_path, output_path):
+    """
+    使用微软 Excel API 替换文本
+    
+    暂时性错误按重试策略退避重试，永久性错误立即失败。
+    
+    Returns:
+        int: 替换次数
+    """
+    if win32 is None and _office_pool is None:
+        raise RuntimeError("未安装 pywin32，无法启动Excel")
+    return retry_policy.call_with_retry(
+        lambda: _replace_in_excel_once(excel_path, output_path),
+        'excel', RETRY_POLICY, CIRCUIT_BREAKER_THRESHOLD
+    )
 
-def replace_in_excel(excel_path, output_path, retries=0):
-    """ 使用微软 Excel API 替换文本 """
+def _replace_in_excel_once(excel_path, output_path):
+    """ 用Excel处理一次工作簿，失败时抛出异常（由 replace_in_excel 决定是否重试） """
     excel = None
     workbook = None
+    healthy = True
+    com_counter = ComCallCounter()
     try:
-        excel = win32.Dispatch("Excel.Application")
-        excel.Visible = False  # 不显示 Excel 窗口
-        
-        # 禁用所有提示和警告
-        if DISABLE_ALERTS:
-            excel.DisplayAlerts = False
-            excel.AskToUpdateLinks = EXCEL_SETTINGS['UPDATE_LINKS']
-            excel.AlertBeforeOverwriting = False
-            excel.FeatureInstall = 0  # msoFeatureInstallNone
-            excel.EnableEvents = False  # 禁用所有自动事件
-            excel.ScreenUpdating = False  # 禁用屏幕更新
+        # 从实例池获取Excel应用实例，通过计数代理统计COM调用次数
+        excel = get_office_pool().acquire(EXCEL_PROG_ID)
+        excel_app = com_counter.wrap(excel)
         
         logging.info(f"打开Excel: {excel_path}")
-        workbook = excel.Workbooks.Open(
-            excel_path, 
-            UpdateLinks=1 if EXCEL_SETTINGS['UPDATE_LINKS'] else 0,  # 0=不更新, 1=更新
-            ReadOnly=False, 
-            AddToMru=False, 
-            CorruptLoad=2  # 忽略无效记录，尝试恢复
-        )
+        with metrics.phase('open'):
+            workbook = excel_app.Workbooks.Open(
+                excel_path, 
+                UpdateLinks=1 if EXCEL_SETTINGS['UPDATE_LINKS'] else 0,  # 0=不更新, 1=更新
+                ReadOnly=False, 
+                AddToMru=False, 
+                CorruptLoad=2  # 忽略无效记录，尝试恢复
+            )
 
         total_replace_count = 0  # 总替换次数
         
         for sheet in workbook.Sheets:
-            sheet.Activate()  # 确保当前工作表被激活
-            
-            # 获取工作表的使用范围
-            used_range = sheet.UsedRange
-            if used_range is None or used_range.Cells.Count == 0:
+            # 整个使用区域一次读取，在内存中替换后按变化块写回
+            try:
+                sheet_counts, cell_total = excel_bulk.replace_in_used_range(sheet, RULE_MATCHER)
+            except Exception as sheet_err:
+                logging.warning(f"在工作表'{sheet.Name}'中替换时出错: {str(sheet_err)}")
+                continue
+            if not cell_total:
                 continue  # 跳过空工作表
                 
-            logging.info(f"处理工作表: {sheet.Name}, 包含 {used_range.Cells.Count} 个单元格")
-            
-            for old_text, new_text in REPLACE_RULES.items():
-                try:
-                    # 替换前先获取匹配数量
-                    # 创建一个临时数组存储所有匹配单元格的值
-                    cell_values = []
-                    for row in range(1, used_range.Rows.Count + 1):
-                        for col in range(1, used_range.Columns.Count + 1):
-                            try:
-                                cell_value = used_range.Cells(row, col).Value
-                                if cell_value and old_text in str(cell_value):
-                                    cell_values.append(str(cell_value))
-                            except:
-                                pass
-                    
-                    # 计算将会替换的次数
-                    matches_in_sheet = 0
-                    for value in cell_values:
-                        # 计算每个单元格中旧文本出现的次数
-                        if isinstance(value, str):
-                            matches_in_sheet += value.count(old_text)
-                    
-                    if matches_in_sheet > 0:
-                        logging.info(f"工作表 '{sheet.Name}' 中找到 '{old_text}' {matches_in_sheet} 次")
-                        
-                    # 执行替换
-                    sheet.Cells.Replace(
-                        What=old_text, 
-                        Replacement=new_text, 
-                        LookAt=2,  # 2 = xlPart (匹配部分文本)
-                        SearchOrder=1,  # 1 = xlByRows
-                        MatchCase=False
-                    )
-                    
-                    # 增加替换计数
-                    total_replace_count += matches_in_sheet
-                    
-                except Exception as sheet_err:
-                    logging.warning(f"在工作表'{sheet.Name}'中替换'{old_text}'时出错: {str(sheet_err)}")
+            logging.info(f"处理工作表: {sheet.Name}, 包含 {cell_total} 个单元格")
+            for rule, matches_in_sheet in sheet_counts.items():
+                logging.info(f"工作表 '{sheet.Name}' 中替换 '{rule}' {matches_in_sheet} 次")
+                total_replace_count += matches_in_sheet
+            metrics.add_rule_hits(sheet_counts)
 
         # 处理工作簿属性
         try:
@@ -492,13 +775,12 @@ def replace_in_excel(excel_path, output_path, retries=0):
                 try:
                     prop_value = getattr(workbook.BuiltInDocumentProperties, prop_name).Value
                     if prop_value:
-                        for old_text, new_text in REPLACE_RULES.items():
-                            if old_text in prop_value:
-                                # 计算属性中的替换次数
-                                matches_in_prop = prop_value.count(old_text)
-                                new_prop_value = prop_value.replace(old_text, new_text)
-                                setattr(workbook.BuiltInDocumentProperties, prop_name, new_prop_value)
-                                total_replace_count += matches_in_prop
+                        # 计算属性中的替换次数
+                        new_prop_value, prop_counts = RULE_MATCHER.replace(prop_value)
+                        if prop_counts:
+                            setattr(workbook.BuiltInDocumentProperties, prop_name, new_prop_value)
+                            total_replace_count += sum(prop_counts.values())
+                            metrics.add_rule_hits(prop_counts)
                 except:
                     pass  # 忽略单个属性错误
         except:
@@ -506,18 +788,27 @@ def replace_in_excel(excel_path, output_path, retries=0):
 
         logging.info(f"共替换了 {total_replace_count} 处内容，正在保存: {output_path}")
         # 使用更详细的SaveAs参数，指定格式以避免弹出保存对话框
-        workbook.SaveAs(
-            output_path, 
-            AddToMru=False, 
-            FileFormat=excel.DefaultSaveFormat,
-            ConflictResolution=2  # 2=覆盖
-        )
+        with metrics.phase('save'):
+            workbook.SaveAs(
+                output_path, 
+                AddToMru=False, 
+                FileFormat=excel_app.DefaultSaveFormat,
+                ConflictResolution=2  # 2=覆盖
+            )
         return total_replace_count
     except Exception as e:
         logging.error(f"Excel替换错误: {str(e)}")
-        if retries < MAX_RETRIES:
-            logging.info(f"重试 ({retries + 1}/{MAX_RETRIES})...")
-            return replace_in_excel(excel_path, output_path, retries + 1)
+        healthy = False
+        if workbook:
+            try:
+                workbook.Close(SaveChanges=False)
+            except:
+                pass
+            workbook = None
+        if excel:
+            # 出错的Excel实例直接回收，重试时使用新实例
+            get_office_pool().release(EXCEL_PROG_ID, healthy=False)
+            excel = None
         raise
     finally:
         if workbook:
@@ -526,21 +817,136 @@ def replace_in_excel(excel_path, output_path, retries=0):
             except:
                 pass
         if excel:
+            # Excel实例归还到实例池
+            get_office_pool().release(EXCEL_PROG_ID, healthy=healthy)
+        metrics.current().com_calls += com_counter.calls
+
+def count_in_word(doc_path):
+    """ 以只读方式用Word打开文档，统计每条规则的命中次数（试运行），不保存任何修改 """
+    if win32 is None and _office_pool is None:
+        raise RuntimeError("未安装 pywin32，无法启动Word")
+    
+    word = get_office_pool().acquire(WORD_PROG_ID)
+    healthy = True
+    doc = None
+    com_counter = ComCallCounter(COM_CALL_BUDGET)
+    try:
+        with metrics.phase('open'):
+            doc = com_counter.wrap(word).Documents.Open(
+                doc_path,
+                ConfirmConversions=False,
+                ReadOnly=True,
+                AddToRecentFiles=False
+            )
+        counts = {}
+        with metrics.phase('match'):
+            for story in iter_word_stories(doc):
+                story_text = story.Text
+                if story_text:
+                    ooxml_engine.merge_counts(counts, RULE_MATCHER.count(story_text, WORD_PARAGRAPH_MARK))
+        return counts
+    except Exception:
+        healthy = False
+        raise
+    finally:
+        if doc:
+            try:
+                doc.Close(0)  # 不保存更改
+            except:
+                pass
+        get_office_pool().release(WORD_PROG_ID, healthy=healthy)
+        metrics.current().com_calls += com_counter.calls
+
+def count_in_excel(excel_path):
+    """ 以只读方式用Excel打开工作簿，统计每条规则的命中次数（试运行），不保存任何修改 """
+    if win32 is None and _office_pool is None:
+        raise RuntimeError("未安装 pywin32，无法启动Excel")
+    
+    excel = get_office_pool().acquire(EXCEL_PROG_ID)
+    healthy = True
+    workbook = None
+    com_counter = ComCallCounter()
+    try:
+        with metrics.phase('open'):
+            workbook = com_counter.wrap(excel).Workbooks.Open(
+                excel_path,
+                UpdateLinks=0,
+                ReadOnly=True,
+                AddToMru=False,
+                CorruptLoad=2
+            )
+        counts = {}
+        for sheet in workbook.Sheets:
+            try:
+                sheet_counts, _ = excel_bulk.replace_in_used_range(sheet, RULE_MATCHER, dry_run=True)
+            except Exception as sheet_err:
+                logging.warning(f"统计工作表'{sheet.Name}'时出错: {str(sheet_err)}")
+                continue
+            ooxml_engine.merge_counts(counts, sheet_counts)
+        for prop_name in ["Title", "Subject", "Keywords", "Comments"]:
+            try:
+                prop_value = getattr(workbook.BuiltInDocumentProperties, prop_name).Value
+                if prop_value:
+                    ooxml_engine.merge_counts(counts, RULE_MATCHER.count(prop_value))
+            except:
+                pass  # 忽略单个属性错误
+        return counts
+    except Exception:
+        healthy = False
+        raise
+    finally:
+        if workbook:
             try:
-                # 恢复Excel设置并退出
-                if DISABLE_ALERTS:
-                    excel.DisplayAlerts = True
-                    excel.EnableEvents = True
-                    excel.ScreenUpdating = True
-                excel.Quit()
+                workbook.Close(SaveChanges=False)
             except:
                 pass
+        get_office_pool().release(EXCEL_PROG_ID, healthy=healthy)
+        metrics.current().com_calls += com_counter.calls
+
+def _native_docx_backend(input_path, output_path):
+    """ 原生引擎处理 .docx，失败时抛出异常以便改用下一个引擎 """
+    success, error_msg, replace_count = replace_in_docx(input_path, output_path)
+    if not success:
+        raise RuntimeError(error_msg)
+    return replace_count
+
+def _word_backend(input_path, output_path):
+    """ Word处理 .doc/.docx，失败时抛出异常 """
+    success, error_msg, replace_count = replace_in_word(input_path, output_path)
+    if not success:
+        raise RuntimeError(error_msg)
+    return replace_count
+
+def office_available():
+    """ 是否可以使用Word/Excel（已安装 pywin32，或已注入测试用的实例池） """
+    return win32 is not None or _office_pool is not None
+
+# 处理引擎注册表：每种格式按优先顺序排列，格式根据文件内容识别
+_NATIVE_DOCX_BACKEND = backends.Backend(
+    'native-docx', _native_docx_backend,
+    counter=lambda path: ooxml_engine.count_in_docx(path, RULE_MATCHER),
+    available=lambda: NATIVE_OOXML
+)
+_NATIVE_XLSX_BACKEND = backends.Backend(
+    'native-xlsx', replace_in_xlsx,
+    counter=lambda path: ooxml_engine.count_in_xlsx(path, RULE_MATCHER),
+    available=lambda: NATIVE_OOXML
+)
+_WORD_BACKEND = backends.Backend('word', _word_backend, counter=count_in_word,
+                                 needs_office=True, available=office_available)
+_EXCEL_BACKEND = backends.Backend('excel', replace_in_excel, counter=count_in_excel,
+                                  needs_office=True, available=office_available)
+backends.register(backends.FORMAT_DOCX, _NATIVE_DOCX_BACKEND)
+backends.register(backends.FORMAT_DOCX, _WORD_BACKEND)
+backends.register(backends.FORMAT_XLSX, _NATIVE_XLSX_BACKEND)
+backends.register(backends.FORMAT_XLSX, _EXCEL_BACKEND)
+backends.register(backends.FORMAT_DOC, _WORD_BACKEND)
+backends.register(backends.FORMAT_XLS, _EXCEL_BACKEND)
 
 def backup_file(file_path):
     """ 备份原始文件 """
     backup_dir = os.path.join(os.path.dirname(file_path), "备份_" + datetime.now().strftime("%Y%m%d"))
-    if not os.path.exists(backup_dir):
-        os.makedirs(backup_dir)
+    os.makedirs(backup_dir, exist_ok=True)  # 多个节点可能同时创建
     
     filename = os.path.basename(file_path)
     backup_path = os.path.join(backup_dir, filename)
@@ -591,199 +997,930 @@ def safe_file_operation(source, dest, operation="move", retries=3):
     logging.error(f"文件{operation}操作失败，已达到最大重试次数")
     return False
 
-def batch_process():
-    """ 处理文件夹中的所有 Word 和 Excel 文件 """
+def publish_file(staged_path, dest, retries=3):
+    """
+    将暂存文件原子地发布到输出位置
+    
+    暂存目录与输出文件夹位于同一磁盘，os.replace 只是一次重命名，不复制数据；
+    目标文件已存在时直接覆盖，读取方不会看到写了一半的文件。
+    
+    Returns:
+        bool: 是否成功
+    """
+    for attempt in range(retries):
+        try:
+            os.replace(staged_path, dest)
+            logging.info(f"已发布文件: {dest}")
+            return True
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                # 暂存文件不在同一磁盘上（如调用方指定了其他暂存目录），只能复制后删除
+                return safe_file_operation(staged_path, dest, "move")
+            # Windows 上目标文件被其他程序打开时会失败，稍后重试
+            logging.warning(f"发布文件失败 (尝试 {attempt+1}/{retries}): {str(e)}")
+            time.sleep(0.5)
+    logging.error(f"发布文件失败，已达到最大重试次数: {dest}")
+    return False
+
+_FICLONE = 0x40049409  # Linux ioctl：在 Btrfs/XFS 等文件系统上创建共享数据块的副本（reflink）
+
+def reflink_file(source, dest):
+    """
+    以写时复制方式克隆文件，不实际复制数据；文件系统或平台不支持时返回 False
+    """
+    if fcntl is None:
+        return False
+    try:
+        with open(source, 'rb') as src, open(dest, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        shutil.copystat(source, dest)
+        return True
+    except OSError:
+        try:
+            os.remove(dest)
+        except OSError:
+            pass
+        return False
+
+def process_file(filename, temp_dir, input_path=None, output_path=None):
+    """
+    处理单个文件，可在主进程或工作进程中执行
+    
+    Args:
+        filename: 相对于源文件夹的文件路径，输出到输出文件夹中的相同相对位置
+        temp_dir: 暂存目录，与输出位置位于同一磁盘，处理结果先写入这里再原子地发布
+        input_path: 实际读取的文件（如流水线预读到本地的副本），默认为源文件夹中的文件
+        output_path: 输出位置，默认为输出文件夹中的相同相对位置
+    
+    Returns:
+        dict: 处理结果，包括 filename, replace_count, status, outcome, process_time
+              outcome 为 "success"、"passthrough"（预筛选无匹配直接复制）、"failed"、"skipped"
+              或 "unprocessed"（处理结果无法发布，输出位置改为原文件的副本，按失败统计，不写入增量清单）；
+              启用增量处理时成功的结果还包括 source_stat 和 source_hash，用于写入增量清单；
+              metrics 为本文档的分阶段耗时、读写字节数、COM调用次数和规则命中次数
+    """
+    file_start_time = time.time()
+    source_path = os.path.join(SOURCE_FOLDER, filename)
+    if input_path is None:
+        input_path = source_path
+    source_stat = None
+    source_hash = None
+    
+    # 先写入暂存文件，完成后再发布到输出位置
+    timestamp = int(time.time())
+    random_suffix = os.urandom(4).hex()  # 添加随机后缀避免文件名冲突
+    temp_output_path = os.path.join(temp_dir, f"temp_{timestamp}_{random_suffix}_{os.path.basename(filename)}")
+    final_output_path = output_path or os.path.join(OUTPUT_FOLDER, filename)
+    
+    logging.info(f"开始处理文件: {filename}")
+    replace_count = 0
+    outcome = "success"
+    document_metrics = metrics.start_document(filename)
+
+    # 如果启用备份，先备份文件
+    if BACKUP_ORIGINAL:
+        backup_file(source_path)
+
+    try:
+        # 首先检查文件是否实际存在
+        if not os.path.isfile(input_path):
+            logging.error(f"文件不存在: {input_path}")
+            raise FileNotFoundError(f"找不到文件: {input_path}")
+            
+        # 输出文件夹中创建与源文件相同的子文件夹
+        output_dir = os.path.dirname(final_output_path)
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+            
+        # 检查文件大小，避免处理空文件
+        stat = os.stat(input_path)
+        source_stat = (stat.st_size, stat.st_mtime_ns)
+        file_size = stat.st_size
+        fmt = backends.detect_format(input_path) if file_size else None
+        engines = backends.engines_for(fmt)
+        if file_size == 0:
+            logging.warning(f"跳过空文件: {filename}")
+            status = "⚠️ 跳过"
+            replace_count = "--"
+            outcome = "skipped"
+            
+        elif not engines:
+            if fmt is None:
+                logging.warning(f"不支持的文件类型: {filename}")
+            else:
+                logging.warning(f"没有可用的处理引擎（格式: {fmt}）: {filename}")
+            status = "⚠️ 跳过"
+            replace_count = "--"
+            outcome = "skipped"
+            
+        elif PREFILTER and prefilter_no_matches(input_path, fmt):
+            # 预筛选：文档中没有任何匹配，无需打开处理，直接发布到输出目录
+            logging.info(f"预筛选未发现匹配，直接复制: {filename}")
+            with metrics.phase('move'):
+                if not link_or_copy(input_path, final_output_path, temp_dir):
+                    raise Exception("无法复制文件")
+            status = "⏩ 直通"
+            replace_count = 0
+            outcome = "passthrough"
+            
+        else:
+            # 按优先顺序尝试各处理引擎，先处理到暂存文件
+            backend_name, replace_count = backends.run_backends(engines, input_path, temp_output_path)
+            logging.info(f"使用引擎 {backend_name} 处理完成: {filename}")
+            
+            # 原子地发布到最终位置
+            with metrics.phase('move'):
+                moved = publish_file(temp_output_path, final_output_path)
+            if moved:
+                status = "✅ 成功"
+            elif link_or_copy(input_path, final_output_path, temp_dir):
+                # 发布失败，改为直接复制源文件
+                logging.warning(f"无法发布处理结果，已直接复制原文件: {filename}")
+                status = "⚠️ 未处理"
+                replace_count = 0
+                outcome = "unprocessed"
+            else:
+                raise Exception("无法保存处理后的文件")
+    except Exception as e:
+        logging.error(f"处理失败: {str(e)}")
+        outcome = "failed"
+        status = "❌ 失败"
+        replace_count = "--"
+        # 清理可能残留的临时文件
+        if os.path.exists(temp_output_path):
+            try:
+                os.remove(temp_output_path)
+                logging.info(f"已清理临时文件: {temp_output_path}")
+            except:
+                pass
+
+    # 记录源文件内容哈希，供增量清单使用
+    if INCREMENTAL and outcome in ("success", "passthrough"):
+        try:
+            source_hash = manifest.file_digest(input_path)
+        except Exception as hash_err:
+            logging.warning(f"计算文件哈希失败: {str(hash_err)}")
+    
+    # 记录读写的字节数
+    if outcome in ("success", "passthrough"):
+        document_metrics.bytes_read = source_stat[0]
+        try:
+            document_metrics.bytes_written = os.path.getsize(final_output_path)
+        except OSError:
+            pass
+
+    return {
+        'filename': filename,
+        'replace_count': replace_count,
+        'status': status,
+        'outcome': outcome,
+        'process_time': time.time() - file_start_time,
+        'source_stat': source_stat,
+        'source_hash': source_hash,
+        'metrics': metrics.finish_document(),
+    }
+
+def prefilter_no_matches(input_path, fmt=None):
+    """ 预筛选确定文档中没有任何匹配时返回 True，耗时计入匹配阶段 """
+    with metrics.phase('match'):
+        return prefilter.package_has_matches(input_path, RULE_MATCHER, fmt) is False
+
+def cached_result(filename, entry):
+    """ 根据增量清单记录生成的处理结果（文件未变化，无需重新处理） """
+    return {
+        'filename': filename,
+        'replace_count': entry.get('replace_count', 0),
+        'status': "♻️ 缓存",
+        'outcome': "cached",
+        'process_time': 0.0,
+        'source_stat': None,
+        'source_hash': None,
+        'metrics': None,
+    }
+
+def count_file(filename):
+    """
+    试运行：只读统计单个文件中每条规则的命中次数，不写出任何文件
+    
+    按文件内容识别格式，使用与实际处理相同的引擎顺序：.docx/.xlsx 由原生引擎只读统计，无需启动Office；
+    .doc/.xls 以只读方式通过Office统计。
+    
+    Returns:
+        dict: filename, counts（{规则: 命中次数}，无法统计时为 None）, status, outcome, process_time
+              outcome 为 "counted"、"skipped" 或 "failed"
+    """
+    start_time = time.time()
+    input_path = os.path.join(SOURCE_FOLDER, filename)
+    counts = None
+    outcome = "counted"
+    status = "🔍 已统计"
+    try:
+        fmt = backends.detect_format(input_path) if os.path.getsize(input_path) else None
+        engines = [backend for backend in backends.engines_for(fmt) if backend.counter is not None]
+        if not engines:
+            outcome, status = "skipped", "⚠️ 跳过"
+        elif PREFILTER and prefilter.package_has_matches(input_path, RULE_MATCHER, fmt) is False:
+            counts = {}
+        else:
+            for index, backend in enumerate(engines):
+                try:
+                    counts = backend.counter(input_path)
+                    break
+                except Exception as count_err:
+                    if index == len(engines) - 1:
+                        raise
+                    logging.warning(f"引擎 {backend.name} 统计失败，改用下一个引擎: {filename}, {str(count_err)}")
+    except Exception as e:
+        logging.error(f"统计失败: {filename}, {str(e)}")
+        counts = None
+        outcome, status = "failed", "❌ 失败"
+    return {
+        'filename': filename,
+        'counts': counts,
+        'status': status,
+        'outcome': outcome,
+        'process_time': time.time() - start_time,
+    }
+
+def iter_count_results(files, workers):
+    """ 试运行：按文件顺序逐个产出统计结果，workers 大于 1 时在进程池中并行统计 """
+    if workers <= 1:
+        for filename in files:
+            yield count_file(filename)
+        return
+    
+    max_in_flight = workers * 4
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        in_flight = collections.deque()
+        for filename in files:
+            in_flight.append(executor.submit(count_file, filename))
+            while in_flight and (len(in_flight) >= max_in_flight or in_flight[0].done()):
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+def failed_result(filename, error):
+    """ 文件在处理之外的环节（如流水线的预读或写出、工作进程超时或崩溃）失败时的处理结果 """
+    logging.error(f"处理失败: {filename}, {str(error)}")
+    timed_out = isinstance(error, watchdog_pool.DocumentTimeout)
+    return {
+        'filename': filename,
+        'replace_count': "--",
+        'status': "⏱️ 超时" if timed_out else "❌ 失败",
+        'outcome': "timeout" if timed_out else "failed",
+        'process_time': error.seconds if timed_out else 0.0,
+        'source_stat': None,
+        'source_hash': None,
+        'metrics': None,
+    }
+
+def lookup_cached(run_manifest, filename):
+    """ 在增量清单中查找未变化的文件，返回缓存结果；需要处理时返回 None """
+    if run_manifest is None:
+        return None
+    try:
+        entry = run_manifest.lookup(
+            filename,
+            os.path.join(SOURCE_FOLDER, filename),
+            os.path.join(OUTPUT_FOLDER, filename)
+        )
+    except OSError:
+        return None
+    return cached_result(filename, entry) if entry is not None else None
+
+def document_timeout(filename, path=None):
+    """
+    单个文档的处理时限（秒）：按扩展名的基础时限，加上按文件大小增加的时限
+    
+    Args:
+        filename: 相对于源文件夹的文件路径
+        path: 实际读取的文件，默认为源文件夹中的文件
+    
+    Returns:
+        float: 时限秒数；未配置时限时返回 None
+    """
+    ext = os.path.splitext(filename)[1].lower().lstrip('.')
+    base = DOCUMENT_TIMEOUTS.get(ext, DOCUMENT_TIMEOUTS.get('*')) if DOCUMENT_TIMEOUTS else None
+    if not base:
+        return None
+    try:
+        size_mb = os.path.getsize(path or os.path.join(SOURCE_FOLDER, filename)) / (1024 * 1024)
+    except OSError:
+        size_mb = 0
+    return base + DOCUMENT_TIMEOUT_PER_MB * size_mb
+
+def _task_timeout(func, args):
+    """ 看门狗进程池中任务的时限 """
+    if func is process_spooled_file:
+        payload = args[0]
+        return document_timeout(payload[0], payload[2])
+    return document_timeout(args[0])
+
+def worker_pool(workers):
+    """
+    创建处理文件的进程池
+    
+    配置了处理时限（DOCUMENT_TIMEOUTS）时使用看门狗进程池：超时的文档所在的工作进程被终止并替换，
+    文档标记为超时，其余文档继续处理。
+    """
+    initializer = functools.partial(init_worker, compression_threads(workers))
+    if DOCUMENT_TIMEOUTS:
+        return watchdog_pool.WatchdogPool(workers, initializer=initializer, timeout_for=_task_timeout)
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=initializer)
+
+def compression_threads(workers):
+    """
+    每个工作进程的并行压缩线程数
+    
+    COMPRESSION_THREADS 为 0 时各工作进程平分 CPU 核数，避免 WORKERS × 核数 个压缩线程争抢 CPU。
+    """
+    if COMPRESSION_THREADS:
+        return COMPRESSION_THREADS
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+def init_worker(threads=None):
+    """
+    工作进程初始化：创建Office实例池，进程存续期间复用（替换规则在导入模块时已编译或从缓存加载）
+    
+    Args:
+        threads: 本进程的并行压缩线程数，为空时保持模块导入时的设置
+    """
+    if threads:
+        ooxml_engine.set_compression(threads=threads)
+    if win32 is not None:
+        get_office_pool()
+    logging.info(f"工作进程已启动: {os.getpid()}")
+
+def iter_results(files, temp_dir, workers, run_manifest=None):
+    """
+    按文件顺序逐个产出处理结果
+    
+    files 可以是边扫描边产出的迭代器，处理无需等待完整的文件列表。
+    提供增量清单时，未变化的文件直接产出缓存结果，不再处理。
+    workers 大于 1 时将文件分发到进程池并行处理，结果仍按原顺序返回，
+    保证结果表格和统计的输出顺序确定；同时在途的文件数有上限，内存占用与文件总数无关。
+    配置了处理时限时即使只有一个工作进程也在子进程中处理，超时的文档不会使整个批处理停止。
+    """
+    if workers <= 1 and not DOCUMENT_TIMEOUTS:
+        for filename in files:
+            yield lookup_cached(run_manifest, filename) or process_file(filename, temp_dir)
+        return
+    
+    workers = max(workers, 1)
+    logging.info(f"使用 {workers} 个工作进程处理")
+    max_in_flight = workers * 4
+    with worker_pool(workers) as executor:
+        in_flight = collections.deque()  # 按文件顺序排列的 (文件名, 缓存结果或 Future)
+        for filename in files:
+            cached = lookup_cached(run_manifest, filename)
+            in_flight.append((filename, cached or executor.submit(process_file, filename, temp_dir)))
+            # 依次产出队首已完成的结果；在途文件过多时等待队首完成
+            while in_flight and (len(in_flight) >= max_in_flight or _is_ready(in_flight[0][1])):
+                yield _take_result(*in_flight.popleft())
+        while in_flight:
+            yield _take_result(*in_flight.popleft())
+
+def iter_pipeline_results(files, temp_dir, workers, run_manifest=None,
+                          io_threads=None, depth=None):
+    """
+    通过异步流水线按文件顺序逐个产出处理结果
+    
+    适用于源文件夹和输出文件夹位于网络共享的情况：I/O 线程把源文件预读到本地缓冲目录，
+    进程池处理本地副本，结果再由 I/O 线程后写发布到输出文件夹，
+    网络读写与替换处理重叠进行。各阶段之间的队列有界，本地缓冲中的文件数有上限。
+    
+    Args:
+        files: 相对路径迭代器
+        temp_dir: 输出文件夹中的暂存目录
+        workers: 处理进程数
+        run_manifest: 增量清单，提供时跳过未变化的文件
+        io_threads: 预读和后写各自同时进行的文件数，默认取配置 PIPELINE_IO_THREADS
+        depth: 阶段之间队列的容量，默认取配置 PIPELINE_DEPTH
+    """
+    if io_threads is None:
+        io_threads = PIPELINE_IO_THREADS
+    if depth is None:
+        depth = PIPELINE_DEPTH
+    spool_dir = tempfile.mkdtemp(prefix="batch_replace_", dir=SPOOL_FOLDER or None)
+    logging.info(f"使用异步流水线处理: {workers} 个工作进程, {io_threads} 个I/O线程, 本地缓冲目录 {spool_dir}")
+    
+    def fetch(filename):
+        cached = lookup_cached(run_manifest, filename)
+        if cached is not None:
+            return None, cached
+        fetch_start = time.perf_counter()
+        source_path = os.path.join(SOURCE_FOLDER, filename)
+        stat = os.stat(source_path)
+        token = os.urandom(4).hex()
+        local_input = os.path.join(spool_dir, f"in_{token}_{os.path.basename(filename)}")
+        local_output = os.path.join(spool_dir, f"out_{token}_{os.path.basename(filename)}")
+        shutil.copyfile(source_path, local_input)
+        payload = (filename, spool_dir, local_input, local_output,
+                   (stat.st_size, stat.st_mtime_ns), time.perf_counter() - fetch_start)
+        return payload, None
+    
+    def store(payload, result):
+        filename, _, local_input, local_output, source_stat, fetch_seconds = payload
+        store_start = time.perf_counter()
+        try:
+            if result['outcome'] in ("success", "passthrough", "unprocessed"):
+                final_output_path = os.path.join(OUTPUT_FOLDER, filename)
+                os.makedirs(os.path.dirname(final_output_path), exist_ok=True)
+                # 本地副本只供本次发布使用，可以安全地硬链接
+                if not link_or_copy(local_output, final_output_path, temp_dir, allow_hardlink=True):
+                    logging.error(f"发布处理结果失败: {filename}")
+                    result.update(replace_count="--", status="❌ 失败", outcome="failed")
+        finally:
+            for path in (local_input, local_output):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        store_seconds = time.perf_counter() - store_start
+        # 源文件状态以网络上的原文件为准；预读和后写的耗时分别计入打开和移动阶段
+        result['source_stat'] = source_stat
+        result['process_time'] += fetch_seconds + store_seconds
+        if result['metrics']:
+            phases = result['metrics']['phases']
+            phases['open'] = phases.get('open', 0.0) + fetch_seconds
+            phases['move'] = phases.get('move', 0.0) + store_seconds
+        return result
+    
+    try:
+        with worker_pool(max(workers, 1)) as executor:
+            stages = pipeline.Pipeline(
+                fetch, process_spooled_file, store, failed_result, executor,
+                cpu_slots=max(workers, 1), io_threads=io_threads, depth=depth
+            )
+            for result in stages.results(files):
+                yield result
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+def process_spooled_file(payload):
+    """ 在工作进程中处理流水线预读到本地的文件，结果写入本地缓冲目录 """
+    filename, spool_dir, local_input, local_output = payload[:4]
+    return process_file(filename, spool_dir, input_path=local_input, output_path=local_output)
+
+def _is_ready(item):
+    return not isinstance(item, concurrent.futures.Future) or item.done()
+
+def _take_result(filename, item):
+    if not isinstance(item, concurrent.futures.Future):
+        return item
+    try:
+        return item.result()
+    except Exception as e:
+        # 工作进程超时被终止或意外退出
+        return failed_result(filename, e)
+
+def link_or_copy(source, dest, staging_dir, allow_hardlink=None):
+    """
+    将未经修改的文件发布到输出位置，尽量避免复制数据
+    
+    依次尝试硬链接（需允许）、写时复制克隆（reflink）和普通复制，
+    结果先放在暂存目录中，再原子地发布到输出位置。
+    
+    注意：硬链接与源文件共享数据，之后修改输出文件会同时改变源文件
+    
+    Args:
+        source: 源文件路径
+        dest: 输出路径
+        staging_dir: 与输出文件夹位于同一磁盘的暂存目录
+        allow_hardlink: 是否允许硬链接，默认取配置 ALLOW_HARDLINK
+    """
+    if allow_hardlink is None:
+        allow_hardlink = ALLOW_HARDLINK
+    staged_path = os.path.join(staging_dir, f"link_{os.urandom(4).hex()}_{os.path.basename(dest)}")
+    
+    staged = False
+    if allow_hardlink:
+        try:
+            os.link(source, staged_path)
+            logging.info(f"成功创建硬链接: {source} -> {dest}")
+            staged = True
+        except OSError as link_err:
+            logging.debug(f"创建硬链接失败: {str(link_err)}")
+    if not staged and reflink_file(source, staged_path):
+        logging.info(f"成功克隆文件: {source} -> {dest}")
+        staged = True
+    if not staged and not safe_file_operation(source, staged_path, "copy"):
+        return False
+    
+    if publish_file(staged_path, dest):
+        return True
+    try:
+        os.remove(staged_path)
+    except OSError:
+        pass
+    return False
+
+def batch_process(workers=None, incremental=None, use_pipeline=None, resume=False, shard=None, lease_dir=None):
+    """
+    处理文件夹中的所有 Word 和 Excel 文件
+    
+    多个节点共同处理同一个源文件夹时，每个节点只处理分给自己的文件，使用自己的暂存目录、日志和清单，
+    结束时在输出文件夹旁写出本节点的汇总（可用 merge_node_summaries 合并）。
+    
+    Args:
+        workers: 工作进程数，默认取配置 WORKERS
+        incremental: 是否跳过增量清单中未变化的文件，默认取配置 INCREMENTAL
+        use_pipeline: 是否使用异步流水线（预读、处理、后写重叠进行），默认取配置 PIPELINE
+        resume: 是否从处理日志续传：跳过中断的运行中已完成的文件，并把它们的结果计入本次统计
+        shard: 哈希分片 (分片序号, 分片总数)，只处理属于该分片的文件
+        lease_dir: 共享的租约目录，各节点通过租约认领文件（与 shard 二选一）
+    """
     start_time = time.time()
+    if workers is None:
+        workers = WORKERS
+    if incremental is None:
+        incremental = INCREMENTAL
+    if use_pipeline is None:
+        use_pipeline = PIPELINE
+    
+    # 多节点处理时的节点名称和租约
+    node = None
+    leases = None
+    if shard is not None:
+        node = f"shard-{shard[0]}-of-{shard[1]}"
+        logging.info(f"哈希分片: 只处理第 {shard[0]} 个分片（共 {shard[1]} 个）")
+    elif lease_dir:
+        leases = sharding.LeaseDir(lease_dir, ttl=LEASE_SECONDS)
+        node = leases.node
+        logging.info(f"租约模式: 节点 {node} 通过 {lease_dir} 认领文件")
     
-    # 确保输出目录存在
+    # 确保输出目录存在（多个节点可能同时创建）
     if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER)
+        os.makedirs(OUTPUT_FOLDER, exist_ok=True)
         logging.info(f"创建输出目录: {OUTPUT_FOLDER}")
 
-    # 创建临时目录
-    temp_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp_files")
+    # 暂存目录放在输出文件夹中，与输出文件位于同一磁盘，发布时只需重命名；每个节点使用自己的暂存目录
+    temp_dir = os.path.join(OUTPUT_FOLDER, STAGING_DIR_NAME + (f"-{node}" if node else ""))
     if not os.path.exists(temp_dir):
         os.makedirs(temp_dir)
-        logging.info(f"创建临时目录: {temp_dir}")
+        logging.info(f"创建暂存目录: {temp_dir}")
 
     # 处理状态统计
     total_files = 0
     success_files = 0
     failed_files = 0
+    timeout_files = 0  # 失败的文件中处理超时的文件数
     skipped_files = 0
+    cached_files = 0
+    passthrough_files = 0  # 预筛选无匹配、直接复制的文件数
     total_replacements = 0  # 总替换次数
+    failed_names = []  # 失败的文件（写入节点汇总）
     
-    # 获取要处理的文件列表
-    file_list = [f for f in os.listdir(SOURCE_FOLDER) 
-                if os.path.isfile(os.path.join(SOURCE_FOLDER, f))]
+    # 增量清单：始终记录成功处理的文件，incremental 为 False 时不据此跳过；
+    # 哈希分片时每个分片的文件固定，使用分片自己的清单；租约模式下每次分到的文件不固定，不使用清单
+    run_manifest = None
+    if INCREMENTAL and leases is None:
+        run_manifest = manifest.RunManifest(
+            manifest.manifest_path_for(OUTPUT_FOLDER, node), manifest.hash_rules(REPLACE_RULES)
+        )
     
-    # 如果没有文件可处理
-    if not file_list:
-        print("没有发现可处理的文件。请检查源文件夹。")
-        logging.warning(f"源文件夹为空: {SOURCE_FOLDER}")
-        return
+    # 处理日志：每完成一个文件追加一条记录，中断后可用 --resume 续传
+    batch_journal = None
+    if JOURNAL or resume:
+        journal_path = leases.journal_path() if leases is not None else journal.journal_path_for(OUTPUT_FOLDER, node)
+        batch_journal = journal.BatchJournal(journal_path, manifest.hash_rules(REPLACE_RULES), resume=resume)
+    completed = batch_journal.completed if batch_journal is not None else {}
+    if completed:
+        print(f"续传: 上次运行已完成 {len(completed)} 个文件，继续处理其余文件")
+    
+    # 后台扫描源文件夹，边扫描边处理（输出文件夹位于源文件夹中时不扫描输出文件夹）
+    scanner = discovery.SourceScanner(discovery.iter_source_files(
+        SOURCE_FOLDER, RECURSIVE, INCLUDE_PATTERNS, EXCLUDE_PATTERNS,
+        skip_dirs=[OUTPUT_FOLDER, temp_dir]
+    ))
+    
+    # 指标输出：每个文档一行 JSONL，结束时可另外输出 Prometheus 快照
+    metrics_writer = None
+    if METRICS_FILE:
+        try:
+            metrics_writer = metrics.MetricsWriter(METRICS_FILE)
+        except Exception as e:
+            logging.warning(f"无法打开指标文件: {str(e)}")
+    run_metrics = metrics.RunMetrics()
     
     # 结果表格的表头
     print("\n" + "=" * 80)
     print(f"{'文件名':<40} {'替换次数':<10} {'状态':<10} {'耗时(秒)':<10}")
     print("-" * 80)
 
-    # 遍历源文件夹
-    for idx, filename in enumerate(file_list):
-        file_start_time = time.time()
-        base, ext = os.path.splitext(filename)
-        input_path = os.path.join(SOURCE_FOLDER, filename)
+    # 遍历处理结果（按扫描顺序）
+    lookup_manifest = run_manifest if incremental else None
+    pending_files = (filename for filename in scanner if filename not in completed)
+    if shard is not None:
+        pending_files = (filename for filename in pending_files if sharding.shard_of(filename, shard[1]) == shard[0])
+    elif leases is not None:
+        # 文件进入处理队列时才认领，队列长度有限，其余文件留给其他节点
+        pending_files = (filename for filename in pending_files if leases.claim(filename))
+    show_progress = SHOW_PROGRESS and node is None  # 多节点处理时本节点的文件总数未知，不显示进度
+    if use_pipeline:
+        live_results = iter_pipeline_results(pending_files, temp_dir, workers, lookup_manifest)
+    else:
+        live_results = iter_results(pending_files, temp_dir, workers, lookup_manifest)
+    # 续传时先按日志重放已完成的文件，统计方式与本次处理的文件相同
+    results = live_results
+    if completed:
+        results = itertools.chain(batch_journal.resumed_results(), live_results)
+    finished = False
+    try:
+        for idx, result in enumerate(results):
+            total_files += 1
+            outcome = result['outcome']
+            if outcome in ("success", "passthrough"):
+                if outcome == "success":
+                    success_files += 1
+                    total_replacements += result['replace_count']
+                else:
+                    passthrough_files += 1
+                if run_manifest is not None and result['source_hash']:
+                    size, mtime_ns = result['source_stat']
+                    run_manifest.record(result['filename'], size, mtime_ns,
+                                        result['source_hash'], result['replace_count'])
+            elif outcome == "cached":
+                cached_files += 1
+            elif outcome in ("failed", "timeout", "unprocessed"):
+                failed_files += 1
+                if outcome == "timeout":
+                    timeout_files += 1
+                failed_names.append(result['filename'])
+                if run_manifest is not None:
+                    run_manifest.forget(result['filename'])
+            else:
+                skipped_files += 1
+            
+            run_metrics.add(outcome, result['process_time'], result['metrics'])
+            if result.get('resumed'):
+                continue  # 上次运行中已显示并写入日志和指标
+            if batch_journal is not None:
+                batch_journal.record(result)
+            if leases is not None:
+                leases.complete(result['filename'], outcome)
+            if metrics_writer is not None:
+                record = {
+                    'type': 'document',
+                    'file': result['filename'],
+                    'outcome': outcome,
+                    'replace_count': result['replace_count'] if isinstance(result['replace_count'], int) else None,
+                    'process_time': round(result['process_time'], 6),
+                }
+                if result['metrics']:
+                    record.update(result['metrics'])
+                    record['file'] = result['filename']
+                metrics_writer.write(record)
         
-        # 使用临时文件路径作为中间处理
-        timestamp = int(time.time())
-        random_suffix = os.urandom(4).hex()  # 添加随机后缀避免文件名冲突
-        temp_output_path = os.path.join(temp_dir, f"temp_{timestamp}_{random_suffix}_{filename}")
-        final_output_path = os.path.join(OUTPUT_FOLDER, filename)
-
-        # 显示进度
-        if SHOW_PROGRESS:
-            progress = (idx + 1) / len(file_list) * 100
-            print(f"\r处理进度: {progress:.1f}% [{idx+1}/{len(file_list)}]", end="")
+            # 清除进度行
+            if show_progress:
+                print("\r" + " " * 80, end="\r")
         
-        logging.info(f"开始处理文件: {filename}")
-        total_files += 1
-        replace_count = 0
+            # 打印处理结果
+            print(f"{result['filename']:<40} {result['replace_count']:<10} {result['status']:<10} {result['process_time']:.2f}s")
+        
+            # 显示进度（扫描未结束时总数为目前已发现的文件数）
+            if show_progress and (idx + 1 < scanner.found or not scanner.done):
+                if scanner.done:
+                    progress = (idx + 1) / scanner.found * 100
+                    print(f"\r处理进度: {progress:.1f}% [{idx+1}/{scanner.found}]", end="")
+                else:
+                    print(f"\r处理进度: [{idx+1}/{scanner.found}+] 正在扫描源文件夹...", end="")
+        finished = True
+    finally:
+        live_results.close()
+        scanner.stop()
+        if batch_journal is not None:
+            batch_journal.close(finished)
+        if leases is not None:
+            leases.close()
+    
+    # 如果没有文件可处理
+    if total_files == 0:
+        print("没有发现可处理的文件。请检查源文件夹。")
+        logging.warning(f"源文件夹中没有可处理的文件: {SOURCE_FOLDER}")
 
-        # 如果启用备份，先备份文件
-        if BACKUP_ORIGINAL:
-            backup_file(input_path)
+    # 写入运行汇总和 Prometheus 快照
+    run_metrics.discovery_seconds = scanner.scan_seconds
+    if metrics_writer is not None:
+        metrics_writer.write({
+            'type': 'run',
+            'documents': run_metrics.documents,
+            'discovery_seconds': round(scanner.scan_seconds, 6),
+            'phase_seconds': dict((name, round(seconds, 6)) for name, seconds in run_metrics.phase_seconds.items()),
+            'bytes_read': run_metrics.bytes_read,
+            'bytes_written': run_metrics.bytes_written,
+            'com_calls': run_metrics.com_calls,
+            'rule_hits': run_metrics.rule_hits,
+            'backends': run_metrics.backend_throughput(),
+            'total_time': round(time.time() - start_time, 6),
+        })
+        metrics_writer.close()
+    if PROMETHEUS_FILE:
+        try:
+            run_metrics.write_prometheus(PROMETHEUS_FILE)
+        except Exception as e:
+            logging.warning(f"写入Prometheus指标失败: {str(e)}")
 
+    # 保存增量清单
+    if run_manifest is not None:
         try:
-            # 首先检查文件是否实际存在
-            if not os.path.isfile(input_path):
-                logging.error(f"文件不存在: {input_path}")
-                raise FileNotFoundError(f"找不到文件: {input_path}")
-                
-            # 检查文件大小，避免处理空文件
-            file_size = os.path.getsize(input_path)
-            if file_size == 0:
-                logging.warning(f"跳过空文件: {filename}")
-                status = "⚠️ 跳过"
-                replace_count = "--"
-                skipped_files += 1
-                continue  # 跳过空文件
-                
-            if ext.lower() in ['.xls', '.xlsx']:
-                # Excel文件处理
-                try:
-                    # 先处理到临时文件
-                    replace_count = replace_in_excel(input_path, temp_output_path)
-                    
-                    # 安全地移动到最终位置
-                    if safe_file_operation(temp_output_path, final_output_path, "move"):
-                        success_files += 1
-                        status = "✅ 成功"
-                        total_replacements += replace_count
-                    else:
-                        # 移动失败，尝试复制
-                        if safe_file_operation(input_path, final_output_path, "copy"):
-                            logging.warning(f"无法移动临时文件，已直接复制原文件: {filename}")
-                            success_files += 1
-                            status = "⚠️ 部分成功"
-                            total_replacements += replace_count
-                        else:
-                            raise Exception("无法保存处理后的文件")
-                except Exception as excel_err:
-                    logging.error(f"处理Excel文件时出错: {str(excel_err)}")
-                    raise
-                    
-            elif ext.lower() in ['.doc', '.docx']:
-                # Word文档处理
-                try:
-                    # 先处理到临时文件
-                    success_result, error_msg, replace_count = replace_in_word(input_path, temp_output_path)
-                    
-                    # 如果处理成功，则进行后续操作
-                    if success_result:
-                        # 检查临时文件是否成功创建
-                        if os.path.exists(temp_output_path) and os.path.getsize(temp_output_path) > 0:
-                            # 安全地移动到最终位置
-                            if safe_file_operation(temp_output_path, final_output_path, "move"):
-                                success_files += 1
-                                status = "✅ 成功"
-                                total_replacements += replace_count
-                            else:
-                                # 移动失败，尝试复制源文件
-                                if safe_file_operation(input_path, final_output_path, "copy"):
-                                    logging.warning(f"Word处理失败，已直接复制原文件: {filename}")
-                                    success_files += 1
-                                    status = "⚠️ 未处理"
-                                else:
-                                    raise Exception("无法保存文件")
-                        else:
-                            logging.error(f"临时文件创建失败: {temp_output_path}")
-                            # 尝试直接复制源文件
-                            if safe_file_operation(input_path, final_output_path, "copy"):
-                                logging.warning(f"Word处理失败，已直接复制原文件: {filename}")
-                                success_files += 1
-                                status = "⚠️ 未处理"
-                            else:
-                                raise Exception("无法保存文件")
-                    else:
-                        # 处理失败，记录错误信息
-                        logging.error(f"Word文档处理失败: {error_msg}")
-                        status = "❌ 失败"
-                        replace_count = "--"
-                        failed_files += 1
-                except Exception as word_err:
-                    logging.error(f"处理Word文件时出错: {str(word_err)}")
-                    raise
-            else:
-                logging.warning(f"不支持的文件类型: {ext}")
-                status = "⚠️ 跳过"
-                replace_count = "--"
-                skipped_files += 1
+            run_manifest.save()
         except Exception as e:
-            logging.error(f"处理失败: {str(e)}")
-            failed_files += 1
-            status = "❌ 失败"
-            replace_count = "--"
-            # 清理可能残留的临时文件
-            if os.path.exists(temp_output_path):
-                try:
-                    os.remove(temp_output_path)
-                    logging.info(f"已清理临时文件: {temp_output_path}")
-                except:
-                    pass
+            logging.warning(f"保存增量清单失败: {str(e)}")
 
-        # 计算处理时间
-        process_time = time.time() - file_start_time
-        
-        # 清除进度行
-        if SHOW_PROGRESS:
-            print("\r" + " " * 80, end="\r")
-        
-        # 打印处理结果
-        if replace_count == "--":
-            print(f"{filename:<40} {replace_count:<10} {status:<10} {process_time:.2f}s")
-        else:
-            print(f"{filename:<40} {replace_count:<10} {status:<10} {process_time:.2f}s")
+    # 关闭本进程中的Office实例（工作进程退出时各自关闭）
+    if _office_pool is not None:
+        _office_pool.close_all()
 
-    # 清理临时目录
+    # 清理暂存目录
     try:
         if os.path.exists(temp_dir):
             shutil.rmtree(temp_dir)
-            logging.info(f"已清理临时目录: {temp_dir}")
+            logging.info(f"已清理暂存目录: {temp_dir}")
     except Exception as e:
-        logging.warning(f"清理临时目录失败: {str(e)}")
+        logging.warning(f"清理暂存目录失败: {str(e)}")
 
     # 打印处理总结
     total_time = time.time() - start_time
     print("-" * 80)
-    print(f"处理完成: 共 {total_files} 个文件 | 成功: {success_files} | 失败: {failed_files} | 跳过: {skipped_files} | 总耗时: {total_time:.2f}s")
+    failed_text = f"{failed_files}（超时 {timeout_files}）" if timeout_files else f"{failed_files}"
+    print(f"处理完成: 共 {total_files} 个文件 | 成功: {success_files} | 失败: {failed_text} | 跳过: {skipped_files} | 缓存: {cached_files} | 直通: {passthrough_files} | 总耗时: {total_time:.2f}s")
     print(f"总计完成替换 {total_replacements} 处内容")
+    for name, stats in run_metrics.backend_throughput().items():
+        throughput = f"{stats['files_per_second']} 文件/秒, {stats['mb_per_second']} MB/秒" if stats['seconds'] else "--"
+        print(f"   • 引擎 {name}: {stats['documents']} 个文件, 失败 {stats['failures']} 次, {throughput}")
     print("=" * 80 + "\n")
     
-    logging.info(f"批处理完成: 共 {total_files} 个文件, 成功: {success_files}, 失败: {failed_files}, 跳过: {skipped_files}, 总耗时: {total_time:.2f}s")
+    # 写出本节点的汇总
+    if node is not None:
+        summary_path = leases.summary_path() if leases is not None else sharding.summary_path_for(OUTPUT_FOLDER, node)
+        try:
+            sharding.write_summary(summary_path, {
+                'node': node,
+                'files': {
+                    'total': total_files, 'success': success_files, 'failed': failed_files, 'timeout': timeout_files,
+                    'skipped': skipped_files, 'cached': cached_files, 'passthrough': passthrough_files,
+                },
+                'replacements': total_replacements,
+                'total_time': round(total_time, 6),
+                'backends': run_metrics.backends,
+                'failed': failed_names,
+            })
+            print(f"节点汇总已写入: {summary_path}（所有节点完成后可用 --merge-summaries 合并）\n")
+        except Exception as e:
+            logging.warning(f"写入节点汇总失败: {str(e)}")
+    
+    logging.info(f"批处理完成: 共 {total_files} 个文件, 成功: {success_files}, 失败: {failed_files}, 超时: {timeout_files}, 跳过: {skipped_files}, 缓存: {cached_files}, 直通: {passthrough_files}, 总耗时: {total_time:.2f}s")
     logging.info(f"总计替换了 {total_replacements} 处内容")
     
     return success_files, total_replacements
 
+def merge_node_summaries(paths=None, lease_dir=None):
+    """
+    合并各节点的汇总，打印合并后的处理总结并写入 <输出文件夹>.summary.json
+    
+    Args:
+        paths: 节点汇总文件列表，为空时使用 lease_dir 中（未指定时为输出文件夹旁哈希分片）各节点的汇总
+        lease_dir: 租约目录，合并这次租约运行中各节点的汇总
+    
+    Returns:
+        dict: 合并后的汇总
+    """
+    paths = paths or sharding.find_summaries(OUTPUT_FOLDER, lease_dir)
+    if not paths:
+        print("没有找到节点汇总文件。")
+        logging.warning(f"没有找到节点汇总文件: {lease_dir or OUTPUT_FOLDER}")
+        return None
+    merged = sharding.merge_summaries(paths)
+    merged_path = sharding.merged_summary_path_for(OUTPUT_FOLDER)
+    sharding.write_summary(merged_path, merged)
+    
+    files = merged['files']
+    print("\n" + "=" * 80)
+    print(f"合并 {len(merged['nodes'])} 个节点的汇总: {', '.join(merged['nodes'])}")
+    print("-" * 80)
+    failed_text = f"{files.get('failed', 0)}（超时 {files['timeout']}）" if files.get('timeout') else f"{files.get('failed', 0)}"
+    print(f"处理完成: 共 {files.get('total', 0)} 个文件 | 成功: {files.get('success', 0)} | 失败: {failed_text} | 跳过: {files.get('skipped', 0)} | 缓存: {files.get('cached', 0)} | 直通: {files.get('passthrough', 0)} | 总耗时: {merged['total_time']:.2f}s")
+    print(f"总计完成替换 {merged['replacements']} 处内容")
+    for name, stats in sorted(merged['backends'].items()):
+        print(f"   • 引擎 {name}: {stats['documents']} 个文件, 失败 {stats['failures']} 次")
+    for filename in merged['failed']:
+        print(f"   ❌ 失败: {filename}")
+    print(f"合并结果已写入: {merged_path}")
+    print("=" * 80 + "\n")
+    logging.info(f"合并节点汇总: {len(paths)} 个节点, 共 {files.get('total', 0)} 个文件, 替换 {merged['replacements']} 处")
+    return merged
+
+def dry_run(report_path, workers=None, report_format=None):
+    """
+    试运行：统计源文件夹中每个文件、每条规则的命中次数并写入报告，不写出任何处理结果
+    
+    不创建输出文件夹，也不读写增量清单和暂存目录。
+    
+    Args:
+        report_path: 命中矩阵报告路径（CSV 或 JSON），不能位于输出文件夹中
+        workers: 并行统计的进程数，默认为CPU核数
+        report_format: 'csv' 或 'json'，为空时根据报告的扩展名判断
+    
+    Returns:
+        dict: 每条规则在所有文件中的命中次数
+    """
+    start_time = time.time()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    output_root = os.path.normcase(os.path.abspath(OUTPUT_FOLDER))
+    report_dir = os.path.normcase(os.path.dirname(os.path.abspath(report_path)))
+    if report_dir == output_root or report_dir.startswith(output_root + os.sep):
+        raise ValueError(f"试运行报告不能写入输出文件夹: {report_path}")
+    
+    scanner = discovery.SourceScanner(discovery.iter_source_files(
+        SOURCE_FOLDER, RECURSIVE, INCLUDE_PATTERNS, EXCLUDE_PATTERNS,
+        skip_dirs=[OUTPUT_FOLDER]
+    ))
+    writer = hit_report.HitMatrixWriter(report_path, RULE_MATCHER.patterns, report_format)
+    logging.info(f"试运行: 使用 {workers} 个进程统计命中次数，报告: {report_path}")
+    
+    print("\n" + "=" * 80)
+    print(f"{'文件名':<40} {'命中次数':<10} {'状态':<10} {'耗时(秒)':<10}")
+    print("-" * 80)
+    
+    outcomes = {}
+    results = iter_count_results(scanner, workers)
+    try:
+        for result in results:
+            outcomes[result['outcome']] = outcomes.get(result['outcome'], 0) + 1
+            writer.add(result['filename'], result['outcome'], result['counts'])
+            hits = sum(result['counts'].values()) if result['counts'] is not None else "--"
+            print(f"{result['filename']:<40} {hits:<10} {result['status']:<10} {result['process_time']:.2f}s")
+    finally:
+        results.close()
+        scanner.stop()
+        writer.close()
+        if _office_pool is not None:
+            _office_pool.close_all()
+    
+    total_time = time.time() - start_time
+    print("-" * 80)
+    print(f"试运行完成: 共 {writer.files} 个文件 | 已统计: {outcomes.get('counted', 0)} | 跳过: {outcomes.get('skipped', 0)} | 失败: {outcomes.get('failed', 0)} | 总耗时: {total_time:.2f}s")
+    for rule, count in writer.totals.items():
+        print(f"   • \"{rule}\": {count} 处")
+    print(f"命中矩阵已写入: {report_path}")
+    print("=" * 80 + "\n")
+    logging.info(f"试运行完成: 共 {writer.files} 个文件, 命中 {sum(writer.totals.values())} 处, 总耗时: {total_time:.2f}s")
+    return writer.totals
+
+def _shard_arg(text):
+    """ 解析 --shard 参数 """
+    try:
+        return sharding.parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_args(argv=None):
+    """ 解析命令行参数 """
+    parser = argparse.ArgumentParser(description="文档批量替换工具")
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help=f"并行处理的工作进程数（默认: {WORKERS}，即配置项 WORKERS；试运行时默认为CPU核数）"
+    )
+    parser.add_argument(
+        '--full', action='store_true',
+        help="忽略增量清单，重新处理所有文件"
+    )
+    parser.add_argument(
+        '--pipeline', action='store_true', default=PIPELINE,
+        help="使用异步流水线：预读源文件、处理和写出结果重叠进行，适合网络共享上的文件夹"
+    )
+    parser.add_argument(
+        '--resume', action='store_true',
+        help="从处理日志续传：跳过中断的运行中已完成的文件，最终统计包含上次运行的结果"
+    )
+    distribution = parser.add_mutually_exclusive_group()
+    distribution.add_argument(
+        '--shard', type=_shard_arg, default=None, metavar='i/N',
+        help="多机处理：按文件路径的哈希值分成 N 片，本节点只处理第 i 片（0 <= i < N）"
+    )
+    distribution.add_argument(
+        '--lease-dir', default=None, metavar='DIR',
+        help="多机处理：各节点在共享目录 DIR 中认领文件，节点崩溃后其文件在租约过期后由其他节点处理"
+    )
+    parser.add_argument(
+        '--merge-summaries', nargs='*', default=None, metavar='SUMMARY',
+        help="合并各节点的汇总文件（默认为输出文件夹旁各分片的汇总，同时指定 --lease-dir 时为该租约目录中各节点的汇总）并打印总结，不处理文件"
+    )
+    parser.add_argument(
+        '--dry-run', nargs='?', const="hits.csv", default=None, metavar='REPORT',
+        help="试运行：只统计每个文件、每条规则的命中次数并写入报告（默认 hits.csv，扩展名为 .json 时输出JSON），不写出任何处理结果"
+    )
+    parser.add_argument(
+        '--report-format', choices=hit_report.REPORT_FORMATS, default=None,
+        help="试运行报告的格式（默认根据报告文件的扩展名判断）"
+    )
+    return parser.parse_args(argv)
+
+WELCOME_RULES_SHOWN = 20  # 欢迎信息中最多列出的规则数
+
 def show_welcome():
     """ 显示欢迎信息 """
     print("\n" + "*" * 60)
@@ -799,58 +1936,48 @@ def show_welcome():
     print(f"📁 源文件夹: {SOURCE_FOLDER}")
     print(f"📁 输出文件夹: {OUTPUT_FOLDER}")
     print(f"🔄 替换规则: {len(REPLACE_RULES)} 条")
-    for old, new in REPLACE_RULES.items():
+    for old, new in itertools.islice(REPLACE_RULES.items(), WELCOME_RULES_SHOWN):
         print(f"   • \"{old}\" -> \"{new}\"")
+    if len(REPLACE_RULES) > WELCOME_RULES_SHOWN:
+        print(f"   • ……另有 {len(REPLACE_RULES) - WELCOME_RULES_SHOWN} 条")
     print("\n")
 
 def check_environment():
-    """ 检查运行环境 """
+    """ 检查运行环境：确认Word和Excel已注册，实际实例在首次使用时才启动 """
     logging.info("检查运行环境...")
-    word = None
-    excel = None
     try:
-        # 检查Word
-        word = win32.Dispatch("Word.Application")
-        word.Visible = False
-        word.DisplayAlerts = 0  # 禁用警告
-        logging.info("检测到 Microsoft Word")
-        
-        # 检查Excel
-        excel = win32.Dispatch("Excel.Application")
-        excel.Visible = False
-        excel.DisplayAlerts = False  # 禁用警告
-        logging.info("检测到 Microsoft Excel")
-        
+        for prog_id, name in [(WORD_PROG_ID, "Microsoft Word"), (EXCEL_PROG_ID, "Microsoft Excel")]:
+            pywintypes.IID(prog_id)  # 通过注册表解析ProgID，不启动应用程序
+            logging.info(f"检测到 {name}")
         return True
     except Exception as e:
         logging.error(f"环境检查失败: {str(e)}")
         print(f"错误: 无法初始化 Microsoft Office 组件。请确保已安装 Microsoft Office 且可正常运行。")
         print(f"详细错误: {str(e)}")
         return False
-    finally:
-        # 确保应用程序被关闭
-        if word:
-            try:
-                word.Quit()
-            except:
-                pass
-        if excel:
-            try:
-                excel.Quit()
-            except:
-                pass
 
 if __name__ == "__main__":
     try:
+        args = parse_args()
         logging.info("程序启动")
+        if args.merge_summaries is not None:
+            merge_node_summaries(args.merge_summaries, args.lease_dir)
+            sys.exit(0)
         show_welcome()
         
         # 检查环境
-        if not check_environment():
+        if win32 is None:
+            print("提示: 未检测到 pywin32，仅能使用原生引擎处理 .docx/.xlsx 文件\n")
+            logging.warning("未检测到 pywin32，仅能使用原生引擎处理 .docx/.xlsx 文件")
+        elif not check_environment():
             sys.exit(1)
             
         # 开始处理
-        batch_process()
+        if args.dry_run:
+            dry_run(args.dry_run, workers=args.workers, report_format=args.report_format)
+        else:
+            batch_process(workers=args.workers, incremental=not args.full, use_pipeline=args.pipeline,
+                          resume=args.resume, shard=args.shard, lease_dir=args.lease_dir)
     except KeyboardInterrupt:
         print("\n程序被用户中断")
         logging.warning("程序被用户中断")
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Excel 区域批量读写
+每个工作表只通过一次 COM 调用读取 UsedRange 的全部值（二维数组），在内存中一次性应用所有规则，
+再把发生变化的单元格按矩形块写回，每块一次赋值，避免逐个单元格的跨进程调用。
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # 未安装 NumPy 时使用纯 Python 实现
+
+import metrics
+from ooxml_engine import merge_counts
+
+
+def to_rows(value):
+    """将 Range.Value 的返回值统一为二维列表（单个单元格时返回的是标量）"""
+    if value is None:
+        return []
+    if not isinstance(value, tuple):
+        return [[value]]
+    return [list(row) for row in value]
+
+
+def transform_strings(strings, matcher):
+    """
+    对一组字符串应用替换规则，相同的字符串只处理一次，计数按出现次数加权
+
+    Args:
+        strings: 字符串列表
+        matcher: 编译后的规则匹配器
+
+    Returns:
+        tuple: (替换后的字符串列表, {规则: 替换次数})
+    """
+    counts = {}
+    if not strings:
+        return [], counts
+
+    if np is not None:
+        uniques, inverse, frequency = np.unique(
+            np.array(strings, dtype=object), return_inverse=True, return_counts=True
+        )
+        results = []
+        for text, weight in zip(uniques, frequency):
+            new_text, text_counts = matcher.replace(text)
+            merge_counts(counts, text_counts, int(weight))
+            results.append(new_text)
+        return [results[i] for i in inverse.ravel()], counts
+
+    cache = {}
+    new_strings = []
+    for text in strings:
+        if text not in cache:
+            cache[text] = matcher.replace(text)
+        new_text, text_counts = cache[text]
+        merge_counts(counts, text_counts)
+        new_strings.append(new_text)
+    return new_strings, counts
+
+
+def replace_values(values, formulas, matcher):
+    """
+    在内存中替换区域的值
+
+    只处理文本常量单元格：公式单元格（Formula 以 "=" 开头）和数字、日期等不做替换，
+    与原生 .xlsx 引擎的处理范围一致。
+
+    Args:
+        values: Range.Value 的二维列表
+        formulas: Range.Formula 的二维列表，用于识别公式单元格
+        matcher: 编译后的规则匹配器
+
+    Returns:
+        tuple: ({(行, 列): 新值}, {规则: 替换次数})，行列从 0 开始
+    """
+    positions = []
+    strings = []
+    for r, row in enumerate(values):
+        for c, value in enumerate(row):
+            if not isinstance(value, str) or not value:
+                continue
+            formula = formulas[r][c] if formulas else None
+            if isinstance(formula, str) and formula.startswith('='):
+                continue
+            positions.append((r, c))
+            strings.append(value)
+
+    new_strings, counts = transform_strings(strings, matcher)
+    changes = {}
+    for position, old, new in zip(positions, strings, new_strings):
+        if new != old:
+            changes[position] = new
+    return changes, counts
+
+
+def changed_blocks(changes):
+    """
+    将变化的单元格合并为矩形块
+
+    同一行中连续变化的单元格组成一段，相邻行中列范围相同的段再合并为一个块。
+
+    Args:
+        changes: {(行, 列): 新值}
+
+    Returns:
+        list: [(起始行, 起始列, 二维元组值)]
+    """
+    segments = []  # (行, 起始列, 结束列)
+    for r, c in sorted(changes):
+        if segments and segments[-1][0] == r and segments[-1][2] == c - 1:
+            segments[-1] = (r, segments[-1][1], c)
+        else:
+            segments.append((r, c, c))
+
+    blocks = []  # [起始行, 结束行, 起始列, 结束列]
+    open_blocks = {}  # (起始列, 结束列) -> 最近一个该列范围的块
+    for r, c0, c1 in segments:
+        block = open_blocks.get((c0, c1))
+        if block is not None and block[1] == r - 1:
+            block[1] = r
+        else:
+            block = [r, r, c0, c1]
+            blocks.append(block)
+            open_blocks[(c0, c1)] = block
+
+    return [
+        (r0, c0, tuple(
+            tuple(changes[(r, c)] for c in range(c0, c1 + 1)) for r in range(r0, r1 + 1)
+        ))
+        for r0, r1, c0, c1 in blocks
+    ]
+
+
+def replace_in_used_range(sheet, matcher, dry_run=False):
+    """
+    对工作表的使用区域执行批量替换
+
+    读取 UsedRange 的 Value 和 Formula 各一次，写回时每个变化块一次赋值。
+
+    Args:
+        sheet: 工作表 COM 对象（或测试用的替身对象）
+        matcher: 编译后的规则匹配器
+        dry_run: 只统计替换次数，不写回工作表
+
+    Returns:
+        tuple: ({规则: 替换次数}, 单元格数量)
+    """
+    with metrics.phase('match'):
+        used_range = sheet.UsedRange
+        if used_range is None:
+            return {}, 0
+        values = to_rows(used_range.Value)
+        if not values:
+            return {}, 0
+        formulas = to_rows(used_range.Formula)
+        cell_total = len(values) * len(values[0])
+        changes, counts = replace_values(values, formulas, matcher)
+    if not changes or dry_run:
+        return counts, cell_total
+
+    # UsedRange 不一定从 A1 开始，写回时加上区域起始位置
+    with metrics.phase('replace'):
+        first_row = used_range.Row
+        first_col = used_range.Column
+        for r0, c0, block in changed_blocks(changes):
+            top_left = sheet.Cells(first_row + r0, first_col + c0)
+            bottom_right = sheet.Cells(first_row + r0 + len(block) - 1, first_col + c0 + len(block[0]) - 1)
+            sheet.Range(top_left, bottom_right).Value = block
+    return counts, cell_total
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+COM 替身对象
+在没有 Office 的环境（如 Linux）中代替 win32com.client.Dispatch，
+记录所有属性读取、赋值和方法调用，用于测试和评估 COM 处理路径。
+
+用法示例：
+    fake = FakeDispatch({'Word.Application.Documents.Open().Content.Text': '2019年'})
+    pool = OfficeAppPool(fake)
+    word = pool.acquire('Word.Application')
+    print(fake.count('call', 'Documents.Open()'))
+"""
+
+import time
+import shutil
+
+
+class FakeComError(Exception):
+    """模拟 COM 调用失败"""
+
+
+class FakeComObject(object):
+    """
+    记录调用的 COM 对象替身
+
+    属性读取和方法调用默认返回新的替身对象，可以通过 FakeDispatch.values
+    按访问路径指定返回值，路径中的方法调用以 "()" 结尾，迭代以 "[]" 结尾。
+    """
+
+    def __init__(self, path, dispatcher, instance_id):
+        object.__setattr__(self, '_path', path)
+        object.__setattr__(self, '_dispatcher', dispatcher)
+        object.__setattr__(self, '_instance_id', instance_id)
+
+    def _child(self, path):
+        dispatcher = self._dispatcher
+        if path in dispatcher.values:
+            return dispatcher.values[path]
+        return FakeComObject(path, dispatcher, self._instance_id)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        path = f"{self._path}.{name}"
+        self._dispatcher._record(self._instance_id, 'get', path)
+        return self._child(path)
+
+    def __setattr__(self, name, value):
+        path = f"{self._path}.{name}"
+        self._dispatcher._record(self._instance_id, 'set', path, (value,))
+        self._dispatcher.values[path] = value
+
+    def __call__(self, *args, **kwargs):
+        path = f"{self._path}()"
+        self._dispatcher._record(self._instance_id, 'call', path, args, kwargs)
+        return self._child(path)
+
+    def __iter__(self):
+        return iter(self._dispatcher.values.get(f"{self._path}[]", []))
+
+    def __repr__(self):
+        return f"<FakeComObject {self._path} #{self._instance_id}>"
+
+
+class FakeDispatch(object):
+    """
+    win32com.client.Dispatch 的替身
+
+    Args:
+        values: {访问路径: 返回值}，路径以 ProgID 开头，
+                如 "Word.Application.Documents.Open().Content.Text"
+        delay: 每次 COM 调用的模拟耗时（秒），用于评估往返开销
+        save_copies: 为 True 时 SaveAs/SaveAs2 会把最近一次 Open 的文件复制到保存路径，
+                     模拟 Office 写出文件，使后续的文件移动等步骤可以正常执行
+    """
+
+    def __init__(self, values=None, delay=0, save_copies=False):
+        self.values = dict(values or {})
+        self.delay = delay
+        self.save_copies = save_copies
+        self._opened = None
+        self.calls = []  # (实例编号, 类型, 路径, 位置参数, 关键字参数)
+        self.instances = []
+        self._broken = set()
+
+    def __call__(self, prog_id):
+        instance_id = len(self.instances) + 1
+        self._record(instance_id, 'dispatch', prog_id)
+        app = FakeComObject(prog_id, self, instance_id)
+        self.instances.append(app)
+        return app
+
+    def _record(self, instance_id, kind, path, args=(), kwargs=None):
+        if instance_id in self._broken:
+            raise FakeComError(f"实例 #{instance_id} 已失去响应: {path}")
+        self.calls.append((instance_id, kind, path, args, kwargs or {}))
+        if self.delay:
+            time.sleep(self.delay)
+        if self.save_copies and kind == 'call' and args and isinstance(args[0], str):
+            if path.endswith('.Open()'):
+                self._opened = args[0]
+            elif path.endswith(('.SaveAs()', '.SaveAs2()')) and self._opened:
+                shutil.copyfile(self._opened, args[0])
+
+    def break_instance(self, app):
+        """让指定实例之后的所有调用失败，模拟 Office 进程挂起或崩溃"""
+        self._broken.add(app._instance_id)
+
+    def count(self, kind=None, path_suffix=None):
+        """统计符合条件的调用次数"""
+        return sum(
+            1 for _, call_kind, path, _, _ in self.calls
+            if (kind is None or call_kind == kind)
+            and (path_suffix is None or path.endswith(path_suffix))
+        )
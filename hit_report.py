@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+命中矩阵报告
+试运行（--dry-run）时记录每个文件中每条规则的命中次数，输出为 CSV 或 JSON。
+结果逐个文件写入，文件数量很多时也不需要在内存中保存完整的矩阵。
+"""
+
+import csv
+import json
+
+REPORT_FORMATS = ('csv', 'json')
+
+
+def report_format(path, fmt=None):
+    """确定报告格式：指定 fmt 时使用 fmt，否则根据扩展名判断（.json 为 JSON，其他为 CSV）"""
+    if fmt:
+        return fmt.lower()
+    return 'json' if path.lower().endswith('.json') else 'csv'
+
+
+class HitMatrixWriter(object):
+    """
+    逐个文件写入命中矩阵
+
+    CSV：每行一个文件，列为 文件、状态、命中总数 和每条规则的命中次数，最后一行为合计；
+    文件使用带 BOM 的 UTF-8 编码，可直接用 Excel 打开。
+    JSON：{"rules": [...], "files": [{"file", "status", "total", "hits"}], "totals": {...}, "total": N}，
+    hits 中只包含命中次数不为 0 的规则。
+
+    Args:
+        path: 报告文件路径
+        rules: 规则列表（决定 CSV 的列顺序）
+        fmt: 'csv' 或 'json'，为空时根据扩展名判断
+    """
+
+    def __init__(self, path, rules, fmt=None):
+        self.path = path
+        self.rules = list(rules)
+        self.format = report_format(path, fmt)
+        if self.format not in REPORT_FORMATS:
+            raise ValueError(f"不支持的报告格式: {fmt}（可选: {', '.join(REPORT_FORMATS)}）")
+        self.totals = dict((rule, 0) for rule in self.rules)
+        self.files = 0
+        if self.format == 'csv':
+            self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(['文件', '状态', '命中总数'] + self.rules)
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+            self._file.write('{"rules": %s,\n "files": [' % json.dumps(self.rules, ensure_ascii=False))
+
+    def add(self, filename, status, counts):
+        """
+        写入一个文件的统计结果
+
+        Args:
+            filename: 文件名（相对路径）
+            status: 状态（如 counted、skipped、failed）
+            counts: {规则: 命中次数}，无法统计时为 None
+        """
+        counts = counts or {}
+        for rule, count in counts.items():
+            self.totals[rule] = self.totals.get(rule, 0) + count
+        total = sum(counts.values())
+        if self.format == 'csv':
+            self._csv.writerow([filename, status, total] + [counts.get(rule, 0) for rule in self.rules])
+        else:
+            record = {
+                'file': filename,
+                'status': status,
+                'total': total,
+                'hits': dict((rule, counts[rule]) for rule in self.rules if counts.get(rule)),
+            }
+            self._file.write(('\n  ' if not self.files else ',\n  ') + json.dumps(record, ensure_ascii=False))
+        self.files += 1
+
+    def close(self):
+        """写入合计并关闭文件"""
+        total = sum(self.totals.values())
+        if self.format == 'csv':
+            self._csv.writerow(['合计', '', total] + [self.totals.get(rule, 0) for rule in self.rules])
+        else:
+            self._file.write('\n ],\n "totals": %s,\n "total": %d}\n' % (
+                json.dumps(self.totals, ensure_ascii=False), total))
+        self._file.close()
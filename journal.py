@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+批处理日志
+每处理完一个文件就向日志追加一行（JSONL），记录结果类型、替换次数、耗时以及增量清单所需的源文件信息。
+程序中断（Office 无响应、重启等）后，使用 --resume 重新运行时跳过日志中已完成的文件，
+并根据日志重建最终的统计结果。
+
+每条记录写入后立即交给操作系统（进程崩溃不会丢失），fsync 按组提交：
+累计一定数量的记录或距上次同步超过一定时间才同步一次，写日志本身不会成为瓶颈。
+断电时最多丢失最后一组记录，这些文件在续传时重新处理（输出文件原子发布，重复处理是安全的）。
+"""
+
+import os
+import json
+import time
+import logging
+
+JOURNAL_VERSION = 1
+SYNC_EVERY = 64  # 每累计多少条记录同步一次
+SYNC_INTERVAL = 1.0  # 距上次同步超过多少秒时同步
+
+
+def journal_path_for(output_folder, node=None):
+    """
+    日志文件保存在输出文件夹旁边，如 E:\\output -> E:\\output.journal.jsonl
+
+    多个节点共同处理时每个节点使用自己的日志，如 E:\\output.journal.shard-0-of-4.jsonl
+    """
+    suffix = f'.journal.{node}.jsonl' if node else '.journal.jsonl'
+    return os.path.normpath(output_folder) + suffix
+
+
+def read_journal(path):
+    """
+    读取日志
+
+    最后一行可能因中断而不完整，无法解析的行会被忽略。
+
+    Returns:
+        tuple: (开始记录, {文件名: 文件记录})；日志不存在时为 (None, {})
+    """
+    header = None
+    records = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('type') == 'start':
+                    header = record
+                    records = {}
+                elif record.get('type') == 'file':
+                    records[record['file']] = record
+    except FileNotFoundError:
+        pass
+    return header, records
+
+
+def _ends_without_newline(path):
+    """日志的最后一行是否不完整"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if not f.tell():
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b'\n'
+
+
+class BatchJournal(object):
+    """
+    追加写入的批处理日志
+
+    Args:
+        path: 日志文件路径
+        rules_hash: 当前替换规则的哈希值，续传时必须与日志中的一致
+        resume: 是否续传：读取已有日志中完成的文件并继续追加；否则重新开始一个日志
+        sync_every: 每累计多少条记录 fsync 一次
+        sync_interval: 距上次 fsync 超过多少秒时 fsync
+    """
+
+    def __init__(self, path, rules_hash, resume=False, sync_every=SYNC_EVERY, sync_interval=SYNC_INTERVAL):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.completed = {}  # 上次运行中已完成的文件 -> 日志记录
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+        if resume:
+            header, self.completed = read_journal(path)
+            if header is None:
+                logging.warning(f"没有找到可续传的处理日志，从头开始: {path}")
+            elif header.get('rules_hash') != rules_hash:
+                raise ValueError("替换规则与中断的运行不一致，无法续传；请去掉 --resume 重新处理")
+            else:
+                logging.info(f"续传: 处理日志中已完成 {len(self.completed)} 个文件")
+
+        if self.completed:
+            torn = _ends_without_newline(path)
+            self._file = open(path, 'a', encoding='utf-8')
+            if torn:
+                self._file.write('\n')  # 结束中断时写了一半的记录，后续记录从新行开始
+            self._write({'type': 'resume', 'time': time.time()})
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+            self._write({'type': 'start', 'version': JOURNAL_VERSION, 'rules_hash': rules_hash, 'time': time.time()})
+        self.sync()
+
+    def resumed_results(self):
+        """按处理结果的格式逐个产出上次运行中已完成的文件"""
+        for filename, record in self.completed.items():
+            source_stat = record.get('source_stat')
+            yield {
+                'filename': filename,
+                'replace_count': record['replace_count'],
+                'status': record['status'],
+                'outcome': record['outcome'],
+                'process_time': record['process_time'],
+                'source_stat': tuple(source_stat) if source_stat else None,
+                'source_hash': record.get('source_hash'),
+                'metrics': None,
+                'resumed': True,
+            }
+
+    def record(self, result):
+        """追加一个文件的处理结果"""
+        self._write({
+            'type': 'file',
+            'file': result['filename'],
+            'outcome': result['outcome'],
+            'replace_count': result['replace_count'],
+            'status': result['status'],
+            'process_time': round(result['process_time'], 6),
+            'source_stat': result.get('source_stat'),
+            'source_hash': result.get('source_hash'),
+        })
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self._pending += 1
+        if self._pending >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """将已写入的记录同步到磁盘"""
+        if self._pending:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self, finished=True):
+        """
+        关闭日志
+
+        Args:
+            finished: 运行是否正常结束（正常结束时追加结束记录）
+        """
+        if finished:
+            self._write({'type': 'end', 'time': time.time()})
+        self.sync()
+        self._file.close()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+增量运行清单
+记录每个已成功处理文件的大小、修改时间、内容哈希以及当时使用的替换规则哈希，
+再次运行时源文件和规则都未变化且输出文件仍存在的文件可直接跳过。
+"""
+
+import os
+import json
+import hashlib
+import logging
+
+MANIFEST_VERSION = 1
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_rules(rules):
+    """计算替换规则的哈希值，规则内容或顺序变化都会改变哈希"""
+    data = json.dumps(list(rules.items()), ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def file_digest(path):
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_path_for(output_folder, node=None):
+    """
+    清单文件保存在输出文件夹旁边，如 E:\\output -> E:\\output.manifest.json
+
+    按分片处理时每个分片使用自己的清单，如 E:\\output.manifest.shard-0-of-4.json
+    """
+    suffix = f'.manifest.{node}.json' if node else '.manifest.json'
+    return os.path.normpath(output_folder) + suffix
+
+
+class RunManifest(object):
+    """
+    增量运行清单
+
+    Args:
+        path: 清单文件路径
+        rules_hash: 当前替换规则的哈希值
+    """
+
+    def __init__(self, path, rules_hash):
+        self.path = path
+        self.rules_hash = rules_hash
+        self.entries = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """读取清单文件，文件不存在或已损坏时从空清单开始"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.entries = data.get('files', {})
+        except Exception as e:
+            logging.warning(f"读取增量清单失败，将重新处理所有文件: {str(e)}")
+            self.entries = {}
+
+    def save(self):
+        """原子地写入清单文件"""
+        if not self._dirty:
+            return
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.entries}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+        self._dirty = False
+
+    def lookup(self, key, source_path, output_path, stat=None):
+        """
+        检查文件是否可以跳过
+
+        大小、修改时间和规则哈希都与记录一致时直接命中，无需读取文件内容；
+        只有修改时间变化时再比较内容哈希。
+
+        Args:
+            key: 文件在清单中的键（相对路径）
+            source_path: 源文件路径
+            output_path: 输出文件路径
+            stat: 源文件的 os.stat 结果，未提供时自动获取
+
+        Returns:
+            dict: 命中时返回清单记录，否则返回 None
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry.get('rules') != self.rules_hash:
+            return None
+        if not os.path.exists(output_path):
+            return None
+        stat = stat or os.stat(source_path)
+        if entry['size'] != stat.st_size:
+            return None
+        if entry['mtime_ns'] != stat.st_mtime_ns:
+            # 修改时间变化但内容可能相同（如重新复制），比较内容哈希
+            if file_digest(source_path) != entry['sha256']:
+                return None
+            entry['mtime_ns'] = stat.st_mtime_ns
+            self._dirty = True
+        return entry
+
+    def record(self, key, size, mtime_ns, digest, replace_count):
+        """
+        记录一个成功处理的文件
+
+        Args:
+            key: 文件在清单中的键（相对路径）
+            size: 处理前源文件的大小
+            mtime_ns: 处理前源文件的修改时间（纳秒）
+            digest: 源文件内容的 SHA-256
+            replace_count: 替换次数
+        """
+        self.entries[key] = {
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'sha256': digest,
+            'rules': self.rules_hash,
+            'replace_count': replace_count,
+        }
+        self._dirty = True
+
+    def forget(self, key):
+        """移除文件记录（如本次处理失败）"""
+        if self.entries.pop(key, None) is not None:
+            self._dirty = True
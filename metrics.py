@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+处理指标
+记录每个文档各阶段（打开、匹配、替换、校验、保存、移动/复制）的耗时、读写字节数、COM 调用次数
+和每条规则的命中次数。文档级指标逐行写入 JSONL 文件，运行结束时可另外输出 Prometheus 文本格式的快照。
+
+处理代码通过模块级函数记录当前文档的指标，无需逐层传递对象：
+    metrics.start_document(filename)
+    with metrics.phase('open'):
+        ...
+    metrics.add_rule_hits(counts)
+    document_metrics = metrics.finish_document()
+
+工作进程中每次只处理一个文档，当前文档指标保存在进程内的模块变量中。
+"""
+
+import os
+import json
+import time
+import contextlib
+
+PHASES = ('open', 'match', 'replace', 'verify', 'save', 'move')
+
+
+class DocumentMetrics(object):
+    """
+    单个文档的指标
+
+    Args:
+        filename: 文件名（相对路径）
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.phases = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.com_calls = 0
+        self.rule_hits = {}
+        self.backend = None  # 成功处理该文档的引擎
+        self.backend_seconds = 0.0  # 该引擎的处理耗时
+        self.backend_failures = []  # 处理失败、改用下一个引擎的引擎名称
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_rule_hits(self, counts):
+        for rule, count in counts.items():
+            if count:
+                self.rule_hits[rule] = self.rule_hits.get(rule, 0) + count
+
+    def to_dict(self):
+        return {
+            'file': self.filename,
+            'phases': dict((name, round(seconds, 6)) for name, seconds in self.phases.items()),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'com_calls': self.com_calls,
+            'rule_hits': self.rule_hits,
+            'backend': self.backend,
+            'backend_seconds': round(self.backend_seconds, 6),
+            'backend_failures': self.backend_failures,
+        }
+
+
+class _NullMetrics(DocumentMetrics):
+    """没有正在记录的文档时使用，丢弃所有记录"""
+
+    def __init__(self):
+        DocumentMetrics.__init__(self, None)
+
+    def add_phase(self, name, seconds):
+        pass
+
+    def add_rule_hits(self, counts):
+        pass
+
+
+_NULL = _NullMetrics()
+_current = None
+
+
+def start_document(filename):
+    """开始记录一个文档的指标"""
+    global _current
+    _current = DocumentMetrics(filename)
+    return _current
+
+
+def finish_document():
+    """结束记录并返回当前文档的指标字典"""
+    global _current
+    document, _current = _current, None
+    return document.to_dict() if document is not None else None
+
+
+def current():
+    """当前文档的指标，没有正在记录的文档时返回丢弃记录的空对象"""
+    return _current if _current is not None else _NULL
+
+
+@contextlib.contextmanager
+def phase(name):
+    """记录代码块的耗时到当前文档的指定阶段（可多次进入，耗时累加）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current().add_phase(name, time.perf_counter() - start)
+
+
+def add_rule_hits(counts):
+    """累加当前文档的规则命中次数"""
+    current().add_rule_hits(counts)
+
+
+class MetricsWriter(object):
+    """
+    指标 JSONL 文件，每个文档一行，运行结束时追加一行运行汇总
+
+    Args:
+        path: 文件路径（追加写入）
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+def _label(value):
+    """转义 Prometheus 标签值"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RunMetrics(object):
+    """汇总整个运行的指标，用于输出 Prometheus 文本格式快照"""
+
+    def __init__(self):
+        self.documents = {}  # 结果类型 -> 文档数
+        self.phase_seconds = dict((name, 0.0) for name in PHASES)
+        self.document_seconds = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.com_calls = 0
+        self.rule_hits = {}
+        self.discovery_seconds = 0.0
+        self.backends = {}  # 引擎名称 -> {'documents', 'seconds', 'bytes', 'failures'}
+
+    def _backend(self, name):
+        return self.backends.setdefault(name, {'documents': 0, 'seconds': 0.0, 'bytes': 0, 'failures': 0})
+
+    def add(self, outcome, process_time, document):
+        """累加一个文档的结果和指标"""
+        self.documents[outcome] = self.documents.get(outcome, 0) + 1
+        self.document_seconds += process_time
+        if not document:
+            return
+        for name, seconds in document['phases'].items():
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+        self.bytes_read += document['bytes_read']
+        self.bytes_written += document['bytes_written']
+        self.com_calls += document['com_calls']
+        for rule, count in document['rule_hits'].items():
+            self.rule_hits[rule] = self.rule_hits.get(rule, 0) + count
+        if document.get('backend'):
+            backend = self._backend(document['backend'])
+            backend['documents'] += 1
+            backend['seconds'] += document['backend_seconds']
+            backend['bytes'] += document['bytes_read']
+        for name in document.get('backend_failures', ()):
+            self._backend(name)['failures'] += 1
+
+    def backend_throughput(self):
+        """
+        各引擎的吞吐量
+
+        Returns:
+            dict: {引擎名称: {'documents', 'seconds', 'bytes', 'failures', 'files_per_second', 'mb_per_second'}}
+        """
+        result = {}
+        for name, stats in sorted(self.backends.items()):
+            seconds = stats['seconds']
+            result[name] = dict(
+                stats,
+                seconds=round(seconds, 6),
+                files_per_second=round(stats['documents'] / seconds, 3) if seconds else None,
+                mb_per_second=round(stats['bytes'] / seconds / 1e6, 3) if seconds else None,
+            )
+        return result
+
+    def to_prometheus(self, prefix='batch_replace'):
+        """生成 Prometheus 文本格式的指标快照"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_label(val)}"' for key, val in labels)
+                lines.append(f"{prefix}_{name}{{{label_text}}} {value}" if label_text else f"{prefix}_{name} {value}")
+
+        metric('documents_total', 'counter', "Documents by outcome",
+               [((('outcome', outcome),), count) for outcome, count in sorted(self.documents.items())])
+        metric('document_seconds_total', 'counter', "Total per-document processing time",
+               [((), round(self.document_seconds, 6))])
+        metric('phase_seconds_total', 'counter', "Time spent per processing phase",
+               [((('phase', name),), round(seconds, 6)) for name, seconds in self.phase_seconds.items()])
+        metric('discovery_seconds', 'gauge', "Time spent scanning the source folder",
+               [((), round(self.discovery_seconds, 6))])
+        metric('bytes_read_total', 'counter', "Source bytes read", [((), self.bytes_read)])
+        metric('bytes_written_total', 'counter', "Output bytes written", [((), self.bytes_written)])
+        metric('com_calls_total', 'counter', "COM calls made", [((), self.com_calls)])
+        metric('rule_hits_total', 'counter', "Replacements per rule",
+               [((('rule', rule),), count) for rule, count in sorted(self.rule_hits.items())])
+        backends = sorted(self.backends.items())
+        metric('backend_documents_total', 'counter', "Documents processed per backend",
+               [((('backend', name),), stats['documents']) for name, stats in backends])
+        metric('backend_seconds_total', 'counter', "Processing time per backend",
+               [((('backend', name),), round(stats['seconds'], 6)) for name, stats in backends])
+        metric('backend_bytes_total', 'counter', "Source bytes processed per backend",
+               [((('backend', name),), stats['bytes']) for name, stats in backends])
+        metric('backend_failures_total', 'counter', "Backend failures that fell back to the next backend",
+               [((('backend', name),), stats['failures']) for name, stats in backends])
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """原子地写入 Prometheus 文本格式快照（可供 node_exporter 文本收集器读取）"""
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, path)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Office 应用程序实例池
+每个进程为 Word、Excel 各保留一个实例，在多个文档之间复用，避免每个文件都重新启动 Office。
+实例在处理一定数量的文档后，或健康检查失败时被回收并重新创建。
+"""
+
+import logging
+
+
+class OfficeAppPool(object):
+    """
+    Office 应用程序实例池
+
+    Args:
+        dispatch: 创建 COM 对象的函数，通常为 win32com.client.Dispatch，
+                  在 Linux 上可传入 fake_com.FakeDispatch 进行测试
+        recycle_after: 每个实例处理多少个文档后回收，0 表示不按数量回收
+        setup: {ProgID: 函数(app)}，实例创建后调用，用于设置选项
+        teardown: {ProgID: 函数(app)}，实例退出前调用，用于恢复设置
+    """
+
+    def __init__(self, dispatch, recycle_after=50, setup=None, teardown=None):
+        self._dispatch = dispatch
+        self._recycle_after = recycle_after
+        self._setup = setup or {}
+        self._teardown = teardown or {}
+        self._apps = {}  # ProgID -> 应用实例
+        self._uses = {}  # ProgID -> 已处理的文档数
+        self.stats = {'created': 0, 'recycled': 0, 'health_failures': 0}
+
+    def acquire(self, prog_id):
+        """
+        获取指定类型的应用实例，已有实例通过健康检查时直接复用
+
+        Args:
+            prog_id: 应用的 ProgID，如 "Word.Application"
+
+        Returns:
+            应用程序 COM 对象
+        """
+        app = self._apps.get(prog_id)
+        if app is not None and not self._is_healthy(app):
+            logging.warning(f"{prog_id} 实例健康检查失败，重新创建")
+            self.stats['health_failures'] += 1
+            self._discard(prog_id)
+            app = None
+
+        if app is None:
+            app = self._dispatch(prog_id)
+            self._apps[prog_id] = app
+            self._uses[prog_id] = 0
+            self.stats['created'] += 1
+            logging.info(f"已启动 {prog_id} 实例")
+            setup = self._setup.get(prog_id)
+            if setup:
+                try:
+                    setup(app)
+                except Exception:
+                    self._discard(prog_id)
+                    raise
+        return app
+
+    def release(self, prog_id, healthy=True):
+        """
+        归还应用实例，达到回收阈值或实例异常时将其关闭
+
+        Args:
+            prog_id: 应用的 ProgID
+            healthy: 本次处理过程中实例是否正常，False 时立即回收
+        """
+        if prog_id not in self._apps:
+            return
+        self._uses[prog_id] += 1
+        if not healthy:
+            logging.info(f"{prog_id} 实例处理出错，回收该实例")
+            self._discard(prog_id)
+        elif self._recycle_after and self._uses[prog_id] >= self._recycle_after:
+            logging.info(f"{prog_id} 实例已处理 {self._uses[prog_id]} 个文档，回收该实例")
+            self._discard(prog_id)
+
+    def close_all(self):
+        """关闭池中的所有应用实例"""
+        for prog_id in list(self._apps):
+            self._discard(prog_id)
+
+    def _is_healthy(self, app):
+        """健康检查：实例仍能响应 COM 调用"""
+        try:
+            app.Name
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, prog_id):
+        """退出并移除指定类型的应用实例"""
+        app = self._apps.pop(prog_id, None)
+        self._uses.pop(prog_id, None)
+        if app is None:
+            return
+        self.stats['recycled'] += 1
+        teardown = self._teardown.get(prog_id)
+        try:
+            if teardown:
+                teardown(app)
+            app.Quit()
+        except Exception:
+            pass
@@ -0,0 +1,721 @@
+# -*- coding: utf-8 -*-
+"""
+原生 OOXML 替换引擎
+直接以 zip 方式打开 .docx / .xlsx 文档并改写其中的 XML 部件，无需启动 Word/Excel，
+可在没有安装 Office 的 Linux 机器上运行。
+"""
+
+import os
+import re
+import copy
+import zlib
+import html
+import codecs
+import struct
+import zipfile
+import itertools
+import threading
+import collections
+import concurrent.futures
+from xml.sax.saxutils import escape
+
+import metrics
+from rule_matcher import compile_rules
+
+# XML 词法单元：标签或标签之间的文本
+_TOKEN_RE = re.compile(r'<[^>]*>|[^<]+')
+# 从标签中提取名称，group(1) 为 "/" 表示结束标签
+_TAG_NAME_RE = re.compile(r'<(/?)([^\s/>]+)')
+
+# .docx 中需要替换的部件：正文（含文本框）、页眉、页脚、脚注、尾注
+DOCX_PART_RE = re.compile(r'^word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml$')
+
+# Word 文档的段落与文本标签
+DOCX_CONTAINER_TAGS = frozenset(['w:p'])
+DOCX_TEXT_TAGS = frozenset(['w:t'])
+# mc:Fallback 中的文本框是 mc:Choice 的副本，只替换不计数，避免重复统计
+DOCX_QUIET_TAGS = frozenset(['mc:Fallback'])
+
+# .xlsx 中需要替换的部件：共享字符串表、工作表（内联字符串）、文档属性
+XLSX_SST_PART = 'xl/sharedStrings.xml'
+XLSX_SHEET_RE = re.compile(r'^xl/worksheets/[^/]+\.xml$')
+CORE_PROPS_PART = 'docProps/core.xml'
+
+# 共享字符串 si 与内联字符串 is 中的文本，拼音注释 rPh 不参与替换
+# 部分生成工具会使用 x: 前缀，一并支持
+XLSX_SST_TAGS = frozenset(['si', 'x:si'])
+XLSX_INLINE_TAGS = frozenset(['is', 'x:is'])
+XLSX_TEXT_TAGS = frozenset(['t', 'x:t'])
+XLSX_SKIP_TAGS = frozenset(['rPh', 'x:rPh'])
+
+# 引用共享字符串的单元格：<c ... t="s"><v>索引</v></c>
+_SHARED_TYPE_RE = re.compile(r'\st="s"')
+
+# 流式改写时每次读取的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 改写后部件的压缩：级别 0（不压缩）~ 9（最小），1 最快，适合中间结果；
+# 部件按块在线程池中并行压缩（zlib 压缩时释放 GIL），块之间以前一块的末尾 32KB 为预设字典，
+# 拼接后仍是一个普通的 deflate 数据流，压缩率与整体压缩相近
+COMPRESSION_LEVEL = 6
+COMPRESSION_THREADS = os.cpu_count() or 1
+COMPRESSION_BLOCK_SIZE = 1024 * 1024
+_DEFLATE_WINDOW = 32 * 1024
+_compress_pool = None
+_compress_pool_lock = threading.Lock()
+
+# 文档属性中需要替换的字段：标题、主题、关键词、备注
+_CORE_PROPS_RE = re.compile(
+    r'(<(dc:title|dc:subject|cp:keywords|dc:description)(?:\s[^>]*)?>)([^<]*)(</\2>)'
+)
+
+
+def splice_runs(texts, matches):
+    """
+    将匹配结果写回被拆分在多个文本节点中的文本
+
+    替换文本写入匹配起点所在的节点（保留该节点所属 w:r 的 w:rPr 格式），
+    匹配在后续节点中的部分被删除。
+
+    Args:
+        texts: 各文本节点的文本列表
+        matches: 按起点排序且互不重叠的 (start, end, replacement) 列表，
+                 位置基于 texts 拼接后的字符串
+
+    Returns:
+        list: 替换后的各文本节点文本
+    """
+    new_texts = []
+    offset = 0
+    index = 0
+    for text in texts:
+        start, end = offset, offset + len(text)
+        parts = []
+        pos = start
+        while index < len(matches) and matches[index][0] < end:
+            m_start, m_end, replacement = matches[index]
+            if m_start >= pos:
+                parts.append(text[pos - start:m_start - start])
+                parts.append(replacement)
+            # 跳过本节点中属于匹配的字符
+            pos = max(pos, min(m_end, end))
+            if m_end > end:
+                break  # 匹配延续到下一个节点
+            index += 1
+        parts.append(text[pos - start:])
+        new_texts.append(''.join(parts))
+        offset = end
+    return new_texts
+
+
+def replace_in_runs(texts, matcher):
+    """
+    在一个段落的文本节点中一次性应用全部替换规则
+
+    Args:
+        texts: 段落内各文本节点的文本列表
+        matcher: 编译后的规则匹配器
+
+    Returns:
+        tuple: (替换后的文本列表, {规则: 替换次数})
+    """
+    matches, counts = matcher.match_all(''.join(texts))
+    if not matches:
+        return texts, counts
+    return splice_runs(texts, matches), counts
+
+
+def _ensure_space_preserve(tag):
+    """为文本标签添加 xml:space="preserve"，防止首尾空格被 Office 丢弃"""
+    if 'xml:space=' in tag:
+        return tag
+    return tag[:-1] + ' xml:space="preserve">'
+
+
+class TextXmlRewriter(object):
+    """
+    流式改写 XML 部件中的文本内容
+
+    以容器标签（如 w:p）为单位收集其中的文本节点，拼接后查找匹配，
+    因此可以处理跨越多个 w:r 的匹配。嵌套容器（如文本框中的段落）单独处理。
+    XML 文本分块输入，容器之外的内容立即输出，只有尚未结束的最外层容器被缓存，
+    内存占用与最大的段落成正比，与部件大小无关。
+
+    Args:
+        rules: 替换规则字典或编译后的匹配器
+        container_tags: 段落级容器标签集合
+        text_tags: 文本节点标签集合
+        skip_tags: 其中的文本不参与替换的标签集合（如拼音 rPh）
+        quiet_tags: 其中的替换不计数的标签集合（如 mc:Fallback）
+        on_container: 每个容器处理完成时的回调，参数为该容器的替换计数 {规则: 替换次数}
+        count_only: 只统计匹配次数，不生成改写结果（feed 和 close 返回空字符串）
+    """
+
+    def __init__(self, rules, container_tags, text_tags,
+                 skip_tags=frozenset(), quiet_tags=frozenset(), on_container=None, count_only=False):
+        self.matcher = compile_rules(rules)
+        self.container_tags = container_tags
+        self.text_tags = text_tags
+        self.skip_tags = skip_tags
+        self.quiet_tags = quiet_tags
+        self.on_container = on_container
+        self.count_only = count_only
+        self._tail = ''  # 上一块末尾不完整的词法单元
+        self._pieces = []  # 尚未输出的词法单元
+        self._stack = []  # 容器上下文栈，每项为该容器内文本节点所在的 _pieces 下标列表
+        self._in_text = False
+        self._skip_depth = 0
+        self._quiet_depth = 0
+
+    def feed(self, text):
+        """
+        输入一段 XML 文本
+
+        Returns:
+            str: 已经可以输出的改写结果
+        """
+        data = self._tail + text
+        size = len(data)
+        pos = 0
+        while pos < size:
+            if data[pos] == '<':
+                end = data.find('>', pos)
+                if end == -1:
+                    break
+                end += 1
+            else:
+                end = data.find('<', pos)
+                if end == -1:
+                    break  # 文本可能在下一块中继续
+            self._token(data[pos:end])
+            pos = end
+        self._tail = data[pos:]
+        return self._flush()
+
+    def close(self):
+        """
+        结束输入
+
+        Returns:
+            str: 剩余的改写结果
+        """
+        if self._tail:
+            self._token(self._tail)
+            self._tail = ''
+        self._stack = []
+        return self._flush()
+
+    def _token(self, token):
+        pieces = self._pieces
+        stack = self._stack
+        if token[0] != '<':
+            if self._in_text and stack and not self._skip_depth:
+                stack[-1].append(len(pieces))
+            pieces.append(token)
+            return
+
+        pieces.append(token)
+        name_match = _TAG_NAME_RE.match(token)
+        if not name_match:
+            return  # 声明、注释等
+        closing, name = name_match.groups()
+        self_closing = token.endswith('/>')
+
+        if name in self.text_tags:
+            self._in_text = not closing and not self_closing
+        elif name in self.skip_tags and not self_closing:
+            self._skip_depth += -1 if closing else 1
+        elif name in self.quiet_tags and not self_closing:
+            self._quiet_depth += -1 if closing else 1
+        elif name in self.container_tags:
+            if self_closing:
+                # 空容器（如共享字符串表中的 <si/>）也要回调，按顺序编号的容器才不会错位
+                if self.on_container is not None:
+                    self.on_container({})
+            elif not closing:
+                stack.append([])
+            elif stack:
+                nodes = stack.pop()
+                if self.count_only:
+                    text = ''.join(html.unescape(pieces[i]) for i in nodes)
+                    counts = self.matcher.count(text) if text else {}
+                else:
+                    counts = _rewrite_container(pieces, nodes, self.matcher)
+                if self.on_container is not None:
+                    self.on_container({} if self._quiet_depth else counts)
+
+    def _flush(self):
+        """输出最外层未结束容器之前的所有词法单元"""
+        pieces = self._pieces
+        if not self._stack:
+            self._pieces = []
+            return '' if self.count_only else ''.join(pieces)
+        # 最外层容器从其第一个文本节点之前开始缓存，之前的内容可以输出
+        first = next((nodes[0] for nodes in self._stack if nodes), len(pieces))
+        keep = max(first - 1, 0)  # 保留文本节点的开始标签，替换时可能需要修改
+        if not keep:
+            return ''
+        self._pieces = pieces[keep:]
+        for nodes in self._stack:
+            nodes[:] = [i - keep for i in nodes]
+        return '' if self.count_only else ''.join(pieces[:keep])
+
+
+def rewrite_text_xml(xml, rules, container_tags, text_tags,
+                     skip_tags=frozenset(), quiet_tags=frozenset()):
+    """
+    改写 XML 部件中的文本内容（一次性输入完整的 XML 文本）
+
+    Args:
+        xml: XML 文本
+        其余参数同 TextXmlRewriter
+
+    Returns:
+        tuple: (新的 XML 文本, 容器替换计数列表)
+               计数列表按容器结束顺序排列，每项为 {规则: 替换次数}
+    """
+    container_counts = []
+    rewriter = TextXmlRewriter(rules, container_tags, text_tags, skip_tags, quiet_tags,
+                               on_container=container_counts.append)
+    return rewriter.feed(xml) + rewriter.close(), container_counts
+
+
+def _rewrite_container(pieces, nodes, matcher):
+    """对一个容器内的文本节点执行替换，直接修改 pieces，返回替换计数"""
+    if not nodes:
+        return {}
+    texts = [html.unescape(pieces[i]) for i in nodes]
+    new_texts, counts = replace_in_runs(texts, matcher)
+    if not counts:
+        return counts
+    for i, old, new in zip(nodes, texts, new_texts):
+        if new == old:
+            continue
+        pieces[i] = escape(new)
+        if new != new.strip():
+            pieces[i - 1] = _ensure_space_preserve(pieces[i - 1])
+    return counts
+
+
+def merge_counts(total, counts, weight=1):
+    """将 counts 中的计数按权重累加到 total 中"""
+    for rule, count in counts.items():
+        total[rule] = total.get(rule, 0) + count * weight
+    return total
+
+
+def rewrite_package(src_path, dst_path, rewrite_part):
+    """
+    复制 zip 包并流式改写其中的部件
+
+    每个部件按块读取、改写和写出，不会把整个部件读入内存。
+    不需要改写的部件（图片、字体、嵌入对象等）直接复制压缩后的数据，不解压也不重新压缩。
+
+    Args:
+        src_path: 源文件路径
+        dst_path: 输出文件路径
+        rewrite_part: 回调函数 部件名 -> 流式改写器（具有 feed(文本) 和 close() 方法）
+                      或 None（原样复制）
+    """
+    with zipfile.ZipFile(src_path) as zin, zipfile.ZipFile(dst_path, 'w') as zout:
+        for info in zin.infolist():
+            rewriter = rewrite_part(info.filename)
+            if rewriter is None and _copy_raw_member(zin, zout, info):
+                continue
+            out_info = copy.copy(info)
+            # 改写后部件可能变大，接近 zip 大小上限时提前启用 ZIP64
+            force_zip64 = info.file_size * 2 > zipfile.ZIP64_LIMIT
+            if rewriter is not None and COMPRESSION_LEVEL == 0:
+                out_info.compress_type = zipfile.ZIP_STORED
+            if out_info.compress_type == zipfile.ZIP_DEFLATED and hasattr(zout, 'start_dir'):
+                dst = _ParallelDeflateWriter(zout, out_info, force_zip64)
+                with zin.open(info) as src:
+                    _stream_part(src, dst, rewriter)
+                dst.close()
+                continue
+            with zin.open(info) as src, zout.open(out_info, 'w', force_zip64=force_zip64) as dst:
+                _stream_part(src, dst, rewriter)
+
+
+_ZIP64_EXTRA_ID = 0x0001
+_DATA_DESCRIPTOR_FLAG = 0x08
+
+
+def _copy_raw_member(zin, zout, info):
+    """
+    把部件压缩后的数据原样从 zin 复制到 zout
+
+    zipfile 没有公开的原样复制接口，这里直接写出本地文件头和数据，并登记到 zout 的中央目录；
+    CRC、压缩方式和大小都沿用源文件中的记录。zout 不支持时（如旧版 Python）返回 False，由调用方解压复制。
+
+    Returns:
+        bool: 是否已复制
+    """
+    if not hasattr(zout, 'start_dir') or getattr(zout, '_writing', False):
+        return False
+    with metrics.phase('save'):
+        zin.fp.seek(info.header_offset)
+        header = zin.fp.read(zipfile.sizeFileHeader)
+        if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"部件的本地文件头损坏: {info.filename}")
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        data_offset = info.header_offset + zipfile.sizeFileHeader + name_length + extra_length
+
+        out_info = copy.copy(info)
+        # 大小写在本地文件头中，不再使用数据描述符；ZIP64 扩展字段由 FileHeader 按需重新生成
+        out_info.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+        out_info.extra = _strip_zip64_extra(info.extra)
+        zout.fp.seek(zout.start_dir)
+        out_info.header_offset = zout.start_dir
+        zout.fp.write(out_info.FileHeader(None))
+
+        zin.fp.seek(data_offset)
+        remaining = info.compress_size
+        while remaining:
+            chunk = zin.fp.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"部件数据不完整: {info.filename}")
+            zout.fp.write(chunk)
+            remaining -= len(chunk)
+
+        zout.start_dir = zout.fp.tell()
+        zout.filelist.append(out_info)
+        zout.NameToInfo[out_info.filename] = out_info
+    return True
+
+
+def set_compression(level=None, threads=None):
+    """
+    设置改写后部件的压缩参数
+
+    Args:
+        level: 压缩级别 0~9，0 表示不压缩，1 最快
+        threads: 并行压缩的线程数
+    """
+    global COMPRESSION_LEVEL, COMPRESSION_THREADS, _compress_pool
+    if level is not None:
+        if not 0 <= level <= 9:
+            raise ValueError(f"压缩级别应为 0~9: {level}")
+        COMPRESSION_LEVEL = level
+    if threads is not None and threads != COMPRESSION_THREADS:
+        COMPRESSION_THREADS = max(1, threads)
+        with _compress_pool_lock:
+            if _compress_pool is not None:
+                _compress_pool.shutdown(wait=False)
+                _compress_pool = None
+
+
+def _get_compress_pool():
+    global _compress_pool
+    with _compress_pool_lock:
+        if _compress_pool is None:
+            _compress_pool = concurrent.futures.ThreadPoolExecutor(COMPRESSION_THREADS, thread_name_prefix='deflate')
+        return _compress_pool
+
+
+def _deflate_block(block, dictionary, level, final):
+    """压缩一块数据（原始 deflate 格式）；不是最后一块时以同步标记结束，使各块可以直接拼接"""
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(block) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _ParallelDeflateWriter(object):
+    """
+    把一个部件按块并行压缩后按顺序写入 zip 包
+
+    先写出占位的本地文件头，压缩完成后回填 CRC 和大小；同时在压缩中的块数有上限，内存占用与部件大小无关。
+    只有一个线程或部件小于一块时直接在当前线程压缩。
+
+    Args:
+        zout: 以 'w' 模式打开的 ZipFile（输出文件须可定位）
+        info: 部件的 ZipInfo（沿用其名称、时间和属性）
+        zip64: 是否使用 ZIP64 格式的本地文件头
+    """
+
+    def __init__(self, zout, info, zip64):
+        self._zout = zout
+        self._info = info
+        self._zip64 = zip64
+        self._level = COMPRESSION_LEVEL
+        self._pool = _get_compress_pool() if COMPRESSION_THREADS > 1 else None
+        self._max_pending = 2 * COMPRESSION_THREADS
+        self._buffer = bytearray()
+        self._dictionary = b''
+        self._pending = collections.deque()
+        self._crc = 0
+        self._size = 0
+        self._compress_size = 0
+
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+        info.extra = _strip_zip64_extra(info.extra)
+        info.CRC = info.file_size = info.compress_size = 0
+        zout.fp.seek(zout.start_dir)
+        info.header_offset = zout.start_dir
+        zout.fp.write(info.FileHeader(zip64))
+
+    def write(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= COMPRESSION_BLOCK_SIZE:
+            block = bytes(self._buffer[:COMPRESSION_BLOCK_SIZE])
+            del self._buffer[:COMPRESSION_BLOCK_SIZE]
+            self._submit(block, False)
+
+    def _submit(self, block, final):
+        dictionary, self._dictionary = self._dictionary, block[-_DEFLATE_WINDOW:]
+        if self._pool is None or (final and not self._pending):
+            self._write_out(_deflate_block(block, dictionary, self._level, final))
+            return
+        self._pending.append(self._pool.submit(_deflate_block, block, dictionary, self._level, final))
+        while self._pending and (len(self._pending) > self._max_pending or self._pending[0].done()):
+            self._write_out(self._pending.popleft().result())
+
+    def _write_out(self, data):
+        self._zout.fp.write(data)
+        self._compress_size += len(data)
+
+    def close(self):
+        """压缩剩余数据，回填本地文件头并登记到中央目录"""
+        self._submit(bytes(self._buffer), True)
+        while self._pending:
+            self._write_out(self._pending.popleft().result())
+        info = self._info
+        info.CRC = self._crc
+        info.file_size = self._size
+        info.compress_size = self._compress_size
+        if not self._zip64 and max(self._size, self._compress_size) > zipfile.ZIP64_LIMIT:
+            raise zipfile.LargeZipFile(f"部件超出大小上限，需要 ZIP64: {info.filename}")
+        zout = self._zout
+        end = zout.fp.tell()
+        zout.fp.seek(info.header_offset)
+        zout.fp.write(info.FileHeader(self._zip64))
+        zout.fp.seek(end)
+        zout.start_dir = end
+        zout.filelist.append(info)
+        zout.NameToInfo[info.filename] = info
+
+
+def _strip_zip64_extra(extra):
+    """去掉扩展字段中的 ZIP64 字段"""
+    result = []
+    offset = 0
+    while offset + 4 <= len(extra):
+        field_id, field_length = struct.unpack('<HH', extra[offset:offset + 4])
+        end = offset + 4 + field_length
+        if field_id != _ZIP64_EXTRA_ID:
+            result.append(extra[offset:end])
+        offset = end
+    return b''.join(result)
+
+
+def scan_package(src_path, rewrite_part):
+    """
+    只读地把 zip 包中的部件输入改写器（用于统计匹配次数），不写出任何文件
+
+    回调返回 None 的部件不解压。
+
+    Args:
+        src_path: 源文件路径
+        rewrite_part: 同 rewrite_package
+    """
+    with zipfile.ZipFile(src_path) as zin:
+        for info in zin.infolist():
+            rewriter = rewrite_part(info.filename)
+            if rewriter is None:
+                continue
+            with zin.open(info) as src:
+                _stream_part(src, None, rewriter)
+
+
+def _stream_part(src, dst, rewriter):
+    """按块复制部件内容，指定改写器时以 UTF-8 解码后改写；dst 为 None 时丢弃输出"""
+    decoder = codecs.getincrementaldecoder('utf-8')() if rewriter is not None else None
+    while True:
+        with metrics.phase('open'):
+            chunk = src.read(STREAM_CHUNK_SIZE)
+        with metrics.phase('replace'):
+            if decoder is None:
+                data = chunk
+            elif chunk:
+                data = rewriter.feed(decoder.decode(chunk)).encode('utf-8')
+            else:
+                data = (rewriter.feed(decoder.decode(b'', final=True)) + rewriter.close()).encode('utf-8')
+        if dst is not None:
+            with metrics.phase('save'):
+                dst.write(data)
+        if not chunk:
+            return
+
+
+class _BufferedRewriter(object):
+    """把整个部件收集后一次性改写，用于很小的部件（如 docProps/core.xml）"""
+
+    def __init__(self, rewrite):
+        self._rewrite = rewrite
+        self._parts = []
+
+    def feed(self, text):
+        self._parts.append(text)
+        return ''
+
+    def close(self):
+        return self._rewrite(''.join(self._parts))
+
+
+def replace_in_docx(src_path, dst_path, rules):
+    """
+    使用原生引擎替换 .docx 文档中的文本，保留原有格式
+
+    Args:
+        src_path: 源文档路径
+        dst_path: 输出文档路径，为 None 时只统计替换次数，不写出文件
+        rules: 替换规则字典 {旧文本: 新文本} 或编译后的匹配器
+
+    Returns:
+        dict: 每条规则的替换次数
+    """
+    matcher = compile_rules(rules)
+    total_counts = {}
+    count_only = dst_path is None
+
+    def rewrite_part(name):
+        if not DOCX_PART_RE.match(name):
+            return None
+        return TextXmlRewriter(
+            matcher, DOCX_CONTAINER_TAGS, DOCX_TEXT_TAGS, quiet_tags=DOCX_QUIET_TAGS,
+            on_container=lambda counts: merge_counts(total_counts, counts),
+            count_only=count_only
+        )
+
+    if count_only:
+        scan_package(src_path, rewrite_part)
+    else:
+        rewrite_package(src_path, dst_path, rewrite_part)
+    return total_counts
+
+
+def count_in_docx(src_path, rules):
+    """只读统计 .docx 文档中每条规则的替换次数（与 replace_in_docx 的结果一致）"""
+    return replace_in_docx(src_path, None, rules)
+
+
+class _SheetRewriter(TextXmlRewriter):
+    """
+    工作表部件的流式改写器，同时统计每个共享字符串被单元格引用的次数
+
+    Args:
+        ref_counts: 引用次数字典 {共享字符串索引: 引用次数}，原地累加
+        其余参数同 TextXmlRewriter
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.ref_counts = kwargs.pop('ref_counts')
+        TextXmlRewriter.__init__(self, *args, **kwargs)
+        self._shared_cell = False
+        self._in_value = False
+
+    def _token(self, token):
+        if token[0] != '<':
+            if self._in_value:
+                try:
+                    index = int(token)
+                    self.ref_counts[index] = self.ref_counts.get(index, 0) + 1
+                except ValueError:
+                    pass
+        elif token.startswith(('<c ', '<x:c ')):
+            self._shared_cell = not token.endswith('/>') and _SHARED_TYPE_RE.search(token) is not None
+        elif token in ('<v>', '<x:v>'):
+            self._in_value = self._shared_cell
+        elif token in ('</v>', '</x:v>'):
+            self._in_value = False
+        elif token in ('</c>', '</x:c>'):
+            self._shared_cell = False
+        TextXmlRewriter._token(self, token)
+
+
+def replace_in_core_props(xml, rules):
+    """
+    替换文档属性（docProps/core.xml）中的标题、主题、关键词和备注
+
+    Returns:
+        tuple: (新的 XML 文本, {规则: 替换次数})
+    """
+    matcher = compile_rules(rules)
+    total_counts = {}
+
+    def replace_field(match):
+        new_text, counts = matcher.replace(html.unescape(match.group(3)))
+        if not counts:
+            return match.group(0)
+        merge_counts(total_counts, counts)
+        return match.group(1) + escape(new_text) + match.group(4)
+
+    return _CORE_PROPS_RE.sub(replace_field, xml), total_counts
+
+
+def replace_in_xlsx(src_path, dst_path, rules):
+    """
+    使用原生引擎替换 .xlsx 工作簿中的文本
+
+    共享字符串表中的每个字符串只处理一次，无论有多少单元格引用它；
+    替换次数按引用该字符串的单元格数量加权统计。
+
+    Args:
+        src_path: 源工作簿路径
+        dst_path: 输出工作簿路径，为 None 时只统计替换次数，不写出文件
+        rules: 替换规则字典 {旧文本: 新文本} 或编译后的匹配器
+
+    Returns:
+        dict: 每条规则的替换次数
+    """
+    matcher = compile_rules(rules)
+    total_counts = {}
+    count_only = dst_path is None
+    shared_counts = {}  # 有替换的共享字符串的替换次数，按索引保存
+    shared_index = itertools.count()
+    ref_counts = {}  # 每个共享字符串被单元格引用的次数
+
+    def count_shared(counts):
+        index = next(shared_index)
+        if counts:
+            shared_counts[index] = counts
+
+    def replace_core(text):
+        xml, counts = replace_in_core_props(text, matcher)
+        merge_counts(total_counts, counts)
+        return xml
+
+    def rewrite_part(name):
+        if name == XLSX_SST_PART:
+            return TextXmlRewriter(
+                matcher, XLSX_SST_TAGS, XLSX_TEXT_TAGS, skip_tags=XLSX_SKIP_TAGS,
+                on_container=count_shared, count_only=count_only
+            )
+        if XLSX_SHEET_RE.match(name):
+            return _SheetRewriter(
+                matcher, XLSX_INLINE_TAGS, XLSX_TEXT_TAGS, skip_tags=XLSX_SKIP_TAGS,
+                on_container=lambda counts: merge_counts(total_counts, counts),
+                ref_counts=ref_counts, count_only=count_only
+            )
+        if name == CORE_PROPS_PART:
+            return _BufferedRewriter(replace_core)
+        return None
+
+    if count_only:
+        scan_package(src_path, rewrite_part)
+    else:
+        rewrite_package(src_path, dst_path, rewrite_part)
+
+    for index, counts in shared_counts.items():
+        merge_counts(total_counts, counts, ref_counts.get(index, 0))
+    return total_counts
+
+
+def count_in_xlsx(src_path, rules):
+    """只读统计 .xlsx 工作簿中每条规则的替换次数（与 replace_in_xlsx 的结果一致）"""
+    return replace_in_xlsx(src_path, None, rules)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+异步处理流水线
+源文件和输出文件位于高延迟的网络共享时，把每个文件的处理拆成三个阶段重叠执行：
+预读（I/O 线程把源文件读到本地）、处理（在进程池中执行替换）、后写（I/O 线程发布结果）。
+阶段之间使用有界队列，下游处理不过来时上游等待；在途文件总数也有上限，
+内存和本地缓冲占用与文件总数无关。网络等待与替换处理同时进行，而不是依次累加。
+
+事件循环运行在后台线程中，调用方通过普通的生成器按输入顺序逐个取得结果。
+"""
+
+import queue
+import asyncio
+import logging
+import threading
+import concurrent.futures
+
+# 队列结束标记
+_DONE = object()
+
+
+class Pipeline(object):
+    """
+    三阶段异步流水线：预读 -> 处理 -> 后写
+
+    Args:
+        fetch: 预读函数 item -> (payload, result)，在 I/O 线程中执行；
+               result 不为 None 时该项已有结果（如增量缓存），不再处理和写出
+        process: 处理函数 payload -> result，在 executor 中执行（使用进程池时必须可被 pickle）
+        store: 写出函数 (payload, result) -> result，在 I/O 线程中执行
+        fail: 任一阶段出错时生成结果的函数 (item, 异常) -> result
+        executor: 执行 process 的执行器（通常为进程池）
+        cpu_slots: 同时处理的文件数（通常等于进程池的进程数）
+        io_threads: 预读和写出阶段各自同时进行的文件数
+        depth: 阶段之间队列的容量
+    """
+
+    def __init__(self, fetch, process, store, fail, executor, cpu_slots=1, io_threads=4, depth=8):
+        self.fetch = fetch
+        self.process = process
+        self.store = store
+        self.fail = fail
+        self.executor = executor
+        self.cpu_slots = max(1, cpu_slots)
+        self.io_threads = max(1, io_threads)
+        self.depth = max(1, depth)
+        # 在途文件上限：各阶段正在处理的文件、阶段间队列和等待按顺序输出的结果
+        self.max_in_flight = self.cpu_slots + 2 * self.io_threads + 3 * self.depth
+
+    def results(self, items):
+        """
+        按输入顺序逐个产出结果
+
+        Args:
+            items: 输入项迭代器（可以是边扫描边产出的阻塞迭代器）
+
+        Yields:
+            每一项的结果
+        """
+        out = queue.Queue()
+        state = {}
+        loop = asyncio.new_event_loop()
+        # 扫描迭代器占用一个线程，预读和写出各占 io_threads 个
+        io_pool = concurrent.futures.ThreadPoolExecutor(2 * self.io_threads + 1)
+        thread = threading.Thread(
+            target=self._run_loop, args=(loop, iter(items), io_pool, out, state),
+            name="pipeline", daemon=True
+        )
+        thread.start()
+
+        pending = {}  # 提前完成、等待按顺序输出的结果
+        next_index = 0
+        try:
+            while True:
+                index, result = out.get()
+                if index is None:
+                    if result is not None:
+                        raise result
+                    break
+                pending[index] = result
+                while next_index in pending:
+                    result = pending.pop(next_index)
+                    next_index += 1
+                    self._release_slot(loop, state)
+                    yield result
+        finally:
+            if thread.is_alive():
+                try:
+                    loop.call_soon_threadsafe(self._cancel, state)
+                except RuntimeError:
+                    pass  # 事件循环已结束
+                thread.join()
+            io_pool.shutdown(wait=False)
+
+    @staticmethod
+    def _release_slot(loop, state):
+        try:
+            loop.call_soon_threadsafe(state['slots'].release)
+        except RuntimeError:
+            pass  # 事件循环已结束，所有输入都已提交
+
+    @staticmethod
+    def _cancel(state):
+        task = state.get('task')
+        if task is not None:
+            task.cancel()
+
+    def _run_loop(self, loop, items, io_pool, out, state):
+        error = None
+        try:
+            asyncio.set_event_loop(loop)
+            state['task'] = loop.create_task(self._main(loop, items, io_pool, out, state))
+            loop.run_until_complete(state['task'])
+        except asyncio.CancelledError:
+            pass  # 调用方提前结束
+        except Exception as e:
+            logging.error(f"处理流水线异常结束: {str(e)}")
+            error = e
+        finally:
+            loop.close()
+            out.put((None, error))
+
+    async def _main(self, loop, items, io_pool, out, state):
+        slots = asyncio.Semaphore(self.max_in_flight)
+        state['slots'] = slots
+        fetch_queue = asyncio.Queue(self.depth)
+        process_queue = asyncio.Queue(self.depth)
+        store_queue = asyncio.Queue(self.depth)
+
+        async def produce():
+            index = 0
+            while True:
+                await slots.acquire()
+                item = await loop.run_in_executor(io_pool, next, items, _DONE)
+                if item is _DONE:
+                    break
+                await fetch_queue.put((index, item))
+                index += 1
+            await fetch_queue.put(_DONE)
+
+        async def fetch(job):
+            index, item = job
+            try:
+                payload, result = await loop.run_in_executor(io_pool, self.fetch, item)
+            except Exception as e:
+                payload, result = None, self.fail(item, e)
+            if result is not None:
+                out.put((index, result))
+                return None
+            return index, item, payload
+
+        async def process(job):
+            index, item, payload = job
+            try:
+                result = await loop.run_in_executor(self.executor, self.process, payload)
+            except Exception as e:
+                result = self.fail(item, e)
+            return index, item, payload, result
+
+        async def store(job):
+            index, item, payload, result = job
+            try:
+                result = await loop.run_in_executor(io_pool, self.store, payload, result)
+            except Exception as e:
+                result = self.fail(item, e)
+            out.put((index, result))
+            return None
+
+        await asyncio.gather(
+            produce(),
+            self._stage(fetch_queue, process_queue, self.io_threads, fetch),
+            self._stage(process_queue, store_queue, self.cpu_slots, process),
+            self._stage(store_queue, None, self.io_threads, store),
+        )
+
+    @staticmethod
+    async def _stage(inbox, outbox, concurrency, handle):
+        """从 inbox 取出任务并发处理，结果放入 outbox；输入结束后向 outbox 传递结束标记"""
+        async def worker():
+            while True:
+                job = await inbox.get()
+                if job is _DONE:
+                    await inbox.put(_DONE)  # 通知同一阶段的其他协程
+                    return
+                job = await handle(job)
+                if job is not None and outbox is not None:
+                    await outbox.put(job)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        if outbox is not None:
+            await outbox.put(_DONE)
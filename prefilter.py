@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+零打开预筛选
+只读取 .docx/.xlsx 中承载文本的 zip 部件，只提取文本节点内容（不做完整的 XML 解析），
+检查其中是否存在任何规则的匹配。没有匹配的文档无需启动 Office 或改写，可以直接复制到输出目录。
+"""
+
+import re
+import html
+import codecs
+import zipfile
+
+from ooxml_engine import (
+    DOCX_PART_RE, XLSX_SST_PART, XLSX_SHEET_RE, CORE_PROPS_PART,
+    DOCX_CONTAINER_TAGS, DOCX_TEXT_TAGS, XLSX_SST_TAGS, XLSX_INLINE_TAGS,
+    XLSX_TEXT_TAGS, XLSX_SKIP_TAGS, TextXmlRewriter, rewrite_text_xml,
+)
+from rule_matcher import compile_rules
+
+# 文本节点 <w:t>、<t>、<x:t> 的内容（不匹配 <w:tab/>、<w:tbl> 等）
+_TEXT_NODE_RE = re.compile(rb'<(?:w:|x:)?t(?:\s[^>]*)?>([^<]*)<')
+# 文档属性中参与替换的字段内容
+_CORE_TEXT_RE = re.compile(rb'<(?:dc:title|dc:subject|cp:keywords|dc:description)(?:\s[^>]*)?>([^<]*)<')
+
+PREFILTER_EXTENSIONS = ('.docx', '.xlsx')
+
+# 超过该大小的部件按块流式检查，不整体读入内存
+STREAM_THRESHOLD = 8 * 1024 * 1024
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def _text_parts(names, ext):
+    """筛选出承载文本的部件名"""
+    if ext == '.docx':
+        return [name for name in names if DOCX_PART_RE.match(name)]
+    return [
+        name for name in names
+        if name in (XLSX_SST_PART, CORE_PROPS_PART) or XLSX_SHEET_RE.match(name)
+    ]
+
+
+def _part_has_matches(name, data, matcher):
+    """检查单个部件中是否存在匹配"""
+    pattern = _CORE_TEXT_RE if name == CORE_PROPS_PART else _TEXT_NODE_RE
+    text = html.unescape(b''.join(pattern.findall(data)).decode('utf-8'))
+    if matcher.search(text):
+        return True
+    if matcher.regex_rules or b'txbxContent' in data:
+        # 文本框段落嵌套在外层段落中，简单拼接可能把外层段落的文本隔开；
+        # 正则规则的 ^、$、\b 等依赖段落边界，拼接后可能匹配不到。
+        # 这两种情况按与原生引擎相同的单元（段落、字符串、属性字段）逐个检查，保证不会漏判
+        return _exact_part_has_matches(name, data.decode('utf-8'), matcher)
+    return False
+
+
+def _exact_part_has_matches(name, xml, matcher):
+    """按原生引擎的处理单元逐个检查部件中是否存在匹配"""
+    if name == CORE_PROPS_PART:
+        return any(
+            matcher.search(html.unescape(value.decode('utf-8')))
+            for value in _CORE_TEXT_RE.findall(xml.encode('utf-8'))
+        )
+    _, container_counts = rewrite_text_xml(xml, matcher, *_part_tags(name))
+    return any(container_counts)
+
+
+def _part_tags(name):
+    """部件对应的 (容器标签, 文本标签, 跳过标签)"""
+    if name == XLSX_SST_PART:
+        return XLSX_SST_TAGS, XLSX_TEXT_TAGS, XLSX_SKIP_TAGS
+    if XLSX_SHEET_RE.match(name):
+        return XLSX_INLINE_TAGS, XLSX_TEXT_TAGS, XLSX_SKIP_TAGS
+    return DOCX_CONTAINER_TAGS, DOCX_TEXT_TAGS, frozenset()
+
+
+def _stream_part_has_matches(package, name, matcher):
+    """
+    按块检查大部件中是否存在匹配，内存占用与部件大小无关
+
+    只有普通规则时拼接各块的文本节点内容查找，相邻块之间保留最长规则长度的重叠；
+    有正则规则或遇到文本框时改为按容器逐个检查。
+    """
+    if matcher.regex_rules:
+        return _stream_exact_has_matches(package, name, matcher)
+    overlap = max((len(pattern) for pattern in matcher.patterns), default=1) - 1
+    carry = ''
+    tail = b''
+    with package.open(name) as part:
+        while True:
+            chunk = part.read(STREAM_CHUNK_SIZE)
+            data = tail + chunk
+            if b'txbxContent' in data:
+                return _stream_exact_has_matches(package, name, matcher)
+            # 在最后一个 < 处切分，文本节点只有遇到其后的 < 才完整
+            cut = data.rfind(b'<') if chunk else len(data)
+            if cut == -1:
+                tail = data
+                continue
+            nodes = _TEXT_NODE_RE.findall(data, 0, cut + 1)
+            tail = data[cut:]
+            text = carry + html.unescape(b''.join(nodes).decode('utf-8'))
+            if matcher.search(text):
+                return True
+            if not chunk:
+                return False
+            carry = text[-overlap:] if overlap else ''
+
+
+def _stream_exact_has_matches(package, name, matcher):
+    """按块输入流式改写器，按容器逐个检查，找到第一个匹配即停止"""
+    found = []
+
+    def on_container(counts):
+        if counts:
+            found.append(counts)
+
+    rewriter = TextXmlRewriter(matcher, *_part_tags(name), on_container=on_container)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with package.open(name) as part:
+        while not found:
+            chunk = part.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                rewriter.feed(decoder.decode(b'', final=True))
+                rewriter.close()
+                break
+            rewriter.feed(decoder.decode(chunk))
+    return bool(found)
+
+
+def package_has_matches(path, rules, fmt=None):
+    """
+    判断 .docx/.xlsx 文档中是否可能存在需要替换的文本
+
+    结果只会多报不会漏报：返回 False 时文档中一定没有匹配。
+
+    Args:
+        path: 文档路径
+        rules: 替换规则字典或编译后的匹配器
+        fmt: 根据文件内容识别的格式（如 'docx'），为空时根据扩展名判断
+
+    Returns:
+        bool: 是否存在匹配；无法判断（不支持的格式、文件损坏等）时返回 None
+    """
+    ext = '.' + fmt if fmt else path[path.rfind('.'):].lower()
+    if ext not in PREFILTER_EXTENSIONS:
+        return None
+    matcher = compile_rules(rules)
+    try:
+        with zipfile.ZipFile(path) as package:
+            for name in _text_parts(package.namelist(), ext):
+                if name != CORE_PROPS_PART and package.getinfo(name).file_size > STREAM_THRESHOLD:
+                    if _stream_part_has_matches(package, name, matcher):
+                        return True
+                elif _part_has_matches(name, package.read(name), matcher):
+                    return True
+    except (OSError, ValueError, zipfile.BadZipFile, UnicodeDecodeError):
+        return None
+    return False
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+重试策略
+按错误类型决定是否重试：文件被占用、Office 忙（RPC 调用被拒绝）、Office 进程意外退出等暂时性错误
+按指数退避（带随机抖动）有限次重试；文件损坏、格式不支持、需要密码等永久性错误立即失败，
+不再为注定失败的文件反复启动 Word/Excel。
+
+每个引擎有一个熔断器：连续多次出现暂时性错误（跨文件累计）说明引擎整体出了问题
+（如 Office 无法启动、许可证失效），此时不再重试，每个文件只尝试一次，直到该引擎再次成功。
+熔断器的状态保存在进程内，使用多个工作进程时各进程分别统计。
+"""
+
+import time
+import errno
+import random
+import logging
+import zipfile
+
+from com_counter import ComBudgetExceeded
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+# 暂时性的 COM/RPC 错误码
+_TRANSIENT_HRESULTS = frozenset([
+    -2147418111,  # RPC_E_CALL_REJECTED：Office 正忙，拒绝调用
+    -2147417846,  # RPC_E_SERVERCALL_RETRYLATER：Office 要求稍后重试
+    -2147417848,  # RPC_E_DISCONNECTED：Office 进程已断开
+    -2147023174,  # RPC_S_SERVER_UNAVAILABLE：RPC 服务器不可用（Office 进程已退出）
+    -2147023170,  # RPC_S_CALL_FAILED：远程过程调用失败
+    -2146959355,  # CO_E_SERVER_EXEC_FAILURE：Office 启动失败
+])
+_DISP_E_EXCEPTION = -2147352567  # Office 内部错误，具体原因见错误描述
+
+# Office 错误描述中表示文件本身有问题的关键词
+_PERMANENT_MESSAGES = (
+    'corrupt', 'damaged', 'not a valid', 'file format', 'password', 'unreadable content',
+    '损坏', '无法读取', '格式', '密码', '不可读',
+)
+# 表示文件被占用的关键词（优先于上面的关键词判断）
+_LOCKED_MESSAGES = ('locked', 'in use', 'being used', '锁定', '正在使用', '已打开')
+
+# 表示文件被占用或暂时不可用的系统错误
+_TRANSIENT_WINERRORS = frozenset([32, 33])  # ERROR_SHARING_VIOLATION、ERROR_LOCK_VIOLATION
+_TRANSIENT_ERRNOS = frozenset([errno.EACCES, errno.EBUSY, errno.EAGAIN, errno.ETIMEDOUT])
+
+_PERMANENT_TYPES = (
+    ComBudgetExceeded, zipfile.BadZipFile, UnicodeError, ValueError, KeyError,
+    NotImplementedError, FileNotFoundError, IsADirectoryError,
+)
+
+
+def classify(error):
+    """
+    判断错误是暂时性的还是永久性的
+
+    无法判断的错误按暂时性处理（有限次重试）。
+
+    Returns:
+        str: TRANSIENT 或 PERMANENT
+    """
+    if isinstance(error, _PERMANENT_TYPES):
+        return PERMANENT
+    if isinstance(error, OSError):
+        if getattr(error, 'winerror', None) in _TRANSIENT_WINERRORS or error.errno in _TRANSIENT_ERRNOS:
+            return TRANSIENT
+        return TRANSIENT if isinstance(error, (PermissionError, TimeoutError, BlockingIOError)) else PERMANENT
+    hresult = _hresult(error)
+    if hresult is None:
+        return TRANSIENT
+    if hresult in _TRANSIENT_HRESULTS:
+        return TRANSIENT
+    if hresult == _DISP_E_EXCEPTION:
+        message = str(error).lower()
+        if any(word in message for word in _LOCKED_MESSAGES):
+            return TRANSIENT
+        if any(word in message for word in _PERMANENT_MESSAGES):
+            return PERMANENT
+    return TRANSIENT
+
+
+def _hresult(error):
+    """COM 错误（pywintypes.com_error）的错误码，其他异常返回 None"""
+    if type(error).__name__ != 'com_error':
+        return None
+    hresult = getattr(error, 'hresult', None)
+    if hresult is None and error.args and isinstance(error.args[0], int):
+        hresult = error.args[0]
+    return hresult
+
+
+class RetryPolicy(object):
+    """
+    有限次重试，指数退避加随机抖动
+
+    第 n 次重试前等待 [0, min(max_delay, base_delay * 2^n)] 之间的随机时间，
+    多个进程同时遇到 Office 忙时不会在同一时刻一起重试。
+
+    Args:
+        max_retries: 暂时性错误的最大重试次数
+        base_delay: 退避的基础时长（秒）
+        max_delay: 单次等待的上限（秒）
+    """
+
+    def __init__(self, max_retries=3, base_delay=1.0, max_delay=30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """第 attempt 次重试（从 0 开始）前的等待时间"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker(object):
+    """
+    引擎熔断器
+
+    Args:
+        name: 引擎名称
+        threshold: 连续出现多少次暂时性错误后熔断，0 表示不熔断
+    """
+
+    def __init__(self, name, threshold=5):
+        self.name = name
+        self.threshold = threshold
+        self.failures = 0
+
+    @property
+    def is_open(self):
+        return bool(self.threshold) and self.failures >= self.threshold
+
+    def record_failure(self):
+        was_open = self.is_open
+        self.failures += 1
+        if self.is_open and not was_open:
+            logging.error(f"引擎 {self.name} 连续 {self.failures} 次出错，暂停重试，直到再次成功处理文件")
+
+    def record_success(self):
+        if self.is_open:
+            logging.info(f"引擎 {self.name} 已恢复，重新启用重试")
+        self.failures = 0
+
+
+_breakers = {}
+
+
+def breaker_for(name, threshold=5):
+    """引擎的熔断器（同一进程内共享），阈值取最近一次调用时传入的值"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name, threshold)
+    else:
+        breaker.threshold = threshold
+    return breaker
+
+
+def call_with_retry(func, engine, policy, breaker_threshold=5, sleep=time.sleep):
+    """
+    调用 func，出现暂时性错误时按策略重试
+
+    Args:
+        func: 无参数的函数，失败时抛出异常
+        engine: 引擎名称（熔断器按引擎区分）
+        policy: RetryPolicy
+        breaker_threshold: 熔断阈值，0 表示不熔断
+        sleep: 等待函数
+
+    Returns:
+        func 的返回值
+
+    Raises:
+        永久性错误、重试次数用尽或引擎已熔断时抛出最后一次的异常
+    """
+    breaker = breaker_for(engine, breaker_threshold)
+    attempt = 0
+    while True:
+        try:
+            result = func()
+        except Exception as e:
+            kind = classify(e)
+            if kind == TRANSIENT:
+                breaker.record_failure()
+            if kind == PERMANENT:
+                logging.error(f"{engine} 处理失败（永久性错误，不再重试）: {str(e)}")
+                raise
+            if attempt >= policy.max_retries:
+                logging.error(f"{engine} 处理失败，已重试 {attempt} 次: {str(e)}")
+                raise
+            if breaker.is_open:
+                raise
+            wait = policy.delay(attempt)
+            attempt += 1
+            logging.warning(f"{engine} 处理出错（暂时性错误），{wait:.1f} 秒后重试 ({attempt}/{policy.max_retries}): {str(e)}")
+            sleep(wait)
+        else:
+            breaker.record_success()
+            return result
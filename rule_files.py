@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+规则文件
+大量替换规则（如数万条更名对照表）可以放在 CSV/TSV/JSON 文件中，由 config.py 中的 RULE_FILES 引用，
+与 REPLACE_RULES 中的规则合并（REPLACE_RULES 在前，规则文件按列出的顺序在后）。
+
+- CSV/TSV：每行两列，旧文本和新文本，其余列忽略；第一行是 "旧文本,新文本"、"old,new" 等表头时跳过
+- JSON：对象 {"旧文本": "新文本"}，或 [["旧文本", "新文本"], ...] 形式的列表
+
+文件按 UTF-8（可带 BOM）读取，不是 UTF-8 时按 GBK 读取（兼容 Excel 导出的 CSV）。
+同一旧文本出现多次且新文本相同时只保留一条并给出警告；新文本不同（冲突）时报告所有冲突的位置并拒绝加载。
+
+编译好的匹配器保存到缓存文件中，缓存以规则文件内容的哈希为键，规则文件未变化时直接加载，
+不再解析文件和构建自动机。缓存使用 pickle 格式，只应保存在可信的位置。
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import pickle
+import hashlib
+import logging
+
+import rule_matcher
+
+CACHE_VERSION = 2
+_CACHE_SUFFIX = '.cache'
+_HEADER_NAMES = frozenset(['旧文本', '原文本', '查找', '查找内容', 'old', 'find', 'from', 'source', 'key'])
+_MAX_REPORTED = 10  # 错误信息中最多列出的冲突数
+
+
+def _read_text(path):
+    """读取规则文件的文本，UTF-8 解码失败时按 GBK 解码"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('gbk')
+
+
+def _read_table(path, delimiter):
+    """
+    读取 CSV/TSV 规则文件
+
+    Yields:
+        tuple: (行号, 旧文本, 新文本)
+    """
+    reader = csv.reader(io.StringIO(_read_text(path), newline=''), delimiter=delimiter)
+    for row in reader:
+        line = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        if line == 1 and row[0].strip().lower() in _HEADER_NAMES:
+            continue
+        if len(row) < 2:
+            raise ValueError(f"{path} 第 {line} 行缺少新文本（每行应为 旧文本{delimiter}新文本）")
+        yield line, row[0], row[1]
+
+
+def _read_json(path):
+    """
+    读取 JSON 规则文件
+
+    Yields:
+        tuple: (位置, 旧文本, 新文本)，对象按键的顺序、列表按下标编号
+    """
+    # object_pairs_hook 把对象转换为 (键, 值) 元组的列表，保留重复的键；顶层为数字、文本等时不是列表
+    data = json.loads(_read_text(path), object_pairs_hook=list)
+    if isinstance(data, list) and all(
+        isinstance(item, tuple) or (isinstance(item, list) and len(item) == 2) for item in data
+    ):
+        pairs = data
+    else:
+        raise ValueError(f"{path} 的格式应为 {{\"旧文本\": \"新文本\"}} 或 [[\"旧文本\", \"新文本\"], ...]")
+    for position, (old, new) in enumerate(pairs, 1):
+        if not isinstance(old, str) or not isinstance(new, str):
+            raise ValueError(f"{path} 第 {position} 条规则不是文本: {old!r} -> {new!r}")
+        yield position, old, new
+
+
+def read_rule_file(path):
+    """
+    按扩展名读取规则文件（.json 为 JSON，.tsv/.txt 为制表符分隔，其余按 CSV）
+
+    Yields:
+        tuple: (行号或序号, 旧文本, 新文本)
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        return _read_json(path)
+    return _read_table(path, '\t' if ext in ('.tsv', '.txt') else ',')
+
+
+def load_rules(inline_rules, paths):
+    """
+    合并 REPLACE_RULES 与规则文件中的规则，检查重复和冲突
+
+    Args:
+        inline_rules: config.py 中的 REPLACE_RULES
+        paths: 规则文件路径列表
+
+    Returns:
+        dict: 合并后的替换规则 {旧文本: 新文本}
+
+    Raises:
+        ValueError: 规则文件格式错误，或同一旧文本对应了不同的新文本
+    """
+    rules = dict(inline_rules)
+    origins = {old: 'REPLACE_RULES' for old in rules}
+    duplicates = 0
+    conflicts = []
+    for path in paths:
+        for position, old, new in read_rule_file(path):
+            origin = f"{os.path.basename(path)}:{position}"
+            if not old:
+                logging.warning(f"忽略旧文本为空的规则: {origin}")
+                continue
+            if old not in rules:
+                rules[old] = new
+                origins[old] = origin
+            elif rules[old] == new:
+                duplicates += 1
+                logging.debug(f"重复的规则 '{old}': {origins[old]}, {origin}")
+            else:
+                conflicts.append(f"'{old}': {origins[old]} -> '{rules[old]}', {origin} -> '{new}'")
+    if conflicts:
+        shown = '\n  '.join(conflicts[:_MAX_REPORTED])
+        more = f"\n  ……另有 {len(conflicts) - _MAX_REPORTED} 处" if len(conflicts) > _MAX_REPORTED else ''
+        raise ValueError(f"替换规则冲突（同一旧文本对应不同的新文本）共 {len(conflicts)} 处:\n  {shown}{more}")
+    if duplicates:
+        logging.warning(f"规则文件中有 {duplicates} 条重复的规则（新文本相同），已合并")
+    return rules
+
+
+def cache_path_for(paths):
+    """匹配器缓存默认保存在第一个规则文件旁边，如 rules.csv -> rules.csv.cache"""
+    return paths[0] + _CACHE_SUFFIX
+
+
+def rules_key(inline_rules, paths):
+    """缓存键：REPLACE_RULES、各规则文件的内容、缓存格式版本和 Python 版本的哈希"""
+    digest = hashlib.sha256()
+    digest.update(f"{CACHE_VERSION}|{pickle.HIGHEST_PROTOCOL}|{sys.version_info[:2]}\n".encode('utf-8'))
+    digest.update(json.dumps(list(inline_rules.items()), ensure_ascii=False).encode('utf-8'))
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(b'\0' + os.path.splitext(path)[1].lower().encode('utf-8') + b'\0')
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def _load_cache(cache_path, key):
+    """读取缓存的匹配器，缓存不存在、键不一致或已损坏时返回 None"""
+    try:
+        with open(cache_path, 'rb') as f:
+            if f.readline().rstrip(b'\n') != key.encode('ascii'):
+                return None
+            matcher = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"规则缓存无法读取，重新编译: {cache_path}, {str(e)}")
+        return None
+    return matcher if isinstance(matcher, rule_matcher.RuleMatcher) else None
+
+
+def _save_cache(cache_path, key, matcher):
+    """原子地写入匹配器缓存，写入失败（如规则文件位于只读共享）时只记录警告"""
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(key.encode('ascii') + b'\n')
+            pickle.dump(matcher, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logging.warning(f"无法写入规则缓存: {cache_path}, {str(e)}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def load_matcher(inline_rules, paths=(), cache_path=None):
+    """
+    加载替换规则并编译为匹配器
+
+    有规则文件时使用缓存：规则未变化时直接加载缓存的匹配器，否则读取规则文件、编译并更新缓存。
+
+    Args:
+        inline_rules: config.py 中的 REPLACE_RULES
+        paths: 规则文件路径列表
+        cache_path: 匹配器缓存文件路径，默认为 cache_path_for(paths)
+
+    Returns:
+        RuleMatcher: 编译后的匹配器，matcher.rules 为合并后的规则
+
+    Raises:
+        OSError: 规则文件无法读取
+        ValueError: 规则文件格式错误或规则冲突
+    """
+    paths = list(paths)
+    if not paths:
+        return rule_matcher.compile_rules(inline_rules)
+    cache_path = cache_path or cache_path_for(paths)
+    key = rules_key(inline_rules, paths)
+    matcher = _load_cache(cache_path, key)
+    if matcher is not None:
+        logging.info(f"从缓存加载替换规则 {len(matcher.rules)} 条: {cache_path}")
+        return matcher
+    matcher = rule_matcher.RuleMatcher(load_rules(inline_rules, paths))
+    logging.info(f"已编译替换规则 {len(matcher.rules)} 条，保存缓存: {cache_path}")
+    _save_cache(cache_path, key, matcher)
+    return matcher
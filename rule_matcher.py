@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+r"""
+多模式匹配器
+将 REPLACE_RULES 中的普通文本规则编译为 Aho-Corasick 自动机，正则表达式规则合并为一个
+多分支正则，一次扫描即可找到可能出现匹配的位置。匹配采用"最左最长"语义（起点相同时取最长的匹配，
+长度也相同时取配置中靠前的规则），替换结果不会被后续规则再次替换（不产生链式替换）。
+
+正则规则：只有以 "re:" 开头的规则按正则表达式处理，其余规则（包括含反斜杠、点号、括号的
+规则，如 Windows 路径 D:\Work\2019）一律按普通文本匹配。
+新文本中可以使用 \1、\g<name> 引用分组。
+"""
+
+import re
+import logging
+
+# 占位符使用 Unicode 私有区字符，正常文档中不会出现
+# U+E000/U+E001 为占位符首尾标记，其余私有区字符用于编码序号
+_PLACEHOLDER_OPEN = '\ue000'
+_PLACEHOLDER_CLOSE = '\ue001'
+_PLACEHOLDER_DIGIT_BASE = 0xE002
+_PLACEHOLDER_DIGITS = 0xF8FF - _PLACEHOLDER_DIGIT_BASE + 1
+
+_matcher_cache = {}
+
+REGEX_PREFIX = 're:'
+# 替换文本中的分组引用
+_GROUP_REF_RE = re.compile(r'\\(?:\d|g<)')
+
+
+def regex_source(rule):
+    """
+    返回正则规则的表达式，普通文本规则返回 None
+
+    只有以 "re:" 开头的规则是正则规则（表达式无效时抛出 re.error），其余规则都按普通文本处理。
+    """
+    if rule.startswith(REGEX_PREFIX):
+        source = rule[len(REGEX_PREFIX):]
+        re.compile(source)
+        return source
+    return None
+
+
+class RuleMatcher(object):
+    """
+    由替换规则编译得到的多模式匹配器
+
+    Args:
+        rules: 替换规则字典 {旧文本: 新文本}，空字符串规则被忽略
+    """
+
+    def __init__(self, rules):
+        self.rules = dict(rules)
+        self.patterns = [old for old in self.rules if old]
+        self.replacements = [self.rules[old] for old in self.patterns]
+        self._literals = []  # (规则下标, 旧文本)
+        self._regexes = {}  # 规则下标 -> 编译后的正则
+        self._expand = set()  # 新文本中引用了分组的正则规则下标
+        for index, pattern in enumerate(self.patterns):
+            source = regex_source(pattern)
+            if source is None:
+                self._literals.append((index, pattern))
+                continue
+            self._regexes[index] = re.compile(source)
+            logging.info(f"按正则表达式处理规则: '{pattern}' -> '{self.replacements[index]}'")
+            if _GROUP_REF_RE.search(self.replacements[index]):
+                self._expand.add(index)
+        self.regex_rules = frozenset(self.patterns[index] for index in self._regexes)
+        self._build()
+        self._build_regex()
+
+    def _build(self):
+        """构建普通文本规则的 Aho-Corasick 自动机"""
+        goto = [{}]  # 状态转移表
+        output = [-1]  # 以该状态结尾的最长模式的规则下标
+        depth = [0]
+        for index, pattern in self._literals:
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append(-1)
+                    depth.append(depth[state] + 1)
+                state = next_state
+            output[state] = index
+
+        # 按广度优先顺序计算失败链接与输出链接
+        fail = [0] * len(goto)
+        dict_link = [-1] * len(goto)  # 失败链上最近的带输出状态
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                target = goto[fallback].get(char, 0)
+                fail[next_state] = target if target != next_state else 0
+                link = fail[next_state]
+                dict_link[next_state] = link if output[link] >= 0 else dict_link[link]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+        self._dict_link = dict_link
+        self._depth = depth
+        # 自动机处于初始状态时，可直接跳到下一个可能开始匹配的字符
+        first_chars = ''.join(goto[0])
+        self._first_char_re = re.compile('[%s]' % re.escape(first_chars)) if first_chars else None
+
+    def _build_regex(self):
+        """
+        把所有正则规则合并为一个多分支正则，用于快速定位任一规则可能匹配的起点
+
+        多分支正则在同一起点只会选出第一个匹配的分支，因此它只负责定位，
+        起点处实际采用哪条规则由 _longest_at 逐条比较决定。
+
+        表达式内部引用了分组（\\1、(?P=name)）或合并后无法编译（如分组重名、局部标志位）时，
+        改为逐条规则查找。
+        """
+        self._combined = None
+        if not self._regexes:
+            return
+        if any(re.search(r'\\[1-9]|\(\?P=', regex.pattern) for regex in self._regexes.values()):
+            return
+        try:
+            self._combined = re.compile('|'.join(f'(?:{regex.pattern})' for regex in self._regexes.values()))
+        except re.error:
+            self._combined = None
+
+    def _candidates(self, text, stop_at_first=False):
+        """扫描文本，返回 {起点: (长度, 规则下标)}，每个起点只保留最长的普通文本匹配"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        dict_link = self._dict_link
+        depth = self._depth
+        first_char_re = self._first_char_re
+        best = {}
+        if first_char_re is None:
+            return best
+
+        state = 0
+        i = 0
+        length = len(text)
+        while i < length:
+            if state == 0:
+                match = first_char_re.search(text, i)
+                if match is None:
+                    break
+                i = match.start()
+            char = text[i]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            i += 1
+            if state == 0:
+                continue
+
+            hit = state if output[state] >= 0 else dict_link[state]
+            while hit > 0:
+                size = depth[hit]
+                start = i - size
+                previous = best.get(start)
+                if previous is None or previous[0] < size:
+                    best[start] = (size, output[hit])
+                if stop_at_first:
+                    return best
+                hit = dict_link[hit]
+        return best
+
+    def _regex_search(self, text, pos, cache=None):
+        """
+        查找 pos 之后最靠前的非空正则匹配，起点相同时取最长的，长度也相同时取靠前的规则
+
+        可以匹配空串的规则（如 a*）不会遮住同一位置上其他规则的非空匹配。
+
+        Args:
+            cache: 逐条规则查找时缓存各规则下一个非空匹配的字典，同一文本依次增大 pos 调用时复用
+
+        Returns:
+            tuple: (start, end, 规则下标, 匹配对象)，没有匹配时返回 None
+        """
+        if cache is None:
+            cache = {}
+        length = len(text)
+        if self._combined is not None:
+            while pos <= length:
+                match = self._combined.search(text, pos)
+                if match is None:
+                    return None
+                best = self._longest_at(text, match.start(), cache)
+                if best is not None:
+                    return best
+                pos = match.start() + 1
+            return None
+
+        best = None
+        for index, regex in self._regexes.items():
+            hit = cache.get(index, False)
+            if hit is False or (hit is not None and hit[0] < pos):
+                hit = cache[index] = _first_nonempty(regex, text, pos, index)
+            if hit is not None and (best is None or hit[0] < best[0] or (hit[0] == best[0] and hit[1] > best[1])):
+                best = hit
+        return best
+
+    def _longest_at(self, text, start, cache):
+        """
+        起点为 start 的最长非空正则匹配，没有时返回 None
+
+        各规则只在 start 处锚定匹配，不向后查找，每个候选起点的开销与文本长度无关。
+
+        Args:
+            cache: 同 _regex_search，缓存起点处只能得到空匹配的规则的下一个非空匹配
+        """
+        best = None
+        for index, regex in self._regexes.items():
+            match = regex.match(text, start)
+            if match is None:
+                continue
+            if match.end() == start:
+                # 起点处先得到空匹配（如 a*）：取该规则 start 之后的第一个非空匹配，起点不是 start 时说明这里没有
+                hit = cache.get(index, False)
+                if hit is False or (hit is not None and hit[0] < start):
+                    hit = cache[index] = _first_nonempty(regex, text, start, index)
+                if hit is None or hit[0] != start:
+                    continue
+                match = hit[3]
+            if best is None or match.end() > best[1]:
+                best = (start, match.end(), index, match)
+        return best
+
+    def _iter_matches(self, text):
+        """按最左最长语义产出互不重叠的匹配 (start, end, 规则下标, 正则匹配对象或 None)"""
+        best = self._candidates(text)
+        starts = sorted(best)
+        if not self._regexes:
+            pos = 0
+            for start in starts:
+                if start < pos:
+                    continue
+                size, index = best[start]
+                yield start, start + size, index, None
+                pos = start + size
+            return
+
+        # 合并普通文本匹配与正则匹配：起点靠前的优先，起点相同时取较长的，长度也相同时取靠前的规则
+        pos = 0
+        k = 0
+        regex_cache = {}
+        regex_hit = self._regex_search(text, 0, regex_cache)
+        while True:
+            while k < len(starts) and starts[k] < pos:
+                k += 1
+            if regex_hit is not None and regex_hit[0] < pos:
+                regex_hit = self._regex_search(text, pos, regex_cache)
+            literal_hit = None
+            if k < len(starts):
+                size, index = best[starts[k]]
+                literal_hit = (starts[k], starts[k] + size, index, None)
+            if literal_hit is None and regex_hit is None:
+                return
+            if regex_hit is None:
+                hit = literal_hit
+            elif literal_hit is None:
+                hit = regex_hit
+            else:
+                literal_key = (literal_hit[0], literal_hit[0] - literal_hit[1], literal_hit[2])
+                regex_key = (regex_hit[0], regex_hit[0] - regex_hit[1], regex_hit[2])
+                hit = literal_hit if literal_key < regex_key else regex_hit
+            yield hit
+            pos = hit[1]
+
+    def _replacement(self, text, index, regex_match):
+        """计算匹配的新文本，正则规则展开其中的分组引用"""
+        if index not in self._expand:
+            return self.replacements[index]
+        regex = self._regexes[index]
+        if regex_match.re is not regex:
+            # 合并正则中的分组编号与原表达式不同，用原表达式在同一位置重新匹配
+            regex_match = regex.match(text, regex_match.start()) or regex_match
+        try:
+            return regex_match.expand(self.replacements[index])
+        except (re.error, IndexError):
+            return self.replacements[index]
+
+    def _iter_all(self, text, separator=None, with_replacement=False):
+        """
+        产出所有匹配 (start, end, 规则下标, 新文本或 None)
+
+        separator 不为空且存在正则规则时，按分隔符（如 Word 的段落标记 \r）把文本切成段分别匹配，
+        使 ^、$、\b 等在段落边界上的行为与原生引擎逐段落处理时一致。
+        """
+        segments = text.split(separator) if separator and self._regexes else [text]
+        offset = 0
+        for segment in segments:
+            for start, end, index, regex_match in self._iter_matches(segment):
+                replacement = None
+                if with_replacement:
+                    replacement = self._replacement(segment, index, regex_match)
+                yield offset + start, offset + end, index, replacement
+            offset += len(segment) + len(separator or '')
+
+    def finditer(self, text):
+        """
+        按最左最长语义查找互不重叠的匹配
+
+        Yields:
+            tuple: (start, end, 规则下标)
+        """
+        for start, end, index, _ in self._iter_matches(text):
+            yield start, end, index
+
+    def match_all(self, text, separator=None):
+        """
+        查找所有匹配
+
+        Returns:
+            tuple: ([(start, end, replacement)], {规则: 匹配次数})
+        """
+        matches = []
+        counts = {}
+        for start, end, index, replacement in self._iter_all(text, separator, with_replacement=True):
+            matches.append((start, end, replacement))
+            pattern = self.patterns[index]
+            counts[pattern] = counts.get(pattern, 0) + 1
+        return matches, counts
+
+    def count(self, text, separator=None):
+        """统计文本中每条规则的匹配次数，返回 {规则: 匹配次数}"""
+        counts = {}
+        for _, _, index, _ in self._iter_all(text, separator):
+            pattern = self.patterns[index]
+            counts[pattern] = counts.get(pattern, 0) + 1
+        return counts
+
+    def search(self, text):
+        """判断文本中是否存在任意规则的匹配"""
+        if self._candidates(text, stop_at_first=True):
+            return True
+        return bool(self._regexes) and self._regex_search(text, 0) is not None
+
+    def replace(self, text, separator=None):
+        """
+        对文本执行一次性替换
+
+        Returns:
+            tuple: (替换后的文本, {规则: 替换次数})
+        """
+        matches, counts = self.match_all(text, separator)
+        if not matches:
+            return text, counts
+        parts = []
+        pos = 0
+        for start, end, replacement in matches:
+            parts.append(text[pos:start])
+            parts.append(replacement)
+            pos = end
+        parts.append(text[pos:])
+        return ''.join(parts), counts
+
+    def replacement_steps(self, active_rules=None, text=None, separator=None):
+        """
+        将规则转换为适合逐条执行查找替换（Word/Excel COM）的步骤序列
+
+        普通文本规则直接作为查找文本；正则规则需要提供 text，
+        按其在 text 中的实际匹配转换为"匹配文本 -> 展开后的新文本"的普通文本步骤。
+        长的查找文本优先执行；若某个新文本包含其他步骤的查找文本，
+        先把查找文本替换为占位符，再把占位符替换为新文本，避免链式替换。
+
+        Args:
+            active_rules: 需要执行的规则（旧文本）集合，默认全部规则
+            text: 将要执行替换的文本，用于展开正则规则
+            separator: 分段匹配的分隔符，与 count/replace 的参数一致
+
+        Returns:
+            list: [(查找文本, 替换文本, 计数所属规则或 None)]
+        """
+        pairs = []
+        seen = set()
+        active_regexes = set()
+        for index, pattern in enumerate(self.patterns):
+            if active_rules is not None and pattern not in active_rules:
+                continue
+            if index in self._regexes:
+                active_regexes.add(index)
+                continue
+            pairs.append((pattern, self.replacements[index], pattern))
+            seen.add(pattern)
+        if active_regexes and text is not None:
+            for start, end, index, replacement in self._iter_all(text, separator, with_replacement=True):
+                found = text[start:end]
+                if index in active_regexes and found not in seen:
+                    seen.add(found)
+                    pairs.append((found, replacement, self.patterns[index]))
+
+        pairs.sort(key=lambda pair: len(pair[0]), reverse=True)
+        chained = any(
+            other[0] in pair[1]
+            for pair in pairs for other in pairs
+        )
+        if not chained:
+            return pairs
+
+        steps = []
+        finals = []
+        for index, (find_text, replace_text, rule) in enumerate(pairs):
+            placeholder = _placeholder(index)
+            steps.append((find_text, placeholder, rule))
+            finals.append((placeholder, replace_text, None))
+        return steps + finals
+
+
+def _first_nonempty(regex, text, pos, index):
+    """正则在 pos 之后的第一个非空匹配 (start, end, 规则下标, 匹配对象)，没有时返回 None"""
+    for match in regex.finditer(text, pos):
+        if match.end() > match.start():
+            return match.start(), match.end(), index, match
+    return None
+
+
+def _placeholder(index):
+    """生成第 index 条规则的占位符"""
+    digits = []
+    while True:
+        index, digit = divmod(index, _PLACEHOLDER_DIGITS)
+        digits.append(chr(_PLACEHOLDER_DIGIT_BASE + digit))
+        if not index:
+            break
+    return _PLACEHOLDER_OPEN + ''.join(digits) + _PLACEHOLDER_CLOSE
+
+
+def compile_rules(rules):
+    """
+    编译替换规则，相同的规则只编译一次
+
+    Args:
+        rules: 替换规则字典或已编译的 RuleMatcher
+
+    Returns:
+        RuleMatcher: 编译后的匹配器
+    """
+    if isinstance(rules, RuleMatcher):
+        return rules
+    key = tuple(rules.items())
+    matcher = _matcher_cache.get(key)
+    if matcher is None:
+        matcher = RuleMatcher(rules)
+        _matcher_cache[key] = matcher
+    return matcher
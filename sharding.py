@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+多机分片处理
+同一个源文件夹由多台机器（或同一台机器上的多个进程）共同处理，输出到同一个输出文件夹，有两种分工方式：
+
+1. 哈希分片（--shard i/N）：按文件相对路径的哈希值固定分配，各节点之间不需要通信，
+   同一个文件每次都分给同一个分片，适合节点数固定、文件大小相近的情况。
+2. 租约（--lease-dir 目录）：各节点在共享目录中为文件创建租约文件来认领文件，先到先得，
+   处理快的节点自然多处理；节点崩溃后租约过期，其他节点重新认领。
+   已完成的文件留下完成标记，同一个租约目录就代表一次运行，节点重启后继续处理未完成的文件。
+
+每个节点结束时写出自己的汇总，--merge-summaries 把各节点的汇总合并为一份报告。
+租约模式下节点的处理日志和汇总保存在租约目录中，以本机最小的空闲节点编号（主机名-序号）命名：
+节点重启后沿用同一编号，--resume 可以找到上次的日志；新的一次运行使用新的租约目录，不会与旧的汇总混在一起。
+租约文件只依赖文件系统的独占创建和重命名，可以放在 SMB/NFS 共享上；
+租约是否过期按租约文件的修改时间判断，各节点与共享存储的时钟偏差应远小于租约时长。
+"""
+
+import os
+import glob
+import json
+import time
+import socket
+import hashlib
+import logging
+import threading
+
+LEASE_SECONDS = 300  # 租约时长：持有租约的节点超过该时间没有续约，其他节点可以重新认领
+_LEASE_SUFFIX = '.lease'
+_DONE_SUFFIX = '.done'
+_NODE_KEY = '\0node\0'  # 节点编号的租约键前缀，不会与文件路径冲突
+
+
+def parse_shard(text):
+    """
+    解析分片参数
+
+    Args:
+        text: 形如 "i/N" 的字符串，0 <= i < N
+
+    Returns:
+        tuple: (分片序号, 分片总数)
+
+    Raises:
+        ValueError: 格式不正确或序号超出范围
+    """
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f"分片参数格式应为 i/N，如 0/4: {text}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"分片序号应满足 0 <= i < N: {text}")
+    return index, count
+
+
+def _file_key(filename):
+    """文件的分片键：统一使用 / 分隔的相对路径，不同操作系统上的节点得到相同的结果"""
+    return filename.replace(os.sep, '/').encode('utf-8')
+
+
+def shard_of(filename, count):
+    """文件所属的分片序号（只取决于相对路径，与节点和运行次数无关）"""
+    digest = hashlib.sha1(_file_key(filename)).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+
+def node_name():
+    """当前节点的名称：主机名加进程号，同一台机器上的多个进程互不相同"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseDir(object):
+    """
+    共享目录中的文件租约
+
+    每个文件对应 <哈希>.lease（正在处理）和 <哈希>.done（已完成）两个标记文件。
+    节点编号同样以租约的形式持有，节点崩溃后在租约过期前重启时使用下一个编号。
+    持有的租约由后台线程定期续约（更新修改时间），节点崩溃后停止续约，租约过期后可被重新认领。
+    两个节点同时重新认领同一个过期租约时，极少数情况下同一文件会被处理两次；
+    输出文件原子发布且内容相同，重复处理不影响结果。
+
+    Args:
+        path: 租约目录（所有节点共享）
+        owner: 节点名称，默认为 node_name()
+        ttl: 租约时长（秒）
+    """
+
+    def __init__(self, path, owner=None, ttl=LEASE_SECONDS):
+        self.path = path
+        self.owner = owner or node_name()
+        self.ttl = ttl
+        self.reclaimed = 0  # 从过期租约中重新认领的文件数
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        os.makedirs(path, exist_ok=True)
+        self._heartbeat = threading.Thread(target=self._renew_loop, name="lease-heartbeat", daemon=True)
+        self._heartbeat.start()
+        self.node = self._claim_node()
+
+    def _marker(self, filename, suffix):
+        return os.path.join(self.path, hashlib.sha1(_file_key(filename)).hexdigest() + suffix)
+
+    def claim(self, filename):
+        """
+        认领文件
+
+        Returns:
+            bool: 认领成功时返回 True；文件已完成或正由其他节点处理时返回 False
+        """
+        if os.path.exists(self._marker(filename, _DONE_SUFFIX)):
+            return False
+        return self._acquire(filename)
+
+    def _acquire(self, filename):
+        """创建租约，已存在且未过期时返回 False"""
+        lease_path = self._marker(filename, _LEASE_SUFFIX)
+        if self._create(lease_path, filename):
+            return self._hold(filename, lease_path)
+        # 租约已存在：未过期时由其他节点处理，过期时先把旧租约改名（只有一个节点能成功），再重新创建
+        try:
+            expired = time.time() - os.path.getmtime(lease_path) > self.ttl
+        except FileNotFoundError:
+            expired = True  # 持有者刚刚完成或释放
+        if not expired:
+            return False
+        stale_path = f"{lease_path}.{self.owner}.stale"
+        try:
+            os.rename(lease_path, stale_path)
+        except OSError:
+            pass  # 已被其他节点重新认领，或持有者刚刚释放
+        else:
+            if not filename.startswith(_NODE_KEY):
+                logging.warning(f"租约已过期，重新认领: {filename}")
+                self.reclaimed += 1
+            _remove(stale_path)
+        return self._create(lease_path, filename) and self._hold(filename, lease_path)
+
+    def _claim_node(self):
+        """认领本机最小的空闲节点编号"""
+        host = socket.gethostname()
+        slot = 0
+        while not self._acquire(f"{_NODE_KEY}{host}-{slot}"):
+            slot += 1
+        return f"{host}-{slot}"
+
+    def summary_path(self):
+        """本节点在这次运行中的汇总文件"""
+        return os.path.join(self.path, f"summary.{self.node}.json")
+
+    def journal_path(self):
+        """本节点在这次运行中的处理日志"""
+        return os.path.join(self.path, f"journal.{self.node}.jsonl")
+
+    def _create(self, lease_path, filename):
+        """独占创建租约文件，已存在时返回 False"""
+        try:
+            fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'file': filename, 'owner': self.owner, 'time': time.time()}, f, ensure_ascii=False)
+        return True
+
+    def _hold(self, filename, lease_path):
+        """
+        持有新创建的租约
+
+        检查完成标记后、创建租约前，其他节点可能恰好完成该文件并释放了租约；
+        完成标记先于释放写出，所以创建租约后再检查一次即可发现，此时放弃租约。
+        """
+        if os.path.exists(self._marker(filename, _DONE_SUFFIX)):
+            _remove(lease_path)
+            return False
+        with self._lock:
+            self._held.add(filename)
+        return True
+
+    def complete(self, filename, outcome):
+        """标记文件已完成并释放租约，之后任何节点都不再认领该文件"""
+        with open(self._marker(filename, _DONE_SUFFIX), 'w', encoding='utf-8') as f:
+            json.dump({'file': filename, 'owner': self.owner, 'outcome': outcome, 'time': time.time()},
+                      f, ensure_ascii=False)
+        self.release(filename)
+
+    def release(self, filename):
+        """释放租约（文件未完成，其他节点可以立即认领）"""
+        with self._lock:
+            self._held.discard(filename)
+        _remove(self._marker(filename, _LEASE_SUFFIX))
+
+    def _renew_loop(self):
+        while not self._stop.wait(self.ttl / 3):
+            with self._lock:
+                held = list(self._held)
+            for filename in held:
+                try:
+                    os.utime(self._marker(filename, _LEASE_SUFFIX))
+                except OSError as e:
+                    logging.warning(f"续约失败: {filename}, {str(e)}")
+
+    def close(self):
+        """停止续约并释放所有未完成文件的租约"""
+        self._stop.set()
+        self._heartbeat.join()
+        with self._lock:
+            held = list(self._held)
+        for filename in held:
+            self.release(filename)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def summary_path_for(output_folder, node):
+    """节点汇总文件保存在输出文件夹旁边，如 E:\\output -> E:\\output.summary.shard-0-of-4.json"""
+    return os.path.normpath(output_folder) + f'.summary.{node}.json'
+
+
+def merged_summary_path_for(output_folder):
+    """合并后的汇总文件，如 E:\\output -> E:\\output.summary.json"""
+    return os.path.normpath(output_folder) + '.summary.json'
+
+
+def write_summary(path, summary):
+    """原子地写入节点汇总"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, path)
+
+
+def merge_summaries(paths):
+    """
+    合并各节点的汇总
+
+    文件数、替换次数和各引擎的统计相加，总耗时取各节点的最大值（节点同时运行）。
+
+    Args:
+        paths: 节点汇总文件路径列表
+
+    Returns:
+        dict: 合并后的汇总，'nodes' 为参与合并的节点名称
+    """
+    merged = {'nodes': [], 'files': {}, 'replacements': 0, 'total_time': 0.0, 'backends': {}, 'failed': []}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            summary = json.load(f)
+        merged['nodes'].append(summary['node'])
+        for outcome, count in summary['files'].items():
+            merged['files'][outcome] = merged['files'].get(outcome, 0) + count
+        merged['replacements'] += summary['replacements']
+        merged['total_time'] = max(merged['total_time'], summary['total_time'])
+        for name, stats in summary['backends'].items():
+            total = merged['backends'].setdefault(name, {'documents': 0, 'seconds': 0.0, 'bytes': 0, 'failures': 0})
+            for field in total:
+                total[field] += stats[field]
+        merged['failed'].extend(summary['failed'])
+    return merged
+
+
+def find_summaries(output_folder, lease_dir=None):
+    """
+    查找各节点的汇总文件
+
+    Args:
+        output_folder: 输出文件夹，哈希分片的节点汇总保存在它旁边
+        lease_dir: 租约目录，指定时只查找这次租约运行中各节点的汇总
+    """
+    if lease_dir:
+        pattern = os.path.join(glob.escape(lease_dir), 'summary.*.json')
+    else:
+        pattern = glob.escape(os.path.normpath(output_folder)) + '.summary.shard-*.json'
+    return sorted(glob.glob(pattern))
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""测试用的最小 .docx/.xlsx 文档"""
+
+import zipfile
+from xml.sax.saxutils import escape
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+S_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="xml" ContentType="application/xml"/></Types>'
+)
+
+
+def paragraph_xml(*runs):
+    """一个段落的 XML，每个参数为一个文本块"""
+    return '<w:p>' + ''.join(f'<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r>' for text in runs) + '</w:p>'
+
+
+def write_docx(path, paragraphs, body_xml=None, parts=None):
+    """
+    写出正文为 paragraphs（每段一个文本块）的 .docx
+
+    Args:
+        body_xml: 直接指定 <w:body> 的内容，代替 paragraphs
+        parts: 其他部件 {部件名: <w:p> 等内容}，如页眉 word/header1.xml
+    """
+    if body_xml is None:
+        body_xml = ''.join(paragraph_xml(text) for text in paragraphs)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        package.writestr('word/document.xml', f'<w:document xmlns:w="{W_NS}"><w:body>{body_xml}</w:body></w:document>')
+        for name, xml in (parts or {}).items():
+            root = 'w:ftr' if 'footer' in name else 'w:hdr'
+            package.writestr(name, f'<{root} xmlns:w="{W_NS}">{xml}</{root}>')
+
+
+def write_xlsx(path, shared_strings_xml, sheet_xml):
+    """写出只有一个工作表的 .xlsx，shared_strings_xml 为 <sst> 的内容，sheet_xml 为 <sheetData> 的内容"""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        package.writestr('xl/workbook.xml', f'<workbook xmlns="{S_NS}"><sheets/></workbook>')
+        package.writestr('xl/sharedStrings.xml', f'<sst xmlns="{S_NS}">{shared_strings_xml}</sst>')
+        package.writestr('xl/worksheets/sheet1.xml',
+                         f'<worksheet xmlns="{S_NS}"><sheetData>{sheet_xml}</sheetData></worksheet>')
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+
+import pytest
+
+import docx_formatted_replace as app
+import manifest
+from rule_matcher import RuleMatcher
+from fixtures import write_docx
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    source = tmp_path / 'source'
+    output = tmp_path / 'output'
+    source.mkdir()
+    rules = {'2019': '2023'}
+    monkeypatch.setattr(app, 'SOURCE_FOLDER', str(source))
+    monkeypatch.setattr(app, 'OUTPUT_FOLDER', str(output))
+    monkeypatch.setattr(app, 'REPLACE_RULES', rules)
+    monkeypatch.setattr(app, 'RULE_MATCHER', RuleMatcher(rules))
+    monkeypatch.setattr(app, 'DOCUMENT_TIMEOUTS', {})
+    monkeypatch.setattr(app, 'SHOW_PROGRESS', False)
+    monkeypatch.setattr(app, 'METRICS_FILE', "")
+    monkeypatch.setattr(app, 'PROMETHEUS_FILE', "")
+    return source, output
+
+
+def test_publish_failure_is_unprocessed_and_not_cached(folders, monkeypatch):
+    source, output = folders
+    write_docx(str(source / 'a.docx'), ['2019年度报告'])
+    publish_file = app.publish_file
+
+    def fail_processed(temp_path, final_path):
+        # 只有处理结果（temp_*）无法发布，原文件的副本可以发布
+        return not os.path.basename(temp_path).startswith('temp_') and publish_file(temp_path, final_path)
+
+    monkeypatch.setattr(app, 'publish_file', fail_processed)
+
+    result = app.process_file('a.docx', app.tempfile.mkdtemp(dir=str(source.parent)))
+    assert result['outcome'] == "unprocessed"
+    assert result['source_hash'] is None
+
+    success, replacements = app.batch_process(workers=1, incremental=True)
+    assert (success, replacements) == (0, 0)
+    # 输出位置是原文件的副本
+    assert (output / 'a.docx').read_bytes() == (source / 'a.docx').read_bytes()
+    manifest_path = manifest.manifest_path_for(str(output))
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            assert 'a.docx' not in json.dumps(json.load(f), ensure_ascii=False)
+
+    # 下次增量运行仍然处理该文件，不显示为缓存
+    monkeypatch.setattr(app, 'publish_file', publish_file)
+    success, replacements = app.batch_process(workers=1, incremental=True)
+    assert (success, replacements) == (1, 1)
+
+
+def test_compression_threads_are_shared_between_workers(monkeypatch):
+    monkeypatch.setattr(app.os, 'cpu_count', lambda: 8)
+    monkeypatch.setattr(app, 'COMPRESSION_THREADS', 0)
+    assert [app.compression_threads(workers) for workers in (1, 2, 3, 16)] == [8, 4, 2, 1]
+    monkeypatch.setattr(app, 'COMPRESSION_THREADS', 3)
+    assert app.compression_threads(4) == 3
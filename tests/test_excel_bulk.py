@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import excel_bulk
+import rule_matcher
+
+MATCHER = rule_matcher.compile_rules({'2019年': '2020年'})
+
+
+@pytest.fixture(autouse=True, params=['numpy', 'python'])
+def implementation(request, monkeypatch):
+    """NumPy 实现和纯 Python 实现各测试一遍"""
+    if request.param == 'python':
+        monkeypatch.setattr(excel_bulk, 'np', None)
+    elif excel_bulk.np is None:
+        pytest.skip('未安装 NumPy')
+
+
+class FakeRange(object):
+    """记录写回的区域：Range(左上, 右下).Value = 二维元组"""
+
+    def __init__(self, sheet, top_left, bottom_right):
+        object.__setattr__(self, '_sheet', sheet)
+        object.__setattr__(self, '_address', (top_left, bottom_right))
+
+    def __setattr__(self, name, value):
+        assert name == 'Value'
+        self._sheet.writes.append((self._address, value))
+
+
+class FakeUsedRange(object):
+    def __init__(self, value, formula, row=1, column=1):
+        self.Value = value
+        self.Formula = formula
+        self.Row = row
+        self.Column = column
+
+
+class FakeSheet(object):
+    """只提供 replace_in_used_range 用到的 UsedRange、Cells 和 Range"""
+
+    def __init__(self, value, formula=None, row=1, column=1):
+        self.UsedRange = FakeUsedRange(value, formula if formula is not None else value, row, column)
+        self.writes = []
+
+    def Cells(self, row, column):
+        return (row, column)
+
+    def Range(self, top_left, bottom_right):
+        return FakeRange(self, top_left, bottom_right)
+
+
+def test_single_cell_scalar_value():
+    sheet = FakeSheet('2019年度报告', row=3, column=2)
+    counts, cells = excel_bulk.replace_in_used_range(sheet, MATCHER)
+    assert cells == 1
+    assert counts == {'2019年': 1}
+    assert sheet.writes == [(((3, 2), (3, 2)), (('2020年度报告',),))]
+
+
+def test_formula_cells_are_skipped():
+    value = (
+        ('2019年', '2019年合计'),
+        (2019, '2019年'),
+    )
+    formula = (
+        ('2019年', '="2019年"&"合计"'),
+        ('2019', '2019年'),
+    )
+    sheet = FakeSheet(value, formula)
+    counts, cells = excel_bulk.replace_in_used_range(sheet, MATCHER)
+    assert cells == 4
+    assert counts == {'2019年': 2}
+    written = {}
+    for ((r0, c0), (r1, c1)), block in sheet.writes:
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                written[(r, c)] = block[r - r0][c - c0]
+    assert written == {(1, 1): '2020年', (2, 2): '2020年'}
+
+
+def test_block_is_written_once():
+    value = tuple(tuple(f'2019年 {r}-{c}' for c in range(3)) for r in range(4))
+    sheet = FakeSheet(value, row=2, column=5)
+    counts, cells = excel_bulk.replace_in_used_range(sheet, MATCHER)
+    assert cells == 12
+    assert counts == {'2019年': 12}
+    assert len(sheet.writes) == 1
+    address, block = sheet.writes[0]
+    assert address == ((2, 5), (5, 7))
+    assert block == tuple(tuple(f'2020年 {r}-{c}' for c in range(3)) for r in range(4))
+
+
+def test_dry_run_does_not_write():
+    sheet = FakeSheet((('2019年',),))
+    counts, _ = excel_bulk.replace_in_used_range(sheet, MATCHER, dry_run=True)
+    assert counts == {'2019年': 1}
+    assert sheet.writes == []
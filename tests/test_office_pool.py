@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from fake_com import FakeDispatch
+from office_pool import OfficeAppPool
+
+WORD = 'Word.Application'
+EXCEL = 'Excel.Application'
+
+
+def test_instance_is_reused_and_recycled_after_n_documents():
+    fake = FakeDispatch()
+    pool = OfficeAppPool(fake, recycle_after=2)
+    first = pool.acquire(WORD)
+    pool.release(WORD)
+    assert pool.acquire(WORD) is first
+    pool.release(WORD)
+    assert fake.count('call', 'Quit()') == 1
+
+    second = pool.acquire(WORD)
+    assert second is not first
+    assert pool.stats == {'created': 2, 'recycled': 1, 'health_failures': 0}
+
+
+def test_unhealthy_release_recycles_immediately():
+    fake = FakeDispatch()
+    pool = OfficeAppPool(fake, recycle_after=50)
+    first = pool.acquire(WORD)
+    pool.release(WORD, healthy=False)
+    assert pool.acquire(WORD) is not first
+    assert pool.stats['recycled'] == 1
+
+
+def test_dead_instance_is_replaced_by_health_check():
+    fake = FakeDispatch()
+    teardowns = []
+    pool = OfficeAppPool(fake, recycle_after=0, teardown={WORD: teardowns.append})
+    first = pool.acquire(WORD)
+    pool.release(WORD)
+    fake.break_instance(first)
+
+    second = pool.acquire(WORD)
+    assert second is not first
+    assert len(fake.instances) == 2
+    assert pool.stats == {'created': 2, 'recycled': 1, 'health_failures': 1}
+    assert teardowns == [first]
+    # 失去响应的实例退出失败时不影响替换
+    assert fake.count('call', 'Quit()') == 0
+
+
+def test_setup_runs_once_per_instance_and_failure_discards_it():
+    fake = FakeDispatch()
+    created = []
+    pool = OfficeAppPool(fake, recycle_after=1, setup={WORD: created.append})
+    pool.acquire(WORD)
+    pool.acquire(WORD)
+    pool.release(WORD)
+    pool.acquire(WORD)
+    assert created == fake.instances
+
+    def failing_setup(app):
+        raise RuntimeError('setup failed')
+
+    failing = OfficeAppPool(FakeDispatch(), setup={EXCEL: failing_setup})
+    with pytest.raises(RuntimeError):
+        failing.acquire(EXCEL)
+    assert failing.stats['recycled'] == 1
+    failing.release(EXCEL)  # 实例已被丢弃，归还时不出错
+
+
+def test_close_all_quits_every_instance():
+    fake = FakeDispatch()
+    teardowns = []
+    pool = OfficeAppPool(fake, teardown={WORD: teardowns.append, EXCEL: teardowns.append})
+    word = pool.acquire(WORD)
+    excel = pool.acquire(EXCEL)
+    pool.close_all()
+    assert teardowns == [word, excel]
+    assert fake.count('call', 'Quit()') == 2
+
+    pool.close_all()  # 重复关闭不再调用 Quit
+    assert fake.count('call', 'Quit()') == 2
+    assert pool.acquire(WORD) is not word
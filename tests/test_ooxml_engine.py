@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import zipfile
+
+import ooxml_engine
+from fixtures import write_xlsx
+
+# 共享字符串 0、2 为空 <si/>，1 和 3 含 "2020"；单元格 A1 引用 1，A2、A3 引用 3，A4 引用 0
+SHARED_STRINGS = '<si/><si><t>2020年</t></si><si/><si><t>截至2020</t></si>'
+SHEET = (
+    '<row r="1"><c r="A1" t="s"><v>1</v></c></row>'
+    '<row r="2"><c r="A2" t="s"><v>3</v></c></row>'
+    '<row r="3"><c r="A3" t="s"><v>3</v></c></row>'
+    '<row r="4"><c r="A4" t="s"><v>0</v></c></row>'
+)
+
+
+def test_xlsx_counts_with_empty_shared_string(tmp_path):
+    src = str(tmp_path / 'a.xlsx')
+    dst = str(tmp_path / 'b.xlsx')
+    write_xlsx(src, SHARED_STRINGS, SHEET)
+    assert ooxml_engine.replace_in_xlsx(src, dst, {'2020': '2024'}) == {'2020': 3}
+    assert ooxml_engine.count_in_xlsx(src, {'2020': '2024'}) == {'2020': 3}
+    with zipfile.ZipFile(dst) as package:
+        sst = package.read('xl/sharedStrings.xml').decode('utf-8')
+    assert '<si/><si><t>2024年</t></si><si/><si><t>截至2024</t></si>' in sst
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import docx_formatted_replace as app
+import prefilter
+from rule_matcher import RuleMatcher
+from fixtures import paragraph_xml, write_docx, write_xlsx
+
+
+@pytest.fixture(params=['whole', 'stream'])
+def mode(request, monkeypatch):
+    """整体读取和按块流式检查（块很小，匹配会跨块）各测试一遍"""
+    if request.param == 'stream':
+        monkeypatch.setattr(prefilter, 'STREAM_THRESHOLD', 0)
+        monkeypatch.setattr(prefilter, 'STREAM_CHUNK_SIZE', 7)
+    return request.param
+
+
+def _docx(tmp_path, **kwargs):
+    path = str(tmp_path / 'a.docx')
+    write_docx(path, kwargs.pop('paragraphs', ['无关内容']), **kwargs)
+    return path
+
+
+def test_match_split_across_runs(tmp_path, mode):
+    path = _docx(tmp_path, body_xml=paragraph_xml('20', '19', '年度报告'))
+    assert prefilter.package_has_matches(path, {'2019年': '2020年'}) is True
+    assert prefilter.package_has_matches(path, {'2018年': '2020年'}) is False
+
+
+def test_match_only_after_unescape(tmp_path, mode):
+    path = _docx(tmp_path, paragraphs=['R&D <部门>'])
+    assert prefilter.package_has_matches(path, {'R&D': '研发'}) is True
+    assert prefilter.package_has_matches(path, {'<部门>': '部门'}) is True
+    assert prefilter.package_has_matches(path, {'amp': 'x'}) is False
+
+
+def test_regex_rules(tmp_path, mode):
+    path = _docx(tmp_path, paragraphs=['截至', '2019年度'])
+    assert prefilter.package_has_matches(path, RuleMatcher({'re:\\d{4}年度': 'x'})) is True
+    # ^ 只在段落开头匹配：拼接后的文本中 2019 不在开头，逐段检查才能发现
+    assert prefilter.package_has_matches(path, RuleMatcher({'re:^\\d{4}': 'x'})) is True
+    assert prefilter.package_has_matches(path, RuleMatcher({'re:^年度': 'x'})) is False
+
+
+@pytest.mark.parametrize('part', ['word/header1.xml', 'word/footer2.xml', 'word/footnotes.xml'])
+def test_match_outside_body(tmp_path, mode, part):
+    path = _docx(tmp_path, parts={part: paragraph_xml('2019', '年')})
+    assert prefilter.package_has_matches(path, {'2019年': '2020年'}) is True
+
+
+def test_match_in_shared_strings(tmp_path, mode):
+    path = str(tmp_path / 'a.xlsx')
+    write_xlsx(path, '<si><t>无关</t></si><si><r><t>20</t></r><r><t>19年</t></r></si>',
+               '<row r="1"><c r="A1" t="s"><v>1</v></c></row>')
+    assert prefilter.package_has_matches(path, {'2019年': '2020年'}) is True
+    assert prefilter.package_has_matches(path, {'2018年': '2020年'}) is False
+
+
+def test_unsupported_or_broken_package_is_undecided(tmp_path):
+    broken = tmp_path / 'broken.docx'
+    broken.write_bytes(b'not a zip')
+    assert prefilter.package_has_matches(str(broken), {'2019': '2020'}) is None
+    assert prefilter.package_has_matches(str(tmp_path / 'a.doc'), {'2019': '2020'}) is None
+
+
+def test_document_without_matches_is_passthrough(tmp_path, monkeypatch):
+    source = tmp_path / 'source'
+    output = tmp_path / 'output'
+    source.mkdir()
+    rules = {'2019年': '2020年'}
+    monkeypatch.setattr(app, 'SOURCE_FOLDER', str(source))
+    monkeypatch.setattr(app, 'OUTPUT_FOLDER', str(output))
+    monkeypatch.setattr(app, 'REPLACE_RULES', rules)
+    monkeypatch.setattr(app, 'RULE_MATCHER', RuleMatcher(rules))
+    monkeypatch.setattr(app, 'PREFILTER', True)
+    write_docx(str(source / 'plain.docx'), ['2018年度报告'])
+    write_docx(str(source / 'split.docx'), [], body_xml=paragraph_xml('20', '19年度报告'))
+
+    temp_dir = str(tmp_path / 'temp')
+    (tmp_path / 'temp').mkdir()
+    plain = app.process_file('plain.docx', temp_dir)
+    assert plain['outcome'] == "passthrough"
+    assert plain['replace_count'] == 0
+    assert (output / 'plain.docx').read_bytes() == (source / 'plain.docx').read_bytes()
+
+    split = app.process_file('split.docx', temp_dir)
+    assert split['outcome'] == "success"
+    assert split['replace_count'] == 1
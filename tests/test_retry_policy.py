@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import errno
+
+import pytest
+
+import retry_policy
+from retry_policy import PERMANENT, TRANSIENT, RetryPolicy, call_with_retry, classify
+
+
+class com_error(Exception):
+    """pywintypes.com_error 的替身：按类型名识别，args 为 (hresult, 描述, ...)"""
+
+    def __init__(self, hresult, message=''):
+        super().__init__(hresult, message)
+        self.hresult = hresult
+
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    monkeypatch.setattr(retry_policy, '_breakers', {})
+
+
+@pytest.fixture
+def max_delay(monkeypatch):
+    """随机抖动取上限，退避时长可以精确断言"""
+    monkeypatch.setattr(retry_policy.random, 'uniform', lambda low, high: high)
+
+
+def _failing(errors, result='ok'):
+    """依次抛出 errors 中的异常，用完后返回 result"""
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return func, calls
+
+
+@pytest.mark.parametrize('error, kind', [
+    (PermissionError(errno.EACCES, 'denied'), TRANSIENT),
+    (OSError(errno.EBUSY, 'busy'), TRANSIENT),
+    (TimeoutError(), TRANSIENT),
+    (FileNotFoundError(errno.ENOENT, 'missing'), PERMANENT),
+    (OSError(errno.ENOSPC, 'full'), PERMANENT),
+    (ValueError('bad'), PERMANENT),
+    (retry_policy.zipfile.BadZipFile(), PERMANENT),
+    (com_error(-2147418111), TRANSIENT),
+    (com_error(retry_policy._DISP_E_EXCEPTION, 'The file is corrupt'), PERMANENT),
+    (com_error(retry_policy._DISP_E_EXCEPTION, '文件已损坏，且文件已被锁定'), TRANSIENT),
+    (com_error(-2147024891), TRANSIENT),
+    (RuntimeError('unknown'), TRANSIENT),
+])
+def test_classify(error, kind):
+    assert classify(error) == kind
+
+
+def test_transient_errors_are_retried_with_backoff(max_delay):
+    func, calls = _failing([OSError(errno.EBUSY, 'busy')] * 3)
+    waits = []
+    policy = RetryPolicy(max_retries=3, base_delay=1.0, max_delay=3.0)
+    assert call_with_retry(func, 'word', policy, sleep=waits.append) == 'ok'
+    assert len(calls) == 4
+    assert waits == [1.0, 2.0, 3.0]
+
+
+def test_retries_are_limited(max_delay):
+    func, calls = _failing([OSError(errno.EBUSY, 'busy')] * 5)
+    waits = []
+    with pytest.raises(OSError):
+        call_with_retry(func, 'word', RetryPolicy(max_retries=2), breaker_threshold=0, sleep=waits.append)
+    assert len(calls) == 3
+    assert len(waits) == 2
+
+
+def test_permanent_error_is_not_retried():
+    func, calls = _failing([ValueError('bad')])
+    waits = []
+    with pytest.raises(ValueError):
+        call_with_retry(func, 'word', RetryPolicy(), sleep=waits.append)
+    assert len(calls) == 1
+    assert waits == []
+    assert retry_policy.breaker_for('word').failures == 0
+
+
+def test_breaker_opens_stops_retrying_and_resets():
+    busy = OSError(errno.EBUSY, 'busy')
+    policy = RetryPolicy(max_retries=1)
+    waits = []
+    func, _ = _failing([busy, busy])
+    with pytest.raises(OSError):
+        call_with_retry(func, 'excel', policy, breaker_threshold=2, sleep=waits.append)
+    breaker = retry_policy.breaker_for('excel', 2)
+    assert breaker.is_open
+
+    # 熔断后每个文件只尝试一次，不再等待重试
+    func, calls = _failing([busy])
+    with pytest.raises(OSError):
+        call_with_retry(func, 'excel', policy, breaker_threshold=2, sleep=waits.append)
+    assert len(calls) == 1
+    assert len(waits) == 1
+
+    # 再次成功后恢复重试
+    func, _ = _failing([])
+    call_with_retry(func, 'excel', policy, breaker_threshold=2, sleep=waits.append)
+    assert not breaker.is_open
+    func, calls = _failing([busy])
+    assert call_with_retry(func, 'excel', policy, breaker_threshold=2, sleep=waits.append) == 'ok'
+    assert len(calls) == 2
+
+
+def test_breaker_threshold_follows_latest_call():
+    busy = OSError(errno.EBUSY, 'busy')
+    func, _ = _failing([busy])
+    with pytest.raises(OSError):
+        call_with_retry(func, 'word', RetryPolicy(max_retries=0), breaker_threshold=5, sleep=lambda _: None)
+    assert not retry_policy.breaker_for('word', 5).is_open
+    assert retry_policy.breaker_for('word', 1).is_open
+    assert not retry_policy.breaker_for('word', 0).is_open
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import rule_files
+
+
+def _write(path, text, encoding='utf-8'):
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+
+@pytest.mark.parametrize('text', ['5', '"2019年"', 'null', 'true', '[["2019年"]]', '[{"2019年": "2020年"}]'])
+def test_json_with_wrong_shape_is_rejected(tmp_path, text):
+    path = _write(tmp_path / 'rules.json', text)
+    with pytest.raises(ValueError):
+        rule_files.load_rules({}, [path])
+
+
+def test_json_object_and_list(tmp_path):
+    obj = _write(tmp_path / 'object.json', '{"2019年": "2020年", "甲": "乙"}')
+    pairs = _write(tmp_path / 'pairs.json', '[["丙", "丁"]]')
+    assert rule_files.load_rules({}, [obj, pairs]) == {'2019年': '2020年', '甲': '乙', '丙': '丁'}
+
+
+def test_csv_header_gbk_and_conflicts(tmp_path):
+    csv_path = _write(tmp_path / 'rules.csv', '旧文本,新文本\r\n2019年,2020年\r\n甲,乙\r\n', 'gbk')
+    assert rule_files.load_rules({'甲': '乙'}, [csv_path]) == {'甲': '乙', '2019年': '2020年'}
+
+    tsv_path = _write(tmp_path / 'rules.tsv', '2019年\t2021年\n')
+    with pytest.raises(ValueError) as error:
+        rule_files.load_rules({}, [csv_path, tsv_path])
+    assert 'rules.csv:2' in str(error.value) and 'rules.tsv:1' in str(error.value)
+
+
+def test_matcher_cache_is_reused_until_rules_change(tmp_path):
+    path = _write(tmp_path / 'rules.csv', '2019年,2020年\n')
+    cache_path = str(tmp_path / 'cache' / 'rules.cache')
+    (tmp_path / 'cache').mkdir()
+
+    first = rule_files.load_matcher({}, [path], cache_path)
+    assert first.replace('2019年度') == ('2020年度', {'2019年': 1})
+    with open(cache_path, 'rb') as f:
+        key = f.readline().rstrip(b'\n').decode('ascii')
+    assert key == rule_files.rules_key({}, [path])
+
+    _write(tmp_path / 'rules.csv', '2019年,2021年\n')
+    second = rule_files.load_matcher({}, [path], cache_path)
+    assert second.replace('2019年度') == ('2021年度', {'2019年': 1})
+
+
+def test_corrupt_cache_is_rebuilt(tmp_path):
+    path = _write(tmp_path / 'rules.csv', '2019年,2020年\n')
+    cache_path = rule_files.cache_path_for([path])
+    with open(cache_path, 'wb') as f:
+        f.write(rule_files.rules_key({}, [path]).encode('ascii') + b'\nnot a pickle')
+    matcher = rule_files.load_matcher({}, [path])
+    assert matcher.rules == {'2019年': '2020年'}
+    assert rule_files.load_matcher({}, [path]).rules == {'2019年': '2020年'}
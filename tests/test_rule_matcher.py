@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import time
+
+from rule_matcher import RuleMatcher
+
+
+def test_backslash_rule_is_literal():
+    matcher = RuleMatcher({'D:\\Work\\2019': 'D:\\Work\\2023', 'a.b(1)': 'x'})
+    assert not matcher.regex_rules
+    text, counts = matcher.replace('D:\\Work\\2019 a.b(1) axb(1)')
+    assert text == 'D:\\Work\\2023 x axb(1)'
+    assert counts == {'D:\\Work\\2019': 1, 'a.b(1)': 1}
+
+
+def test_regex_requires_prefix():
+    matcher = RuleMatcher({'re:(\\d{4})年度': '\\1年', '\\d{4}': 'n'})
+    assert matcher.regex_rules == frozenset(['re:(\\d{4})年度'])
+    assert matcher.replace('2019年度 \\d{4}')[0] == '2019年 n'
+
+
+def test_regex_rules_leftmost_longest():
+    matcher = RuleMatcher({'re:ab': '1', 're:abc': '2'})
+    assert matcher.replace('abc ab')[0] == '2 1'
+
+
+def test_regex_same_length_prefers_earlier_rule():
+    matcher = RuleMatcher({'re:a.': '1', 're:ab': '2'})
+    assert matcher.replace('ab')[0] == '1'
+
+
+def test_empty_matching_regex_does_not_hide_others():
+    matcher = RuleMatcher({'re:a*': 'A', 're:b+': 'B'})
+    assert matcher.replace('xbx aa')[0] == 'xBx A'
+    assert matcher.search('xbx')
+
+
+def test_regex_with_backreference_uses_per_rule_search():
+    # 含分组引用的规则不能合并为一个多分支正则
+    matcher = RuleMatcher({'re:(x)\\1': 'D', 're:c*': 'C', 're:xx(y)': '\\1'})
+    assert matcher._combined is None
+    assert matcher.replace('axxb xxy xcc')[0] == 'aDb y xC'
+
+
+def test_regex_and_literal_leftmost_longest():
+    matcher = RuleMatcher({'abc': 'L', 're:ab\\w+': 'R'})
+    assert matcher.replace('abcd abc')[0] == 'R L'
+
+
+def test_combined_regex_scales_linearly():
+    # 不匹配的规则在每个候选起点只做锚定匹配，不向后扫描到文本末尾
+    rules = {'re:\\d{4}年': '{year}', 're:q*': 'Q'}
+    rules.update((f're:zz{i}q+', 'x') for i in range(10))
+    matcher = RuleMatcher(rules)
+    assert matcher._combined is not None
+    text = '2019年abc' * 12000
+    start = time.perf_counter()
+    new_text, counts = matcher.replace(text)
+    assert time.perf_counter() - start < 2
+    assert counts == {'re:\\d{4}年': 12000}
+    assert new_text == '{year}abc' * 12000
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+import subprocess
+
+import sharding
+from fixtures import write_docx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在独立进程中以租约模式运行一个节点
+_NODE_SCRIPT = '''
+import sys
+sys.path.insert(0, {root!r})
+import docx_formatted_replace as app
+app.SOURCE_FOLDER = {source!r}
+app.OUTPUT_FOLDER = {output!r}
+app.DOCUMENT_TIMEOUTS = {{}}
+app.SHOW_PROGRESS = False
+app.batch_process(workers=1, lease_dir={lease_dir!r})
+'''
+
+
+def test_shard_assignment_is_stable():
+    assert sharding.parse_shard('1/4') == (1, 4)
+    assert sharding.shard_of('a/b.docx', 4) == sharding.shard_of('a\\b.docx'.replace('\\', os.sep), 4)
+
+
+def test_lease_claim_is_exclusive_and_done_is_final(tmp_path):
+    first = sharding.LeaseDir(str(tmp_path), owner='n1')
+    second = sharding.LeaseDir(str(tmp_path), owner='n2')
+    try:
+        assert first.claim('a.docx')
+        assert not second.claim('a.docx')
+        first.release('a.docx')
+        assert second.claim('a.docx')
+        second.complete('a.docx', 'success')
+        assert not first.claim('a.docx')
+    finally:
+        first.close()
+        second.close()
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    crashed = sharding.LeaseDir(str(tmp_path), owner='crashed', ttl=60)
+    assert crashed.claim('a.docx')
+    crashed._stop.set()  # 模拟节点崩溃：不再续约，也不释放租约
+    crashed._heartbeat.join()
+    lease_path = crashed._marker('a.docx', sharding._LEASE_SUFFIX)
+    expired = time.time() - 120
+    os.utime(lease_path, (expired, expired))
+
+    other = sharding.LeaseDir(str(tmp_path), owner='other', ttl=60)
+    try:
+        assert other.claim('a.docx')
+        assert other.reclaimed == 1
+    finally:
+        other.close()
+
+
+def test_node_names_are_stable_across_restarts(tmp_path):
+    first = sharding.LeaseDir(str(tmp_path))
+    second = sharding.LeaseDir(str(tmp_path))
+    assert first.node != second.node
+    first_node = first.node
+    first.close()
+    restarted = sharding.LeaseDir(str(tmp_path))
+    assert restarted.node == first_node
+    assert restarted.journal_path() == os.path.join(str(tmp_path), f"journal.{first_node}.jsonl")
+    restarted.close()
+    second.close()
+
+
+def _run_nodes(count, source, output, lease_dir, cwd):
+    script = _NODE_SCRIPT.format(root=ROOT, source=source, output=output, lease_dir=lease_dir)
+    nodes = [subprocess.Popen([sys.executable, '-c', script], cwd=cwd,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) for _ in range(count)]
+    for node in nodes:
+        _, stderr = node.communicate(timeout=120)
+        assert node.returncode == 0, stderr.decode('utf-8', 'replace')
+
+
+def test_local_processes_share_a_lease_dir(tmp_path):
+    source = tmp_path / 'source'
+    output = tmp_path / 'output'
+    source.mkdir()
+    names = [f'doc{i:02d}.docx' for i in range(12)]
+    for name in names:
+        write_docx(str(source / name), [f'{name} 2019年度'])
+
+    for run in ('run1', 'run2'):
+        lease_dir = str(tmp_path / 'leases' / run)
+        _run_nodes(3, str(source), str(output), lease_dir, str(tmp_path))
+
+        summaries = sharding.find_summaries(str(output), lease_dir)
+        assert len(summaries) == 3
+        merged = sharding.merge_summaries(summaries)
+        # 每个文件恰好由一个节点处理；上一次运行的汇总不会被合并进来
+        assert merged['files']['total'] == len(names)
+        assert merged['files']['success'] == len(names)
+        assert merged['replacements'] == len(names)
+        for summary_path in summaries:
+            with open(summary_path, 'r', encoding='utf-8') as f:
+                node = json.load(f)['node']
+            assert os.path.exists(os.path.join(lease_dir, f"journal.{node}.jsonl"))
+
+    assert sorted(os.listdir(str(output))) == names
+    assert not sharding.find_summaries(str(output))
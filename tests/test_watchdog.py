@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+
+import pytest
+
+import watchdog_pool
+from fixtures import write_docx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 注册一个处理 hang.docx 时永不返回的后端，并配置 1 秒的处理时限后运行批处理。
+# 注册和配置放在模块顶层：工作进程以 spawn 方式启动时重新导入本脚本，同样能得到它们。
+_BATCH_SCRIPT = '''
+import os
+import sys
+import time
+sys.path.insert(0, {root!r})
+import backends
+import docx_formatted_replace as app
+
+
+def blocking(input_path, output_path):
+    if os.path.basename(input_path) == 'hang.docx':
+        while True:
+            time.sleep(1)
+    return app._native_docx_backend(input_path, output_path)
+
+
+backends._registry[backends.FORMAT_DOCX].insert(0, backends.Backend('blocking', blocking))
+app.SOURCE_FOLDER = {source!r}
+app.OUTPUT_FOLDER = {output!r}
+app.DOCUMENT_TIMEOUTS = {{'docx': 1}}
+app.DOCUMENT_TIMEOUT_PER_MB = 0
+app.INCREMENTAL = False
+app.JOURNAL = True
+app.SHOW_PROGRESS = False
+
+if __name__ == '__main__':
+    app.batch_process(workers={workers}, incremental=False, use_pipeline=False)
+'''
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_stuck_document_times_out_and_batch_continues(tmp_path, workers):
+    source = tmp_path / 'source'
+    output = tmp_path / 'output'
+    source.mkdir()
+    names = ['a.docx', 'hang.docx', 'b.docx', 'c.docx']
+    for name in names:
+        write_docx(str(source / name), [f'{name} 2019年度'])
+    script = tmp_path / 'run_batch.py'
+    script.write_text(_BATCH_SCRIPT.format(root=ROOT, source=str(source), output=str(output), workers=workers),
+                      encoding='utf-8')
+
+    start = time.monotonic()
+    completed = subprocess.run([sys.executable, str(script)], cwd=str(tmp_path),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=60)
+    assert completed.returncode == 0, completed.stderr.decode('utf-8', 'replace')
+    assert time.monotonic() - start < 30
+
+    with open(str(tmp_path / 'output.journal.jsonl'), 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    outcomes = {record['file']: record['outcome'] for record in records if record['type'] == 'file'}
+    assert outcomes == {'a.docx': 'success', 'hang.docx': 'timeout', 'b.docx': 'success', 'c.docx': 'success'}
+    assert sorted(os.listdir(str(output))) == ['a.docx', 'b.docx', 'c.docx']
+
+
+def _ignore_terminate_and_hang():
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    while True:
+        time.sleep(1)
+
+
+def _square(value):
+    return value * value
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGKILL'), reason='需要 POSIX 信号')
+def test_submit_is_not_blocked_while_a_worker_is_killed(monkeypatch):
+    # 工作进程忽略 SIGTERM，看门狗要等满 _KILL_GRACE 才能强制结束它；这期间提交任务不应被阻塞
+    monkeypatch.setattr(watchdog_pool, '_KILL_GRACE', 2.0)
+    timeouts = {_ignore_terminate_and_hang: 0.3}
+    pool = watchdog_pool.WatchdogPool(2, timeout_for=lambda fn, args: timeouts.get(fn))
+    try:
+        stuck = pool.submit(_ignore_terminate_and_hang)
+        time.sleep(0.8)
+        start = time.monotonic()
+        future = pool.submit(_square, 7)
+        assert time.monotonic() - start < 0.5
+        assert future.result(timeout=30) == 49
+        with pytest.raises(watchdog_pool.DocumentTimeout):
+            stuck.result(timeout=30)
+        assert pool.timeouts == 1
+    finally:
+        pool.shutdown()
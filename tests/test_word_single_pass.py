@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import docx_formatted_replace as app
+from rule_matcher import RuleMatcher
+
+
+class FakeDocument(object):
+    """只有一个文档部分的 Word 文档替身，Find 按 wdReplaceAll 的语义在整段文本中替换"""
+
+    def __init__(self, text):
+        self.text = text
+        self.replace_all_calls = 0
+        self.StoryRanges = [FakeRange(self, 0, None)]
+
+
+class FakeRange(object):
+
+    def __init__(self, doc, start, end):
+        self.doc = doc
+        self.Start = start
+        self.End = end
+        self.NextStoryRange = None
+
+    @property
+    def Text(self):
+        return self.doc.text[self.Start:self.End]
+
+    @Text.setter
+    def Text(self, value):
+        end = len(self.doc.text) if self.End is None else self.End
+        self.doc.text = self.doc.text[:self.Start] + value + self.doc.text[end:]
+
+    @property
+    def Duplicate(self):
+        return FakeRange(self.doc, self.Start, self.End)
+
+    def SetRange(self, start, end):
+        self.Start, self.End = start, end
+
+    @property
+    def Find(self):
+        return self
+
+    def Execute(self, FindText, ReplaceWith, Replace, **kwargs):
+        assert Replace == 2
+        self.doc.replace_all_calls += 1
+        find = FindText.replace('^^', '^')
+        self.Text = self.Text.replace(find, ReplaceWith.replace('^^', '^'))
+
+
+@pytest.fixture
+def rules(monkeypatch):
+    def use(rules):
+        monkeypatch.setattr(app, 'RULE_MATCHER', RuleMatcher(rules))
+        monkeypatch.setattr(app, 'REPLACE_RULES', rules)
+    return use
+
+
+def test_overlapping_rules_follow_leftmost_longest(rules):
+    rules({'ab': '1', 'bcd': '2'})
+    doc = FakeDocument('abcd bcd\r')
+    counts = app.replace_word_single_pass(doc)
+    assert doc.text == '1cd 2\r'
+    assert counts == {'ab': 1, 'bcd': 1}
+    assert doc.replace_all_calls == 0
+
+
+def test_independent_rules_use_replace_all(rules):
+    rules({'2019': '2023', '2020': '2024'})
+    doc = FakeDocument('2019 2020 2019\r')
+    counts = app.replace_word_single_pass(doc)
+    assert doc.text == '2023 2024 2023\r'
+    assert counts == {'2019': 2, '2020': 1}
+    assert doc.replace_all_calls == 2
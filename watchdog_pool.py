@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+带超时看门狗的进程池
+每个文档在工作进程中处理，并有一个墙钟时限。格式异常的文档可能使 COM 调用或解析永远不返回，
+超时后看门狗终止该工作进程（以及它报告的 Office 进程），启动新的工作进程替换它，
+该文档以 DocumentTimeout 结束，其余文档继续处理。
+
+接口与 concurrent.futures.Executor 相同（submit 返回 Future），可以直接交给 asyncio 的 run_in_executor。
+每个任务的时限由构造时传入的 timeout_for 函数根据任务参数计算。
+"""
+
+import os
+import time
+import signal
+import logging
+import threading
+import collections
+import multiprocessing
+import multiprocessing.connection
+import concurrent.futures
+
+_KILL_GRACE = 5.0  # 终止工作进程后等待其退出的时间（秒），超过后强制结束
+_MAX_WAIT = 0.5  # 看门狗线程检查超时的最长间隔（秒）
+
+# 工作进程中与看门狗通信的连接（主进程中为 None）
+_worker_conn = None
+
+
+class DocumentTimeout(Exception):
+    """文档处理超过时限，工作进程已被终止"""
+
+    def __init__(self, seconds):
+        super().__init__(f"处理超时（{seconds:.0f} 秒），工作进程已终止")
+        self.seconds = seconds
+
+
+class WorkerCrashed(Exception):
+    """工作进程在处理文档时意外退出"""
+
+
+def in_worker():
+    """当前进程是否为看门狗进程池的工作进程"""
+    return _worker_conn is not None
+
+
+def report_child_pid(pid):
+    """
+    在工作进程中报告它启动的外部进程（如 Word/Excel），工作进程超时被终止时一并结束这些进程
+
+    Office 由 COM 启动，不是工作进程的子进程，终止工作进程不会结束它们。
+    """
+    if _worker_conn is not None and pid:
+        _worker_conn.send(('child', pid))
+
+
+def _worker_main(conn, initializer):
+    """工作进程主循环：逐个接收任务并返回结果"""
+    global _worker_conn
+    _worker_conn = conn
+    if initializer is not None:
+        initializer()
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        func, args, kwargs = task
+        try:
+            message = ('result', func(*args, **kwargs))
+        except Exception as e:
+            message = ('error', e)
+        try:
+            conn.send(message)
+        except Exception as e:
+            conn.send(('error', RuntimeError(f"处理结果无法传回主进程: {str(e)}")))
+
+
+class _Worker(object):
+    def __init__(self, context, initializer):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, initializer), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.future = None
+        self.deadline = None
+        self.timeout = None
+        self.children = set()
+
+
+class WatchdogPool(concurrent.futures.Executor):
+    """
+    每个任务有独立时限的进程池
+
+    Args:
+        workers: 工作进程数
+        initializer: 工作进程启动时调用的函数（替换的新进程也会调用）
+        timeout_for: 计算任务时限的函数 (func, args) -> 秒数，返回 None 或 0 时不限制
+        clock: 计时函数（测试时可替换）
+    """
+
+    def __init__(self, workers, initializer=None, timeout_for=None, clock=None):
+        self._clock = clock or time.monotonic
+        self._context = multiprocessing.get_context()
+        self._initializer = initializer
+        self._timeout_for = timeout_for
+        self._lock = threading.Lock()
+        self._pending = collections.deque()
+        self._closed = False
+        self.timeouts = 0  # 超时终止的次数
+        self.crashes = 0  # 工作进程意外退出的次数
+        self._workers = [_Worker(self._context, initializer) for _ in range(max(1, workers))]
+        # 提交任务和关闭进程池时唤醒看门狗线程，重新计算等待时间
+        self._wakeup_recv, self._wakeup_send = self._context.Pipe(duplex=False)
+        self._thread = threading.Thread(target=self._monitor, name="watchdog", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        timeout = self._timeout_for(fn, args) if self._timeout_for else None
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("进程池已关闭")
+            self._pending.append((future, fn, args, kwargs, timeout))
+            for worker in self._workers:
+                if worker.future is None:
+                    self._dispatch(worker)
+                    break
+        self._wake()
+        return future
+
+    def _wake(self):
+        try:
+            self._wakeup_send.send(None)
+        except OSError:
+            pass  # 看门狗线程已结束
+
+    def _dispatch(self, worker):
+        """把下一个等待中的任务交给空闲的工作进程（调用方持有锁）"""
+        while self._pending:
+            future, fn, args, kwargs, timeout = self._pending.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue  # 已取消
+            try:
+                worker.conn.send((fn, args, kwargs))
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            worker.future = future
+            worker.timeout = timeout
+            worker.deadline = self._clock() + timeout if timeout else None
+            return
+
+    def _monitor(self):
+        while True:
+            with self._lock:
+                busy = [worker for worker in self._workers if worker.future is not None]
+                if self._closed and not busy and not self._pending:
+                    break
+                conns = dict((worker.conn, worker) for worker in self._workers)
+                now = self._clock()
+                wait = min([worker.deadline - now for worker in busy if worker.deadline] + [_MAX_WAIT])
+            for conn in multiprocessing.connection.wait(list(conns) + [self._wakeup_recv], max(0.0, wait)):
+                if conn is self._wakeup_recv:
+                    conn.recv()
+                else:
+                    self._receive(conns[conn])
+            now = self._clock()
+            with self._lock:
+                expired = [worker for worker in self._workers if worker.deadline is not None and now >= worker.deadline]
+                self.timeouts += len(expired)
+            for worker in expired:
+                logging.error(f"文档处理超时（{worker.timeout:.0f} 秒），终止工作进程 {worker.process.pid} 并启动新进程")
+                self._replace(worker, DocumentTimeout(worker.timeout))
+        self._stop_workers()
+
+    def _receive(self, worker):
+        try:
+            kind, value = worker.conn.recv()
+        except (EOFError, OSError):
+            with self._lock:
+                self.crashes += 1
+            logging.error(f"工作进程 {worker.process.pid} 意外退出，启动新进程")
+            self._replace(worker, WorkerCrashed(f"工作进程意外退出（退出码 {worker.process.exitcode}）"))
+            return
+        if kind == 'child':
+            with self._lock:
+                worker.children.add(value)
+            return
+        with self._lock:
+            future = worker.future
+            worker.future = worker.deadline = worker.timeout = None
+            self._dispatch(worker)
+        if future is None:
+            return
+        if kind == 'result':
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def _replace(self, worker, error):
+        """
+        终止工作进程及其报告的外部进程，以 error 结束其任务，并启动新的工作进程（只在看门狗线程中调用）
+
+        只有工作进程列表的增减和任务分派持有锁；终止进程（最多等待 2 × _KILL_GRACE）、结束任务和启动新进程
+        在锁外进行，期间 submit() 不会被阻塞，提交的任务由空闲的工作进程或新进程处理。
+        """
+        with self._lock:
+            self._workers.remove(worker)
+            future = worker.future
+            worker.future = worker.deadline = worker.timeout = None
+            respawn = not (self._closed and not self._pending)
+        _kill(worker)
+        if future is not None and not future.done():
+            future.set_exception(error)
+        if not respawn:
+            return
+        replacement = _Worker(self._context, self._initializer)
+        with self._lock:
+            self._workers.append(replacement)
+            self._dispatch(replacement)
+
+    def _stop_workers(self):
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except Exception:
+                pass
+        for worker in self._workers:
+            worker.process.join(_KILL_GRACE)
+            if worker.process.is_alive():
+                _kill(worker)
+            worker.conn.close()
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """关闭进程池；cancel_futures 为 True 时取消尚未开始的任务"""
+        with self._lock:
+            self._closed = True
+            if cancel_futures:
+                while self._pending:
+                    self._pending.popleft()[0].cancel()
+        self._wake()
+        if wait:
+            self._thread.join()
+
+
+def _kill(worker):
+    """结束工作进程及其报告的外部进程"""
+    process = worker.process
+    if process.is_alive():
+        process.terminate()
+        process.join(_KILL_GRACE)
+        if process.is_alive() and hasattr(process, 'kill'):
+            process.kill()
+            process.join(_KILL_GRACE)
+    for pid in worker.children:
+        try:
+            os.kill(pid, signal.SIGTERM)  # Windows 上为 TerminateProcess
+            logging.warning(f"已结束工作进程启动的外部进程: {pid}")
+        except OSError:
+            pass
+    worker.children.clear()
+    try:
+        worker.conn.close()
+    except Exception:
+        pass